@@ -0,0 +1,206 @@
+"""
+Benchmarks of the parsing, the wallet and the strategies on a synthetic history.
+
+    python -m benchmarks.run --rows 1000000 --output results.json
+    python -m benchmarks.run --rows 1000000 --compare results.json
+
+Every benchmark is timed separately (best of --repeat runs, setup excluded)
+and the results are written as json along with the commit they ran on, so
+that two runs can be compared (--compare exits with 1 on a regression).
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.synthetic import generate
+from cryptopnl.main.average_cost import average_cost
+from cryptopnl.main.fifo_with_ledger import fifo_with_ledger
+from cryptopnl.main.fifo_with_trades import fifo_with_trades
+from cryptopnl.main.trades import Trades
+from cryptopnl.wallet.numeric import fixed_point_backend
+from cryptopnl.wallet.wallet import wallet
+
+ROWS = 100000
+REPEAT = 3
+THRESHOLD = 1.10 # slowdown ratio reported as a regression
+
+class skipped(Exception):
+    """ Raised by a benchmark setup that cannot run in this tree """
+
+def history(workdir:str, rows:int, seed:int) -> tuple:
+    """ (trades file, ledger file) of a synthetic history, generated once per size and seed """
+    trades_file = os.path.join(workdir, f"trades_{rows}_{seed}.csv")
+    ledger_file = os.path.join(workdir, f"ledger_{rows}_{seed}.csv")
+    if not (os.path.exists(trades_file) and os.path.exists(ledger_file)):
+        generate(trades_file, ledger_file, rows, seed)
+    return trades_file, ledger_file
+
+def _lots(trades_file:str, fixed_point:bool = False) -> list:
+    """ (crypto, amount, price, fee) of the fiat trades, as Decimals or scaled integer pairs (see Trades.scaled) """
+    trades = Trades.readKrakenCSV(trades_file, fixed_point)
+    fiat = trades[trades[Trades.PAIR_COL].str.endswith("EUR")]
+    fields = (Trades.PAIR_COL, Trades.VOL_COL, Trades.PRICE_COL, Trades.FEE_COL)
+    return [(pair[:-4], amount, price, fee) for pair, amount, price, fee in 
+            (Trades.getter(trade, *fields)(trade) for trade in Trades.frame_records(fiat))]
+
+def _wallet_add(lots, backend):
+    def setup():
+        return wallet(backend=backend()),
+    def run(w):
+        for crypto, amount, price, fee in lots: w.add(crypto, amount, price, fee)
+    return setup, run
+
+def _wallet_take(lots, backend):
+    def setup():
+        w = wallet(backend=backend())
+        for crypto, amount, price, fee in lots: w.add(crypto, amount, price, fee)
+        return w,
+    def run(w):
+        for crypto, amount, _, _ in lots: w.take(crypto, amount)
+    return setup, run
+
+def _go(strategy, *args, **kwargs):
+    def setup():
+        return strategy(*args, **kwargs),
+    def run(s):
+        with contextlib.redirect_stdout(io.StringIO()): s.go()
+    return setup, run
+
+def _cump(trades_file, ledger_file):
+    def setup():
+        try:
+            from cryptopnl.main.cump import cumpCalculator
+        except ImportError as e:
+            raise skipped(f"cryptopnl.main.cump cannot be imported ({e})")
+        raise skipped("cumpCalculator needs the price API")
+    return setup, None
+
+def benchmarks(trades_file:str, ledger_file:str) -> dict:
+    """ {name: (setup, run)}, run(*setup()) being timed """
+    lots, scaled_lots = _lots(trades_file), _lots(trades_file, fixed_point=True)
+    return {
+        "readKrakenCSV[trades]": (lambda: (trades_file,), Trades.readKrakenCSV),
+        "readKrakenCSV[trades,fixed_point]": (lambda: (trades_file, True), Trades.readKrakenCSV),
+        "readKrakenCSV[ledger]": (lambda: (ledger_file,), Trades.readKrakenCSV),
+        "readKrakenCSV[ledger,fixed_point]": (lambda: (ledger_file, True), Trades.readKrakenCSV),
+        "wallet.add": _wallet_add(lots, lambda: None),
+        "wallet.add[fixed_point]": _wallet_add(lots, fixed_point_backend),
+        "wallet.add[fixed_point,scaled]": _wallet_add(scaled_lots, fixed_point_backend),
+        "wallet.take": _wallet_take(lots, lambda: None),
+        "wallet.take[fixed_point]": _wallet_take(lots, fixed_point_backend),
+        "wallet.take[fixed_point,scaled]": _wallet_take(scaled_lots, fixed_point_backend),
+        "fifo_with_trades.go": _go(fifo_with_trades, trades_file),
+        "fifo_with_trades.go[fixed_point]": _go(fifo_with_trades, trades_file, fixed_point=True),
+        "fifo_with_trades.go[fixed_point,int]": _go(fifo_with_trades, trades_file, fixed_point=True, backend=fixed_point_backend()),
+        "fifo_with_ledger.go": _go(fifo_with_ledger, trades_file, ledger_file),
+        "fifo_with_ledger.go[fixed_point]": _go(fifo_with_ledger, trades_file, ledger_file, fixed_point=True),
+        "average_cost.go": _go(average_cost, trades_file),
+        "average_cost.go[fixed_point]": _go(average_cost, trades_file, fixed_point=True),
+        "cump": _cump(trades_file, ledger_file),
+    }
+
+def time_benchmark(setup, run, repeat:int = REPEAT) -> list:
+    """ Seconds of each run (the setup is not timed) """
+    seconds = []
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        run(*args)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+def run_benchmarks(rows:int = ROWS, seed:int = 0, repeat:int = REPEAT, only:str = None, workdir:str = None) -> dict:
+    """
+    Run the benchmarks on a synthetic history of rows trades
+
+    Parameters
+    ----------
+    rows (int) : number of trades of the history
+    seed (int) : seed of the history
+    repeat (int) : runs of each benchmark (the best one is reported)
+    only (str) : (optional) run only the benchmarks whose name contains it
+    workdir (str) : (optional) directory of the generated files (kept between runs)
+
+    Returns
+    -------
+    dict report with the environment and one result per benchmark
+    """
+    workdir = workdir or os.path.join(tempfile.gettempdir(), "cryptopnl_benchmarks")
+    os.makedirs(workdir, exist_ok=True)
+    trades_file, ledger_file = history(workdir, rows, seed)
+
+    results = []
+    for name, (setup, run) in benchmarks(trades_file, ledger_file).items():
+        if only and only not in name: continue
+        try:
+            seconds = time_benchmark(setup, run, repeat)
+        except skipped as e:
+            results.append({"name": name, "skipped": str(e)})
+            continue
+        best = min(seconds)
+        results.append({"name": name, "seconds": best, "runs": seconds, "us_per_row": best / rows * 1e6})
+    return {"commit": _commit(), "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "machine": platform.machine(),
+            "rows": rows, "seed": seed, "repeat": repeat, "results": results}
+
+def compare(old:dict, new:dict, threshold:float = THRESHOLD) -> list:
+    """
+    Compare two reports
+
+    Returns
+    -------
+    list of (name, old seconds, new seconds, ratio new / old, regression) of the benchmarks timed in both
+    """
+    before = {r["name"]: r["seconds"] for r in old["results"] if "seconds" in r}
+    rows = []
+    for r in new["results"]:
+        if "seconds" not in r or r["name"] not in before: continue
+        ratio = r["seconds"] / before[r["name"]] if before[r["name"]] else float("inf")
+        rows.append((r["name"], before[r["name"]], r["seconds"], ratio, ratio > threshold))
+    return rows
+
+def _commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+def main(argv = None) -> int:
+    parser = argparse.ArgumentParser(prog="benchmarks.run", description="cryptopnl benchmarks on a synthetic history")
+    parser.add_argument("--rows", type=int, default=ROWS, help="number of synthetic trades")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic history")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="runs of each benchmark (best reported)")
+    parser.add_argument("--only", default=None, help="run the benchmarks whose name contains this")
+    parser.add_argument("--workdir", default=None, help="directory of the generated files")
+    parser.add_argument("--output", default=None, help="json file of the results")
+    parser.add_argument("--compare", default=None, help="json results of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.rows, args.seed, args.repeat, args.only, args.workdir)
+    for r in report["results"]:
+        if "skipped" in r: print(f"{r['name']:<40} skipped: {r['skipped']}")
+        else: print(f"{r['name']:<40} {r['seconds']:10.4f} s {r['us_per_row']:10.2f} us/row")
+    if args.output:
+        with open(args.output, "w") as f: json.dump(report, f, indent=2)
+
+    if not args.compare: return 0
+    with open(args.compare) as f: old = json.load(f)
+    regressions = 0
+    print(f"\ncompared with {old.get('commit')} ({old.get('rows')} rows)")
+    for name, before, after, ratio, regression in compare(old, report, args.threshold):
+        regressions += regression
+        print(f"{name:<40} {before:10.4f} s -> {after:10.4f} s x{ratio:.2f}" + ("  REGRESSION" if regression else ""))
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import csv
+import numpy as np
+import pandas as pd
+
+ASSETS = {"XXBT": 5000.00, "XETH": 300.00, "XLTC": 50.00, "XXRP": 0.20} # initial EUR prices
+FIAT = "ZEUR"
+START = "2017-01-01 00:00:00"
+STEP = 60 # seconds between two trades
+FEE_BP = 26 # taker fee in basis points
+DEPOSIT = 10**5 # initial fiat deposit
+SCALE = 8 # decimals written for every amount
+
+TRADES_COLUMNS = ["txid", "ordertxid", "pair", "time", "type", "ordertype", "price", "cost", "fee", "vol", "margin", "misc", "ledgers"]
+LEDGER_COLUMNS = ["txid", "refid", "time", "type", "subtype", "aclass", "asset", "amount", "fee", "balance"]
+
+def generate(trades_file:str, ledger_file:str, rows:int, seed:int = 0, assets:dict = ASSETS, crypto2crypto:float = 0.15) -> dict:
+    """
+    Write a consistent synthetic history in the Kraken export format:
+    rows trades and two ledger entries per trade (plus an initial deposit).
+
+    Amounts are generated as exact integers so that the trades and the
+    ledger agree to the last decimal (the checks of fifo_with_ledger and
+    Trades.balance_check hold), and no sale exceeds the holdings of the wallet.
+
+    Parameters
+    ----------
+    trades_file (str) : location of the trades csv to write
+    ledger_file (str) : location of the ledger csv to write
+    rows (int) : number of trades
+    seed (int) : random seed (the same seed writes the same files)
+    assets (dict) : {crypto: initial EUR price}
+    crypto2crypto (float) : share of crypto to crypto trades
+
+    Returns
+    -------
+    dict with the number of trades, ledger entries and crypto to crypto trades
+    """
+    rng = np.random.default_rng(seed)
+    names = list(assets)
+    # Random walks of the EUR prices (in cents)
+    steps = rng.normal(0, 0.002, size=(rows, len(names)))
+    cents = np.maximum(1, np.round(np.array([assets[n] * 100 for n in names]) * np.exp(np.cumsum(steps, axis=0)))).astype(np.int64)
+    picks = rng.integers(0, len(names), size=(rows, 2))
+    draws = rng.random(size=(rows, 2))
+    vols = rng.integers(1, 500, size=rows) # 10**-4 units of crypto for fiat trades
+
+    unit = 10**SCALE
+    holdings = [0] * len(names) # 10**-8 units
+    fiat = DEPOSIT * unit
+    pair, kind, price, cost, fee, vol = [], [], [], [], [], []
+    # Ledger entries (asset, amount, fee), ining first
+    l_asset, l_amount, l_fee = [], [], []
+    c2c = 0
+
+    for i in range(rows):
+        a, b = picks[i]
+        p = cents[i]
+        u, w = draws[i]
+        if u < crypto2crypto and a != b and holdings[b] > unit // 10:
+            # Buy a with b, spending up to half the holdings of b
+            spent = int(holdings[b] * w / 2) + 1
+            bought = spent * int(p[b]) // int(p[a])
+            spent_fee = spent * FEE_BP // 10**4
+            if bought > 0:
+                holdings[b] -= spent + spent_fee
+                holdings[a] += bought
+                pair.append(names[a] + names[b]); kind.append("buy")
+                price.append(spent * unit // bought); cost.append(spent); fee.append(spent_fee); vol.append(bought)
+                l_asset += [names[a], names[b]]; l_amount += [bought, -spent]; l_fee += [0, spent_fee]
+                c2c += 1
+                continue
+        amount = int(vols[i]) * 10**4 # 10**-8 units
+        eur = int(p[a]) * int(vols[i]) * 100 # cents x 10**-4 = 10**-6 EUR, written in 10**-8
+        eur_fee = eur * FEE_BP // 10**4 // 100 * 100
+        sell = holdings[a] >= amount and (w < 0.5 or fiat < eur + eur_fee)
+        if sell:
+            holdings[a] -= amount
+            fiat += eur - eur_fee
+            l_asset += [FIAT, names[a]]; l_amount += [eur, -amount]; l_fee += [eur_fee, 0]
+        else:
+            holdings[a] += amount
+            fiat -= eur + eur_fee
+            l_asset += [names[a], FIAT]; l_amount += [amount, -eur]; l_fee += [0, eur_fee]
+        pair.append(names[a] + FIAT); kind.append("sell" if sell else "buy")
+        price.append(int(p[a]) * 10**6); cost.append(eur); fee.append(eur_fee); vol.append(amount)
+
+    times = (pd.Timestamp(START) + pd.to_timedelta(np.arange(rows) * STEP, unit="s")).strftime("%Y-%m-%d %H:%M:%S.0000")
+    ids = np.arange(rows).astype(str)
+    txids = np.char.add("T", ids)
+    ining, outing = np.char.add(np.char.add("L", ids), "A"), np.char.add(np.char.add("L", ids), "B")
+
+    trades = pd.DataFrame({"txid": txids, "ordertxid": np.char.add("O", ids), "pair": pair, "time": times,
+                           "type": kind, "ordertype": "market", "price": _decimals(price), "cost": _decimals(cost),
+                           "fee": _decimals(fee), "vol": _decimals(vol), "margin": "0.00000000", "misc": "",
+                           "ledgers": np.char.add(np.char.add(outing, ","), ining)})
+    trades.to_csv(trades_file, index=False, columns=TRADES_COLUMNS, quoting=csv.QUOTE_MINIMAL)
+
+    amounts = np.array([DEPOSIT * unit] + l_amount, dtype=np.int64)
+    fees = np.array([0] + l_fee, dtype=np.int64)
+    l_asset = [FIAT] + l_asset
+    balances = pd.Series(amounts - fees).groupby(np.array(l_asset)).cumsum().to_numpy()
+    l_txids = np.concatenate([["D0"], np.column_stack([ining, outing]).ravel()])
+    refids = np.concatenate([["D0"], np.repeat(txids, 2)])
+    ledger = pd.DataFrame({"txid": l_txids, "refid": refids, "time": np.concatenate([[START + ".0000"], np.repeat(times, 2)]),
+                           "type": ["deposit"] + ["trade"] * (2 * rows), "subtype": "", "aclass": "currency",
+                           "asset": l_asset, "amount": _decimals(amounts), "fee": _decimals(fees), "balance": _decimals(balances)})
+    ledger.to_csv(ledger_file, index=False, columns=LEDGER_COLUMNS, quoting=csv.QUOTE_MINIMAL)
+    return {"trades": rows, "ledger": len(ledger), "crypto2crypto": c2c}
+
+def _decimals(values, scale:int = SCALE) -> np.ndarray:
+    """ Decimal strings of integers in units of 10**-scale """
+    values = np.asarray(values, dtype=np.int64)
+    magnitude = np.abs(values)
+    sign = np.where(values < 0, "-", "")
+    integer = (magnitude // 10**scale).astype(str)
+    fraction = np.char.zfill((magnitude % 10**scale).astype(str), scale)
+    return np.char.add(np.char.add(sign, integer), np.char.add(".", fraction))
@@ -1,12 +1,84 @@
+import argparse
+import contextlib
+import os
 import sys
-from cryptopnl.main.profits_calculator import profitsCalculator 
+from cryptopnl.main import batch
+from cryptopnl.main.fifo_with_ledger import fifo_with_ledger
+from cryptopnl.main.fifo_with_trades import fifo_with_trades
+from cryptopnl.utils.profiler import profiler
 
-def main(trades_file, ledger_file = None):
-    return  profitsCalculator(trades_file=trades_file, ledger_file=ledger_file).go()
+def main(trades_file, ledger_file = None, checkpoint = None, profile = None, cprofile = None, gains = None):
+    """
+    Compute the profits and losses of a trades file (FIFO, with the ledger if given)
+
+    Parameters
+    ----------
+    trades_file (str) : location of a file with the trades
+    ledger_file (str) : (optional) location of a file with the ledger
+    checkpoint (str) : (optional) checkpoint file, the run resumes from it if it
+                       exists and it is updated at the end of the run
+    profile (str) : (optional) json file of a timing report of the run phases
+    cprofile (str) : (optional) cProfile dump of the run (with or without profile)
+    gains (str) : (optional) export of the gains table, binary if it ends with .npz, csv otherwise
+    """
+    prof = profiler(cprofile_file=cprofile) if profile or cprofile else contextlib.nullcontext()
+    with prof:
+        if ledger_file: strategy = fifo_with_ledger(trades_file=trades_file, ledger_file=ledger_file)
+        else: strategy = fifo_with_trades(trades_file=trades_file)
+
+        if checkpoint and os.path.exists(checkpoint): strategy.load_checkpoint(checkpoint)
+        result = strategy.go()
+    if checkpoint: strategy.save_checkpoint(checkpoint)
+    if profile: prof.save(profile)
+    if gains: strategy.gains.save(gains) if gains.endswith(".npz") else strategy.gains.to_csv(gains)
+    return result
+
+def main_batch(source, strategy = None, workers = None, report = None, cache_dir = None):
+    """
+    Compute the profits and losses of many accounts in parallel
+
+    Parameters
+    ----------
+    source (str) : manifest (csv) or directory of the accounts (see batch.load_accounts)
+    strategy (str) : (optional) strategy of every account (by default FIFO with 
+                     the ledger when the account has one)
+    workers (int) : (optional) number of processes (cpu count by default)
+    report (str) : (optional) json file with the results of every account
+    cache_dir (str) : (optional) directory of a binary cache of the parsed files
+    """
+    options = {"cache_dir": cache_dir} if cache_dir else {}
+    results = batch.run_batch(batch.load_accounts(source), strategy=strategy, workers=workers, **options)
+    for r in results:
+        if r.error: print(f"{r.account}: FAILED {r.error}")
+        else: print(f"{r.account}: " + ", ".join(f"{year}: {profit}" for year, profit in r.summary.items()))
+    if report: batch.write_report(results, report)
+    return 1 if any(r.error for r in results) else 0
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="cryptopnl", description="Crypto profits and losses calculator")
+    parser.add_argument("trades_file", nargs="?", default=None, help="Kraken trades export (csv)")
+    parser.add_argument("ledger_file", nargs="?", default=None, help="Kraken ledger export (csv)")
+    parser.add_argument("--checkpoint", default=None, help="resume from / save the progress to this file")
+    parser.add_argument("--profile", default=None, help="json timing report of the run phases")
+    parser.add_argument("--cprofile", default=None, help="cProfile dump of the run")
+    parser.add_argument("--gains", default=None, help="gains table export (csv, or binary .npz)")
+    parser.add_argument("--batch", default=None, help="manifest (csv) or directory of accounts to process in parallel")
+    parser.add_argument("--strategy", default=None, choices=sorted(batch.STRATEGIES), help="strategy of the batch accounts")
+    parser.add_argument("--workers", default=None, type=int, help="number of batch processes")
+    parser.add_argument("--report", default=None, help="json report of the batch")
+    parser.add_argument("--cache-dir", default=None, help="binary cache of the parsed exports")
+    args = parser.parse_args(argv)
+    if not args.batch and not args.trades_file: parser.error("a trades file or --batch is required")
+    return args
 
 if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if args.batch:
+        sys.exit(
+            main_batch(args.batch, args.strategy, args.workers, args.report, args.cache_dir)
+        )
     sys.exit(
-        main(*sys.argv[1:])
+        main(args.trades_file, args.ledger_file, args.checkpoint, args.profile, args.cprofile, args.gains)
     )
 
-# TODO RESULT : where are the decimals coming from !
\ No newline at end of file
+# TODO RESULT : where are the decimals coming from !
@@ -22,6 +22,11 @@ class exchangeAPI(metaclass = abc.ABCMeta):
         """Get history trades for a particular cryptocurrency."""
         pass
 
+    @abc.abstractstaticmethod
+    def iterHistoryTrades():
+        """Iterate over the pages of history trades for a particular cryptocurrency."""
+        pass
+
     @abc.abstractstaticmethod
     def getTickerAPI():
         """Get updated ticker information."""
@@ -62,6 +62,50 @@ class krakenAPI(exchangeAPI):
         params = {"pair": pair}
         if since is not None: params["since"] = str(since)
         response = krakenAPI._publicAPI(method, params)
+        return krakenAPI._parseHistoryTrades(response)
+
+    def iterHistoryTrades(pair, since = None, until = None):
+        """
+        Iterate over the history trades of a cryptocurrency, page by page.
+        The since / last cursor is followed exactly (integer ns, as returned by
+        Kraken), only one page is held at a time.
+
+        :param pair: cryptocurrency pair
+        :param since: (optional) timestamp in ns to which start the query
+        :param until: (optional) timestamp in ns after which the iteration stops
+        :returns: generator of pages, lists of raw trades [price, vol, time (s), ...]
+        """
+        return krakenAPI._iterPages(krakenAPI._publicAPI, pair, since, until)
+
+    def _iterPages(publicAPI, pair, since, until):
+        """ Pages of the Trades method following the last cursor (see iterHistoryTrades) """
+        while True:
+            params = {"pair": pair}
+            if since is not None: params["since"] = str(since)
+            response = publicAPI("Trades", params)
+            try:
+                last = int(response["last"])
+                page = next(v for v in response.values() if isinstance(v, list))
+            except (AttributeError, ValueError, KeyError, TypeError, StopIteration) as e:
+                raise APIException(e)
+
+            if until is not None and page and page[-1][2] * 1e9 > until:
+                page = [trade for trade in page if trade[2] * 1e9 <= until]
+                if page: yield page
+                return
+            if page: yield page
+            if not page or (since is not None and last <= since): return
+            if until is not None and last >= until: return
+            since = last
+
+    def _parseHistoryTrades(response):
+        """
+        Parse the reply of the Trades method.
+
+        :param response: result of the Trades method
+        :returns: ([[price, vol, time (s)],], last (s))
+        :raises APIException: if the reply is not a list of trades with a last cursor
+        """
         try:
             for v in response.values():
                 if isinstance(v, list): 
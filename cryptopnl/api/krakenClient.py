@@ -0,0 +1,201 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt
+from urllib.parse import urlencode, urlsplit
+import http.client
+import json
+import threading
+import time
+from cryptopnl.api.exchangeAPI import exchangeAPI, APIException
+from cryptopnl.api.krakenAPI import krakenAPI
+
+class token_bucket:
+    """
+    Thread safe token bucket rate limiter.
+
+    Tokens are refilled continuously at rate per second up to capacity,
+    acquire blocks until a token is available.
+
+    :param rate: tokens added per second
+    :param capacity: maximum number of tokens (burst size)
+    """
+
+    def __init__(self, rate:float, capacity:float = 1, clock = time.monotonic, sleep = time.sleep) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """ Take a token, waiting for it if needed """
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+class krakenClient(exchangeAPI):
+    """
+    Kraken public API client for many concurrent requests.
+
+    Each worker thread keeps its own keep-alive connection (no handshake per
+    request), every request takes a token of a shared rate limiter and
+    transient failures (connection errors, HTTP 429/5xx, Kraken busy or rate
+    limit errors) are retried with an exponential backoff.
+
+    Methods
+    -------
+    getServerTime()
+        Get server time
+    getHistoryTrades(pair, since)
+        Get one page of history trades (same reply as krakenAPI)
+    iterHistoryTrades(pair, since, until)
+        Iterate over the pages of history trades
+    map(function, items)
+        Apply a function (e.g. a paginated fetch) to items across the workers
+    """
+
+    API_DOMAIN = krakenAPI.API_DOMAIN
+    PUBLIC = krakenAPI.PUBLIC
+    RESULT = krakenAPI.RESULT
+    ERROR = "error"
+    RATE = 1.0 # Kraken public endpoints allow about one request per second
+    TRANSIENT_STATUS = (429, 500, 502, 503, 504)
+    TRANSIENT_ERRORS = ("EAPI:Rate limit exceeded", "EService:Unavailable", "EService:Busy", "EGeneral:Temporary lockout")
+
+    def __init__(self, api_domain:str = API_DOMAIN, workers:int = 4, rate:float = RATE, burst:float = 1,
+                 retries:int = 3, backoff:float = 1.0, timeout:float = 30) -> None:
+        """
+        :param api_domain: (str) API location
+        :param workers: (int) number of concurrent requests
+        :param rate: (float) requests per second allowed
+        :param burst: (float) requests allowed at once after an idle period
+        :param retries: (int) attempts after a transient failure
+        :param backoff: (float) seconds before the first retry (doubled at each retry)
+        :param timeout: (float) seconds before a request is abandoned
+        """
+        url = urlsplit(api_domain)
+        self._scheme, self._host = url.scheme, url.netloc
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.limiter = token_bucket(rate, burst)
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        """ Keep-alive connection of the current thread """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+            connection = connection_class(self._host, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _drop_connection(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None: connection.close()
+        self._local.connection = None
+
+    def _publicAPI(self, method, params = None):
+        """
+        Generic public API request (rate limited, retried on transient failures).
+
+        :param method: API method to retrieve data from
+        :returns: JSON response
+        :raises APIException: if the request failed
+        """
+        query = krakenClient.PUBLIC + method + ("?" + urlencode(params) if params else "")
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            try:
+                connection = self._connection()
+                connection.request("GET", query, headers={"User-Agent": "Kraken REST API"})
+                response = connection.getresponse()
+                body = response.read()
+                if response.status in krakenClient.TRANSIENT_STATUS:
+                    error = APIException(f"HTTP {response.status}")
+                else:
+                    reply = json.loads(body.decode())
+                    errors = reply.get(krakenClient.ERROR) or []
+                    if not any(e in krakenClient.TRANSIENT_ERRORS for e in errors):
+                        if errors: raise APIException(errors)
+                        return reply[krakenClient.RESULT]
+                    error = APIException(errors)
+            except (OSError, http.client.HTTPException) as e:
+                self._drop_connection()
+                error = APIException(e)
+            except (ValueError, KeyError, AttributeError) as e:
+                raise APIException(e)
+            if attempt < self.retries:
+                time.sleep(delay)
+                delay *= 2
+        raise error
+
+    def getServerTime(self):
+        """
+        Get server time.
+
+        :returns: datetime object of current server time
+        """
+        response = self._publicAPI("Time")
+        try:
+            return dt.fromtimestamp(response[krakenAPI.UNIXTIME])
+        except (TypeError, KeyError, OSError) as e:
+            raise APIException(e)
+
+    def getHistoryTrades(self, pair, since = None):
+        """
+        Get history trades for a particular cryptocurrency (see krakenAPI.getHistoryTrades).
+
+        :param pair: cryptocurrency pair
+        :param since: (optional) timestamp in ns to which start the query
+        :returns: ([[price, vol, time (s)],], last (s))
+        """
+        params = {"pair": pair}
+        if since is not None: params["since"] = str(since)
+        return krakenAPI._parseHistoryTrades(self._publicAPI("Trades", params))
+
+    def iterHistoryTrades(self, pair, since = None, until = None):
+        """
+        Iterate over the history trades of a cryptocurrency, page by page
+        (see krakenAPI.iterHistoryTrades).
+
+        :param pair: cryptocurrency pair
+        :param since: (optional) timestamp in ns to which start the query
+        :param until: (optional) timestamp in ns after which the iteration stops
+        :returns: generator of pages, lists of raw trades [price, vol, time (s), ...]
+        """
+        return krakenAPI._iterPages(self._publicAPI, pair, since, until)
+
+    def getTickerAPI(self):
+        """Get updated ticker information."""
+        raise NotImplementedError
+
+    def map(self, function, items) -> list:
+        """
+        Apply a function to items concurrently (results in the items order).
+        Typically a paginated fetch of one pair per item.
+
+        :param function: callable taking an item
+        :param items: iterable of items
+        """
+        return list(self._executor.map(function, items))
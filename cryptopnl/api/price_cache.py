@@ -0,0 +1,118 @@
+from collections import OrderedDict
+import pandas as pd
+
+class price_cache:
+    """
+    Bounded in-process cache of prices with LRU eviction.
+
+    Prices are keyed on (asset, time bucket) of the time they were resolved
+    for, with the span of times they are known to answer: from the time of 
+    the price (e.g. the latest stored one before) to the time resolved. A
+    time within the span of the entry of its bucket is answered from memory,
+    exactly as the store would, so repeated timestamps do not reach the 
+    price store or the API. A price never answers a time before its own 
+    (no look ahead): a later price only ends the span of the earlier entry 
+    of its bucket, which is kept.
+    The least recently used entry is evicted beyond maxsize entries.
+
+    Attributes
+    ----------
+    :param maxsize: maximum number of cached prices
+    :param resolution: bucket length in ns (1 for exact timestamps)
+    :param hits / misses / evictions: lookup counters
+
+    Methods
+    -------
+    get(asset, time)
+        Cached price of a time (None if not within the span of the entry of its bucket)
+    put(asset, time, price, since)
+        Caches the price of a time in its bucket
+    truncate(asset, time)
+        Ends the spans including the time of a new price
+    clear()
+        Empties the cache (counters included)
+    """
+
+    MAXSIZE = 4096
+    RESOLUTION = "1min"
+
+    def __init__(self, maxsize:int = MAXSIZE, resolution = RESOLUTION) -> None:
+        """
+        :param maxsize: (int) maximum number of cached prices
+        :param resolution: bucket length (pandas.Timedelta, string like "1min" or int ns)
+        """
+        if maxsize < 1: raise ValueError("The cache needs room for at least one price.")
+        self.maxsize = maxsize
+        self.resolution = resolution if isinstance(resolution, int) else pd.Timedelta(resolution).value
+        if self.resolution < 1: raise ValueError("The resolution must be positive.")
+        self._prices = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._prices)
+
+    def key(self, asset:str, time) -> tuple:
+        """ (asset, bucket) of a time (pandas.Timestamp or int ns) """
+        return (asset, int(getattr(time, "value", time)) // self.resolution)
+
+    def get(self, asset:str, time):
+        """
+        Cached price of a time
+
+        :param asset: (str) asset name
+        :param time: pandas.Timestamp or int ns
+        :return : price or None if not cached (time out of the span of the entry of its bucket)
+        """
+        key = self.key(asset, time)
+        entry = self._prices.get(key)
+        if entry is None or not entry[0] <= int(getattr(time, "value", time)) <= entry[1]:
+            self.misses += 1
+            return None
+        self._prices.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, asset:str, time, price, since = None) -> None:
+        """
+        Cache the price of a time in its bucket (evicting the least recently used one if full).
+        The entry of the bucket answers the times from since to time; a later price 
+        only ends the span of an earlier entry.
+
+        :param asset: (str) asset name
+        :param time: pandas.Timestamp or int ns
+        :param price: price to cache
+        :param since: (optional) time of the price (pandas.Timestamp or int ns), 
+                      at or before time (time by default)
+        """
+        key = self.key(asset, time)
+        time = int(getattr(time, "value", time))
+        since = int(getattr(since, "value", since)) if since is not None else time
+        entry = self._prices.get(key)
+        if entry is None or since < entry[0]: self._prices[key] = (since, time, price)
+        elif since == entry[0]: self._prices[key] = (since, max(time, entry[1]), entry[2])
+        elif since <= entry[1]: self._prices[key] = (entry[0], since - 1, entry[2])
+        self._prices.move_to_end(key)
+        if len(self._prices) > self.maxsize:
+            self._prices.popitem(last=False)
+            self.evictions += 1
+
+    def truncate(self, asset:str, time) -> None:
+        """
+        End the spans of the entries of an asset at a new price time 
+        (e.g. a price added to the store), whatever their bucket
+
+        :param asset: (str) asset name
+        :param time: pandas.Timestamp or int ns
+        """
+        time = int(getattr(time, "value", time))
+        for key, (since, until, price) in self._prices.items():
+            if key[0] == asset and since < time <= until: self._prices[key] = (since, time - 1, price)
+
+    def clear(self) -> None:
+        self._prices.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def info(self) -> dict:
+        """ Counters and occupation of the cache """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self._prices), "maxsize": self.maxsize}
@@ -0,0 +1,181 @@
+import queue
+import threading
+import numpy as np
+import pandas as pd
+from cryptopnl.api.krakenAPI import krakenAPI
+from cryptopnl.api.price_store import price_store
+from cryptopnl.main.trades import Trades
+
+FIAT = "ZEUR"
+LOOKBACK_NS = 3600 * 10**9 # history fetched before each needed time
+PAGE_BUFFER = 8 # pages fetched ahead of the store (concurrent clients)
+
+def price_windows(trades:pd.DataFrame, lookback:int = LOOKBACK_NS, max_gap:int = None, needed:dict = None) -> dict:
+    """
+    Time windows of the fiat prices needed to value the crypto to crypto trades
+    (and any other needed times). Both assets of a crypto to crypto pair are
+    needed at the time of the trade, each needing [time - lookback, time].
+    Only times closer than max_gap are merged in a single window: by default 
+    the lookback, i.e. overlapping windows, as the whole raw trades history 
+    of a window is fetched (merging distant times would page through far 
+    more ticks than the valuations need).
+
+    Parameters
+    ----------
+    trades (pandas.DataFrame) : trades (pair and time columns), or None
+    lookback (int) : ns fetched before each needed time (a price at or before it is needed)
+    max_gap (int) : (optional) ns between two needed times below which one window 
+                    covers both (the lookback by default)
+    needed (dict) : (optional) {asset: times in ns} of other needed prices (e.g. valuations)
+
+    Returns
+    -------
+    dict {asset: [(start ns, end ns),]} with sorted, disjoint windows
+    """
+    assets, times = [], []
+    if trades is not None:
+        pairs = trades[Trades.PAIR_COL]
+        crypto2crypto = trades[~pairs.str.endswith("EUR")]
+        if not crypto2crypto.empty:
+            trade_times = pd.to_datetime(crypto2crypto[Trades.TIME_COL]).astype("datetime64[ns]").to_numpy().view(np.int64)
+            pairs = crypto2crypto[Trades.PAIR_COL]
+            assets += [pairs.str[:4].to_numpy(), pairs.str[4:].to_numpy()]
+            times += [trade_times, trade_times]
+    for asset, asset_times in (needed or {}).items():
+        asset_times = np.asarray(asset_times, dtype=np.int64)
+        assets.append(np.full(len(asset_times), asset, dtype=object))
+        times.append(asset_times)
+    if not assets: return {}
+    needed = pd.DataFrame({"asset": np.concatenate(assets), "time": np.concatenate(times)})
+
+    max_gap = lookback if max_gap is None else max_gap
+    windows = {}
+    for asset, asset_times in needed.groupby("asset")["time"]:
+        asset_times = np.unique(asset_times.to_numpy())
+        breaks = np.flatnonzero(np.diff(asset_times) > max_gap) + 1
+        starts = asset_times[np.concatenate([[0], breaks])] - lookback
+        ends = asset_times[np.concatenate([breaks - 1, [len(asset_times) - 1]])]
+        windows[asset] = list(zip(starts.tolist(), ends.tolist()))
+    return windows
+
+def window_pages(jobs:list, api = krakenAPI, fiat:str = FIAT, buffer:int = PAGE_BUFFER):
+    """
+    Pages of the history trades of several windows, as they are fetched.
+    A concurrent client (see krakenClient) fetches the windows in parallel,
+    its workers handing the pages over through a queue of a few pages (the
+    memory stays bounded whatever the size of the windows).
+
+    Parameters
+    ----------
+    jobs (list) : (asset, start ns, end ns) windows
+    api : exchangeAPI class or client instance (krakenAPI by default)
+    fiat (str) : fiat currency of the pairs
+    buffer (int) : pages fetched ahead of the consumer (concurrent client)
+
+    Returns
+    -------
+    generator of (job index, [(time ns, price),]) pages, then (job index, None)
+    once the window of the job is complete
+
+    Raises
+    ------
+    the error of a failed fetch
+    """
+    if not hasattr(api, "map"):
+        for i, (asset, start, end) in enumerate(jobs):
+            for page in api.iterHistoryTrades(asset + fiat, since = start, until = end):
+                yield i, page_points(page)
+            yield i, None
+        return
+
+    pages = queue.Queue(maxsize=buffer)
+    stop = threading.Event()
+    def fetch(i):
+        asset, start, end = jobs[i]
+        try:
+            for page in api.iterHistoryTrades(asset + fiat, since = start, until = end):
+                if stop.is_set(): return
+                pages.put((i, page_points(page)))
+            pages.put((i, None))
+        except Exception as e:
+            pages.put((i, e))
+    fetcher = threading.Thread(target=api.map, args=(fetch, range(len(jobs))), daemon=True)
+    fetcher.start()
+    try:
+        done = 0
+        while done < len(jobs):
+            i, points = pages.get()
+            if isinstance(points, Exception): raise points
+            if points is None: done += 1
+            yield i, points
+    finally:
+        # Unblock the workers still handing pages over
+        stop.set()
+        while fetcher.is_alive():
+            try:
+                pages.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+def page_points(page:list) -> list:
+    """ (time ns, price) points of a page of raw history trades """
+    return [(int(trade[2]*1e9), trade[0]) for trade in page]
+
+def backfill(store:price_store, asset:str, start:int, end:int, api = krakenAPI, fiat:str = FIAT) -> int:
+    """
+    Store the whole price history of an asset between two times, page by page 
+    (only one page in memory) and record it as covered
+
+    Parameters
+    ----------
+    store (price_store) : where to save the prices
+    asset (str) : crypto name
+    start (int) : ns of the first trade
+    end (int) : ns of the last trade
+    api : exchangeAPI class or client instance (krakenAPI by default)
+    fiat (str) : fiat currency of the pair
+
+    Returns
+    -------
+    (int) number of stored prices
+    """
+    count = 0
+    for page in api.iterHistoryTrades(asset + fiat, since = start, until = end):
+        points = page_points(page)
+        store.add_prices(asset, points)
+        count += len(points)
+    store.add_coverage(asset, start, end)
+    return count
+
+def prefetch_prices(store:price_store, trades:pd.DataFrame, api = krakenAPI, fiat:str = FIAT,
+                    lookback:int = LOOKBACK_NS, max_gap:int = None, needed:dict = None) -> int:
+    """
+    Fill a price store with the prices needed by the crypto to crypto trades
+    before processing them: one paginated fetch per window (see price_windows),
+    stored page by page and recorded as covered once complete. Covered windows 
+    are not fetched again. With a concurrent client (see krakenClient) the 
+    windows are fetched in parallel (see window_pages).
+
+    Parameters
+    ----------
+    store (price_store) : where to save the prices
+    trades (pandas.DataFrame) : trades (pair and time columns), or None
+    api : exchangeAPI class or client instance (krakenAPI by default)
+    fiat (str) : fiat currency of the fetched pairs
+    lookback (int) / max_gap (int) / needed (dict) : see price_windows
+
+    Returns
+    -------
+    (int) number of stored prices
+    """
+    jobs = [(asset, start, end) for asset, windows in price_windows(trades, lookback, max_gap, needed).items()
+                for start, end in windows if not store.covers(asset, start, end)]
+    count = 0
+    for i, points in window_pages(jobs, api, fiat):
+        asset, start, end = jobs[i]
+        if points is None:
+            store.add_coverage(asset, start, end)
+        else:
+            store.add_prices(asset, points)
+            count += len(points)
+    return count
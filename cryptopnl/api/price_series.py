@@ -0,0 +1,89 @@
+import bisect
+import numpy as np
+import pandas as pd
+
+class price_series:
+    """
+    Prices of an asset sorted by time, answering "price at or just before t".
+
+    Times are kept in a sorted int64 array (ns), so a lookup is a binary
+    search and a whole column of times is resolved at once with
+    numpy.searchsorted.
+
+    Attributes
+    ----------
+    :param times: numpy.ndarray of int64 times in ns (sorted)
+    :param prices: numpy.ndarray of prices (objects, Decimal or str), aligned with times
+
+    Methods
+    -------
+    from_trades(data)
+        Series of the history trades returned by the API
+    price_at(time)
+        Time and price of the latest point at or before a time
+    prices_at(times)
+        Same as price_at for a whole column of times
+    """
+
+    MISSING = -1
+
+    def __init__(self, times, prices) -> None:
+        """
+        :param times: times in ns (int) or pandas.Timestamp, in any order
+        :param prices: prices aligned with times
+        """
+        times, prices = price_series.to_ns_array(times), list(prices)
+        order = np.argsort(times, kind="stable")
+        self.times = times[order]
+        self.prices = np.empty(len(order), dtype=object)
+        self.prices[:] = [prices[i] for i in order]
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @classmethod
+    def from_trades(cls, data:list) -> "price_series":
+        """
+        Series of the history trades of the API ([[price, vol, time (s)],])
+
+        :param data: list of trades as returned by exchangeAPI.getHistoryTrades
+        """
+        return cls([int(chunk[2]*1e9) for chunk in data], [chunk[0] for chunk in data])
+
+    def price_at(self, time) -> tuple:
+        """
+        Latest point at or before a time (bisection)
+
+        :param time: pandas.Timestamp or int ns
+        :return : (time in ns, price) or (MISSING, MISSING) if there is no earlier point
+        """
+        position = bisect.bisect_right(self.times, getattr(time, "value", time)) - 1
+        if position < 0: return (price_series.MISSING, price_series.MISSING)
+        return (int(self.times[position]), self.prices[position])
+
+    def prices_at(self, times) -> tuple:
+        """
+        Latest points at or before a column of times (vectorized)
+
+        :param times: array like of pandas.Timestamp, datetime64 or int ns
+        :return : (numpy.ndarray of times in ns, numpy.ndarray of prices),
+                  MISSING time and None price where there is no earlier point
+        """
+        times = price_series.to_ns_array(times)
+        positions = np.searchsorted(self.times, times, side="right") - 1
+        found = positions >= 0
+        found_times = np.full(len(times), price_series.MISSING, dtype=np.int64)
+        found_prices = np.full(len(times), None, dtype=object)
+        found_times[found] = self.times[positions[found]]
+        found_prices[found] = self.prices[positions[found]]
+        return found_times, found_prices
+
+    @staticmethod
+    def to_ns_array(times) -> np.ndarray:
+        """ int64 array of ns times (from timestamps, datetime64 or integers) """
+        if isinstance(times, (pd.Series, pd.Index)) and times.dtype.kind == "M":
+            return times.astype("datetime64[ns]").to_numpy().view(np.int64)
+        values = np.asarray(times)
+        if values.dtype.kind == "M": return values.astype("datetime64[ns]").view(np.int64)
+        if values.dtype == object: return np.array([getattr(t, "value", t) for t in values], dtype=np.int64)
+        return values.astype(np.int64)
@@ -0,0 +1,174 @@
+import json
+import sqlite3
+from decimal import Decimal
+from cryptopnl.api.price_series import price_series
+
+class price_store:
+    """
+    Local store of historical prices backed by an SQLite table.
+
+    Prices are kept by (asset, time in ns) in an indexed table, so adding a
+    price is a single row insert (no file rewrite) and the price at or just
+    before a time is an index lookup. Prices are stored as exact decimal
+    strings.
+
+    Attributes
+    ----------
+    :param db_file: location of the SQLite database (":memory:" allowed)
+
+    Methods
+    -------
+    add_price(asset, time, price)
+        Stores one price
+    add_prices(asset, prices)
+        Stores many prices of an asset in a single transaction
+    get_price(asset, time)
+        Price at an exact time
+    get_price_before(asset, time)
+        Latest price at or before a time
+    get_series(asset, start, end)
+        Stored prices of an asset as a price_series (batch lookups)
+    add_coverage(asset, start, end) / covers(asset, start, end)
+        Records / checks a time range whose whole price history is stored
+    import_json(json_file)
+        Imports a legacy JSON price cache
+    """
+
+    SCHEMA = """CREATE TABLE IF NOT EXISTS prices (
+                    asset TEXT NOT NULL,
+                    time INTEGER NOT NULL,
+                    price TEXT NOT NULL,
+                    PRIMARY KEY (asset, time)
+                ) WITHOUT ROWID"""
+    COVERAGE_SCHEMA = """CREATE TABLE IF NOT EXISTS coverage (
+                    asset TEXT NOT NULL,
+                    start INTEGER NOT NULL,
+                    end INTEGER NOT NULL
+                )"""
+
+    def __init__(self, db_file:str) -> None:
+        """
+        :param db_file: (str) database location (created if needed)
+        """
+        self.db_file = db_file
+        self._db = sqlite3.connect(db_file)
+        self._db.execute(price_store.SCHEMA)
+        self._db.execute(price_store.COVERAGE_SCHEMA)
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM prices").fetchone()[0]
+
+    def add_price(self, asset:str, time, price) -> None:
+        """
+        Store the price of an asset at a time (replaces a previous one)
+
+        :param asset: (str) asset name
+        :param time: (pandas.Timestamp or int ns) time of the price
+        :param price: price (Decimal, str or number)
+        """
+        self.add_prices(asset, [(time, price)])
+
+    def add_prices(self, asset:str, prices) -> None:
+        """
+        Store many prices of an asset in a single transaction
+
+        :param asset: (str) asset name
+        :param prices: iterable of (time, price) pairs
+        """
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO prices VALUES (?, ?, ?)",
+                                 ((asset, price_store.to_ns(time), str(price)) for time, price in prices))
+
+    def get_price(self, asset:str, time) -> Decimal:
+        """
+        Price of an asset at an exact time
+
+        :param asset: (str) asset name
+        :param time: (pandas.Timestamp or int ns)
+        :return : Decimal or None if unknown
+        """
+        row = self._db.execute("SELECT price FROM prices WHERE asset = ? AND time = ?",
+                               (asset, price_store.to_ns(time))).fetchone()
+        return Decimal(row[0]) if row else None
+
+    def get_price_before(self, asset:str, time) -> tuple:
+        """
+        Latest price of an asset at or before a time (index range lookup)
+
+        :param asset: (str) asset name
+        :param time: (pandas.Timestamp or int ns)
+        :return : (time in ns, Decimal price) or None if there is no earlier price
+        """
+        row = self._db.execute("SELECT time, price FROM prices WHERE asset = ? AND time <= ? "
+                               "ORDER BY time DESC LIMIT 1", (asset, price_store.to_ns(time))).fetchone()
+        return (row[0], Decimal(row[1])) if row else None
+
+    def get_series(self, asset:str, start = None, end = None) -> price_series:
+        """
+        Stored prices of an asset between two times (included) as a price_series,
+        to resolve many times at once
+
+        :param asset: (str) asset name
+        :param start: (optional) pandas.Timestamp or int ns (the latest earlier price is included)
+        :param end: (optional) pandas.Timestamp or int ns
+        :return : price_series of Decimal prices
+        """
+        start = price_store.to_ns(start) if start is not None else None
+        end = price_store.to_ns(end) if end is not None else 2**63 - 1
+        if start is not None:
+            earlier = self.get_price_before(asset, start)
+            if earlier is not None: start = earlier[0]
+        rows = self._db.execute("SELECT time, price FROM prices WHERE asset = ? AND time >= ? AND time <= ? ORDER BY time",
+                                (asset, start if start is not None else -2**63, end)).fetchall()
+        return price_series([t for t, _ in rows], [Decimal(p) for _, p in rows])
+
+    def add_coverage(self, asset:str, start, end) -> None:
+        """
+        Record that every price of an asset between two times is stored
+        (e.g. a fetched history), so the latest earlier price is reliable there
+
+        :param asset: (str) asset name
+        :param start: pandas.Timestamp or int ns
+        :param end: pandas.Timestamp or int ns
+        """
+        with self._db:
+            self._db.execute("INSERT INTO coverage VALUES (?, ?, ?)",
+                             (asset, price_store.to_ns(start), price_store.to_ns(end)))
+
+    def covers(self, asset:str, start, end = None) -> bool:
+        """
+        Whether a time (or a time range) is within a recorded coverage of an asset
+
+        :param asset: (str) asset name
+        :param start: pandas.Timestamp or int ns
+        :param end: (optional) pandas.Timestamp or int ns (start by default)
+        """
+        start = price_store.to_ns(start)
+        end = price_store.to_ns(end) if end is not None else start
+        row = self._db.execute("SELECT 1 FROM coverage WHERE asset = ? AND start <= ? AND end >= ? LIMIT 1",
+                               (asset, start, end)).fetchone()
+        return row is not None
+
+    def import_json(self, json_file:str) -> int:
+        """
+        Import a JSON price cache {asset: {time in ns: price}} (legacy prices file)
+
+        :param json_file: (str) location of the JSON cache
+        :return : (int) number of imported prices
+        """
+        with open(json_file, "r") as fp:
+            cached = json.load(fp)
+        count = 0
+        for asset, prices in cached.items():
+            self.add_prices(asset, ((int(time), price) for time, price in prices.items()))
+            count += len(prices)
+        return count
+
+    @staticmethod
+    def to_ns(time) -> int:
+        """ Time in ns of a pandas.Timestamp (or an integer already in ns) """
+        return int(getattr(time, "value", time))
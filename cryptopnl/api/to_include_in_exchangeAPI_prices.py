@@ -1,64 +1,123 @@
+import os
+from decimal import Decimal
+import numpy as np
 import pandas as pd
-import json
-from cryptopnl.price_api.queryAPI import queryAPI
+from cryptopnl.api.krakenAPI import krakenAPI
+from cryptopnl.api.price_cache import price_cache
+from cryptopnl.api.price_prefetch import prefetch_prices
+from cryptopnl.api.price_series import price_series
+from cryptopnl.api.price_store import price_store
+
+LOOKBACK_NS = 3600 * 10**9 # trades fetched before the time of a price
 
 def getCloserTime(data, time):
-    minLapse = 1e20
-    minTime = -1
-    minPrice = -1
-    for chunk in data:
-        tt = int(chunk[2]*1e9)
-        diff = time - tt
-        if diff < 0:
-            break 
-        if diff < minLapse:
-            minTime = tt
-            minPrice = chunk[0]
-
-    if minTime == -1:
+    """
+    Closest point at or before a time among the history trades of the API
+
+    :param data: [[price, vol, time (s)],] as returned by getHistoryTrades
+    :param time: (int) time in ns
+    :return : (time in ns, price), (-1, -1) if there is no earlier point
+    """
+    (minTime, minPrice) = price_series.from_trades(data).price_at(time)
+    if minTime == price_series.MISSING:
         print("ERROR FINDING POINT")
     return (minTime, minPrice)
 
 class prices:
-    def __init__(self, file, cryptos, restore = False):
+    """
+    Historical prices of the cryptos, from a local price_store or from the API.
+
+    :param file: price store location. A legacy JSON cache (".json") is
+                 imported once into a store next to it (".sqlite")
+    :param cryptos: cryptos of interest
+    :param restore: start from an empty store
+    :param cache_size: number of prices kept in memory (LRU, see price_cache)
+    :param resolution: time bucket of the cached prices (e.g. "1min")
+    """
+
+    FIAT = "ZEUR"
+
+    def __init__(self, file, cryptos, restore = False, cache_size = price_cache.MAXSIZE, 
+                 resolution = price_cache.RESOLUTION):
         self.file = file
         self.cryptos = cryptos
+        self.cache = price_cache(cache_size, resolution)
         self.loadPrices(restore)
-        self.savePrices()
-
-    def savePrices(self):
-        with open(self.file, 'w') as fp:
-            json.dump(self.prices, fp)
 
     def loadPrices(self, restore = False):
-        try:
-            with open(self.file, 'r') as fp:
-                self.prices = json.load(fp)
-            if restore:
-                raise Exception()
-        except: 
-            self.prices = {}
-            for c in self.cryptos:
-                self.prices[c] = {}
+        json_file = self.file if self.file.endswith(".json") else None
+        db_file = self.file[:-len(".json")] + ".sqlite" if json_file else self.file
+        if restore and os.path.exists(db_file): os.remove(db_file)
+        is_new = not os.path.exists(db_file)
+        self.store = price_store(db_file)
+        if is_new and not restore and json_file and os.path.exists(json_file):
+            self.store.import_json(json_file)
 
     def addPrice(self, crypto, time, price):
-        self.prices[crypto][str(time.value)] = price
-        self.savePrices()
+        self.store.add_price(crypto, time, price)
+        self.cache.truncate(crypto, time)
+        self.cache.put(crypto, time, Decimal(str(price)))
+
+    def prefetch(self, trades, api = krakenAPI, needed = None):
+        """
+        Fetch in bulk the prices needed by the crypto to crypto trades
+        (see price_prefetch.prefetch_prices)
+
+        :param trades: pandas.DataFrame of trades (pair and time columns), or None
+        :param api: exchangeAPI class (krakenAPI by default)
+        :param needed: (optional) {crypto: times in ns} of other needed prices
+        """
+        return prefetch_prices(self.store, trades, api = api, fiat = prices.FIAT, needed = needed)
 
     def getPrice(self, crypto, time):
-        if str(time.value) in self.prices[crypto]:
-            return self.prices[crypto][str(time.value)]
-        return self.getPriceAPI(crypto, time)
+        """
+        Price of a crypto at a time: cached, stored (at or just before the 
+        time within the covered ranges) or else from the API
+
+        :param crypto: crypto name
+        :param time: pandas.Timestamp
+        :return : Decimal price, None if there is no earlier price
+        """
+        price = self.cache.get(crypto, time)
+        if price is not None: return price
+        price, since = self.store.get_price(crypto, time), time
+        if price is None and self.store.covers(crypto, time): 
+            earlier = self.store.get_price_before(crypto, time)
+            if earlier is not None: since, price = earlier
+        if price is None: return self.getPriceAPI(crypto, time)
+        self.cache.put(crypto, time, price, since)
+        return price
     
+    def getPrices(self, crypto, times):
+        """
+        Stored prices at or just before a column of times, resolved at once
+
+        :param crypto: crypto name
+        :param times: array like of times (pandas.Timestamp, datetime64 or ns)
+        :return : numpy.ndarray of Decimal prices (None if no earlier price is stored)
+        """
+        times = price_series.to_ns_array(times)
+        if not len(times): return np.empty(0, dtype=object)
+        series = self.store.get_series(crypto, start = int(times.min()), end = int(times.max()))
+        return series.prices_at(times)[1]
+
     def getPriceAPI(self, crypto, time):
-        data = queryAPI(crypto, time.value)
+        """
+        Price of a crypto at a time from the API (last trade at or before it),
+        added to the store
+
+        :param crypto: crypto name
+        :param time: pandas.Timestamp
+        :return : Decimal price, None if the API has no earlier trade
+        """
+        data, _ = krakenAPI.getHistoryTrades(crypto + prices.FIAT, since = time.value - LOOKBACK_NS)
 
         (prevTime, prevPrice) = getCloserTime(data, time.value)
+        if prevTime == price_series.MISSING: return None
         print(f"Price {prevPrice} of {crypto} at {pd.to_datetime(prevTime)} (closest point of {time})")
-        if (prevTime > 0):
-            self.addPrice(crypto, time, prevPrice)
-            return prevPrice
-        return -1
+        price = Decimal(str(prevPrice))
+        self.addPrice(crypto, time, price)
+        return price
 
 if __name__ == "__main__":
     # pr = prices("myHistory/prices.json", ["jaja", "XBT", "ETH", "LTC"])
@@ -68,7 +127,7 @@ if __name__ == "__main__":
     # print(pr.prices)
 
     pr = prices("myHistory/prices.json", ["XBT", "ETH", "LTC"])
-    print(pr.prices)
+    print(len(pr.store))
 
     time = pd.to_datetime('2017-09-03 14:24:39.514800')
     price = pr.getPrice("ETH", time)
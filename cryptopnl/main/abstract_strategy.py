@@ -1,6 +1,9 @@
 import abc
+import json
 import os
 from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_EVEN
+from cryptopnl.main.gains import gains_table
 from cryptopnl.main.trades import Trades
 from cryptopnl.wallet.wallet import wallet
 import pandas as pd
@@ -15,12 +18,14 @@ class abstract_strategy(metaclass = abc.ABCMeta):
     ----------
     :param _trades: Trade instance with all trades information (optional ledger)
     :param _wallet: wallet instance to track all cryptocurrency
-    TODO :param gains: pandas dataframe tracking current profits or losses
+    :param gains: gains_table of the realised profits or losses (one row per lot of each sale)
 
     Methods:
     --------
     process_all_trades()
         Loop over all the trades to calculate all the profits / losses
+    save_checkpoint() / load_checkpoint()
+        Persist / restore the progress to resume later on appended trades
     process_trade()
         Process one trade identifying the type : crypto/fiat or vice versa
     fiat2crypto() : abstract
@@ -29,13 +34,27 @@ class abstract_strategy(metaclass = abc.ABCMeta):
         Trade involving selling cryptocurrency
     crypto2crypto() : abstract
         Trade involving the exchange of two cryptocurrencies
+    gains_summary()
+        Total of the profits by year
+    fifo_gains
+        Legacy view of the profits {year: [(time, profit)]}
     pnl_summary()
         Detailed information over the profits and losses
     go()
         Process and generates a summary of earning
     """
 
-    def __init__(self, trades_file:str) -> None:  
+    # Checkpoint keys
+    PROCESSED = "processed"
+    LAST_TXID = "last_txid"
+    LAST_TIME = "last_time"
+    WALLET = "wallet"
+    GAINS = "gains"
+    OFFSETS = "offsets" # byte offsets of the last processed trade in the files
+
+    RESUMES_FROM_OFFSETS = True # resumed runs skip the processed rows unparsed (see Trades.seek)
+
+    def __init__(self, trades_file:str, fixed_point:bool = False, backend = None, chunksize:int = None, cache_dir:str = None) -> None:  
         """ 
         Initialize an instance with a Trades object and a Wallet
 
@@ -43,21 +62,97 @@ class abstract_strategy(metaclass = abc.ABCMeta):
         ----------
         trades_file (str) : location of a file with the trades
         ledger_file (str) . (optional) location of a file with the ledger 
+        fixed_point (bool) : (optional) fast load of the trades as scaled integers
+        backend : (optional) numeric backend of the wallet (Decimal by default)
+        chunksize (int) : (optional) stream the files by chunks of rows instead of loading them
+        cache_dir (str) : (optional) directory of a binary cache of the parsed files
         """
         if not os.path.exists(trades_file): raise FileNotFoundError
 
         self.use_ledger_4_calc = True
-        self._trades = Trades(trades_file=trades_file)
-        self._wallet = wallet()
-        self.fifo_gains = defaultdict(list)
+        self._trades = Trades(trades_file=trades_file, fixed_point=fixed_point, chunksize=chunksize, cache_dir=cache_dir)
+        self._wallet = wallet(backend=backend)
+        self.gains = gains_table()
+        self._processed = 0 # number of trades already processed
+        self._last_trade = None # (txid, time) of the last processed trade
         return 
 
     def process_all_trades(self) -> None:
-        """ Iterate over all trades. """
-        for _, trade in self._trades:
+        """ 
+        Iterate over all trades (as light named tuples records). 
+        After a checkpoint is loaded, only the trades appended since are processed.
+
+        Raises
+        ------
+        ValueError : if the trades file does not extend the checkpointed one
+        """
+        start = max(self._processed - 1, 0)
+        records = self._trades.records(start=start)
+        if self._processed:
+            last = next(records, None)
+            if last is None or (last.txid, last.time) != self._last_trade: 
+                raise ValueError("Trades do not match the checkpoint (file not appended to).")
+
+        for trade in records:
             self.process_trade(trade)
+            self._processed += 1
+            self._last_trade = (trade.txid, trade.time)
         return 
 
+    def save_checkpoint(self, checkpoint_file:str) -> None:
+        """
+        Save the progress (wallet, gains and last processed trade) in a json file
+
+        Parameters
+        ----------
+        checkpoint_file (str) : location of the checkpoint (replaced atomically)
+        """
+        txid, time = self._last_trade if self._last_trade else (None, None)
+        checkpoint = {
+            abstract_strategy.PROCESSED: self._processed,
+            abstract_strategy.LAST_TXID: txid,
+            abstract_strategy.LAST_TIME: time.isoformat() if time is not None else None,
+            abstract_strategy.OFFSETS: self._trades.offsets(self._processed - 1, time) if self._processed else None,
+            abstract_strategy.WALLET: self._wallet.get_state(),
+            abstract_strategy.GAINS: self.gains.get_state(),
+            }
+        tmp_file = checkpoint_file + ".tmp"
+        with open(tmp_file, "w") as fp:
+            json.dump(checkpoint, fp)
+        os.replace(tmp_file, checkpoint_file)
+
+    def load_checkpoint(self, checkpoint_file:str) -> None:
+        """
+        Restore the progress saved by save_checkpoint. 
+        The next process_all_trades resumes after the last processed trade,
+        the files being read from the checkpointed byte offsets: the rows
+        already processed are neither read nor parsed again.
+
+        Parameters
+        ----------
+        checkpoint_file (str) : location of the checkpoint (gains saved by 
+                                year, before the gains table, and checkpoints
+                                without offsets are accepted)
+        """
+        with open(checkpoint_file, "r") as fp:
+            checkpoint = json.load(fp)
+
+        self._processed = checkpoint[abstract_strategy.PROCESSED]
+        time = checkpoint[abstract_strategy.LAST_TIME]
+        self._last_trade = (checkpoint[abstract_strategy.LAST_TXID], pd.Timestamp(time)) if self._processed else None
+        self._wallet.set_state(checkpoint[abstract_strategy.WALLET])
+        gains = checkpoint[abstract_strategy.GAINS]
+        self.gains = gains_table()
+        if gains_table.TIME in gains: 
+            self.gains.set_state(gains)
+        else:
+            # {year: [[time, profit]]}: proceeds and cost basis unknown
+            for profits in gains.values():
+                for t, p in profits: self.gains.append(pd.Timestamp(t), None, Decimal("NaN"), Decimal("NaN"), Decimal(p))
+        if self._last_trade: self._trades.skip_ledger_before(self._last_trade[1])
+        offsets = checkpoint.get(abstract_strategy.OFFSETS)
+        if offsets and self._processed and self.RESUMES_FROM_OFFSETS: self._trades.seek(self._processed - 1, *offsets)
+
     @abc.abstractmethod
     def process_trade(self, trade: pd.Series) -> None:
         """
@@ -117,14 +212,60 @@ class abstract_strategy(metaclass = abc.ABCMeta):
 
         pass
     
+    @property
+    def fifo_gains(self) -> defaultdict:
+        """
+        Legacy view of the profits {year: [(pandas.Timestamp, profit)]}, 
+        one entry per sale, kept up to date from the gains table
+        """
+        return self.gains.by_year()
+
+    def record_sale(self, time, crypto:str, proceeds:Decimal, cost:Decimal, consumed:list) -> Decimal:
+        """
+        Add the gains of a sale to the gains table, one row per lot consumed.
+        The profit of the sale is proceeds - cost; it is shared by volume 
+        between the lots, rounded half even to its own last decimal, the last 
+        lot taking the remainder, so the rows of the sale add up exactly to 
+        its profit (and the proceeds of a row are its cost + its profit).
+
+        Parameters
+        ----------
+        time (pandas.Timestamp) : time of the sale
+        crypto (str) : crypto sold
+        proceeds (Decimal) : fiat received (net of fees)
+        cost (Decimal) : fiat cost of the amount sold (see wallet.take)
+        consumed (list) : (lot id, volume, cost) of the lots taken (see wallet.take)
+
+        Returns
+        -------
+        Decimal profit of the sale
+        """
+        profit = proceeds - cost
+        if len(consumed) < 2:
+            self.gains.append(time, crypto, proceeds, cost, profit, consumed[0][0] if consumed else None)
+            return profit
+
+        lots, vols, costs = zip(*consumed)
+        total = sum(vols, Decimal())
+        unit = Decimal(1).scaleb(profit.as_tuple().exponent)
+        shares = [(profit * vol / total).quantize(unit, rounding=ROUND_HALF_EVEN) if total else Decimal() for vol in vols[:-1]]
+        shares.append(profit - sum(shares, Decimal()))
+        self.gains.extend(getattr(time, "value", time), crypto, [c + s for c, s in zip(costs, shares)], costs, shares, lots, sale=True)
+        return profit
+
+    def gains_summary(self) -> dict:
+        """
+        Total of the profits by year
+        """
+        return self.gains.summary("year")
+
     def pnl_summary(self):
         """
         Calculate a summary of all the profits and print it
 
         Return a simplified dictionary 
         """
-        summary = {year: sum(p for (_, p) in profits) 
-                            for (year, profits) in self.fifo_gains.items()} 
+        summary = self.gains_summary()
         print("\n".join(f"{year}: {profit}" for year, profit in summary.items()))
         return summary
         
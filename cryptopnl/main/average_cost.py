@@ -0,0 +1,327 @@
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+from cryptopnl.api.price_series import price_series
+from cryptopnl.api.to_include_in_exchangeAPI_prices import prices
+from cryptopnl.main.abstract_strategy import abstract_strategy
+from cryptopnl.main.trades import Trades
+
+class average_cost(abstract_strategy):
+    """
+    Profits N Losses Calculator with the weighted average cost method (CUMP).
+
+    The whole portfolio shares a single acquisition cost: fiat purchases
+    add to it, crypto to crypto trades leave it unchanged and a sale for
+    fiat realises  proceeds - fee - cost * proceeds / portfolio value,
+    releasing the same share of the cost.
+
+    The history is processed at once with array operations: the holdings
+    of each asset and the purchased cost are cumulative sums, and the
+    portfolio is only valued at the sales, the prices of each held asset
+    being resolved in one batch. Only the cost recurrence walks the sales.
+    Prices come from a price store (fetched in bulk beforehand) when one is
+    given, else from the latest fiat trade of each asset (no network), which
+    must not be older than max_price_age.
+    Streamed runs fall back to processing the trades one by one.
+
+    Attributes:
+    ----------
+    :param _trades: Trade instance with all trades information
+    :param _wallet: wallet instance holding the amounts and the portfolio cost
+    :param prices: prices of the valuations (None to use the traded prices)
+    :param max_price_age: oldest traded price accepted in a valuation (ns, None for any)
+
+    Methods:
+    --------
+    process_all_trades()
+        Calculate all the profits / losses with array operations
+    process_trade()
+        Process one trade identifying the type : crypto/fiat or vice versa
+    fiat2crypto()
+        Trade involving buying cryptocurrency
+    crypto2fiat()
+        Trade involving selling cryptocurrency
+    crypto2crypto()
+        Trade involving the exchange of two cryptocurrencies
+    portfolio_value()
+        Fiat value of the holdings at a given time
+    pnl_summary()
+        Detailed information over the profits and losses
+    go()
+        Process and generates a summary of earning
+    """
+
+    FIAT = "EUR"
+    MAX_PRICE_AGE = "1D" # oldest traded price valuing a held asset (without price store)
+    RESUMES_FROM_OFFSETS = False # valuations without a price store use the prices of the earlier trades
+
+    def __init__(self, trades_file:str, prices_file:str = None, fixed_point:bool = False, backend = None,
+                 chunksize:int = None, cache_dir:str = None, max_price_age = MAX_PRICE_AGE) -> None:
+        """
+        Initialize an instance with a Trades object and a Wallet
+
+        Parameters
+        ----------
+        trades_file (str) : location of a file with the trades
+        prices_file (str) : (optional) price store of the valuations (see prices),
+                            by default the assets are valued at their latest fiat trade
+        fixed_point (bool) : (optional) fast load of the trades as scaled integers
+        backend : (optional) numeric backend of the wallet (Decimal by default)
+        chunksize (int) : (optional) stream the files by chunks of rows instead of loading them
+        cache_dir (str) : (optional) directory of a binary cache of the parsed files
+        max_price_age (pandas.Timedelta or str) : (optional) without price store, a held asset 
+                            whose latest fiat trade is older stops the run (one day by default,
+                            None to accept stale prices)
+        """
+        super().__init__(trades_file, fixed_point=fixed_point, backend=backend, chunksize=chunksize, cache_dir=cache_dir)
+        self.prices = prices(prices_file, []) if prices_file else None
+        self.max_price_age = pd.Timedelta(max_price_age).value if max_price_age is not None else None
+        self._last_prices = {} # (time, price) of the latest fiat trade of each asset (one by one processing)
+
+    def process_all_trades(self) -> None:
+        """
+        Calculate the profits / losses of all the trades (appended since the
+        checkpoint if one is loaded) with array operations
+
+        Raises
+        ------
+        ValueError : if the trades file does not extend the checkpointed one
+                     or if an asset held at a sale has no price (or a stale one)
+        """
+        try:
+            df = self._trades.get_trades()
+        except ValueError:
+            return super().process_all_trades()
+
+        start = self._processed
+        if start:
+            last = next(Trades.frame_records(df.iloc[start - 1:start]), None)
+            if last is None or (last.txid, last.time) != self._last_trade:
+                raise ValueError("Trades do not match the checkpoint (file not appended to).")
+        trades = df.iloc[start:]
+        if trades.empty: return
+
+        # String operations on the few distinct pairs only
+        codes, pairs = pd.factorize(df[Trades.PAIR_COL])
+        pair_fiat = np.array([p.endswith(average_cost.FIAT) for p in pairs], dtype=bool)
+        pair_base = np.array([p[:-4] if f else p[:4] for p, f in zip(pairs, pair_fiat)], dtype=object)
+        all_fiat = pair_fiat[codes]
+        fiat, base, quote = all_fiat[start:], pair_base[codes[start:]], np.array([p[4:] for p in pairs], dtype=object)[codes[start:]]
+        buy = (trades[Trades.TYPE_COL] == "buy").to_numpy()
+        vol, cost, fee = (Trades.decimal_column(df, c)[start:] for c in (Trades.VOL_COL, Trades.COST_COL, Trades.FEE_COL))
+        times = price_series.to_ns_array(trades[Trades.TIME_COL])
+
+        # Holdings: one leg per trade and asset (two for crypto to crypto trades)
+        c2c = np.flatnonzero(~fiat)
+        legs = pd.DataFrame({"position": np.concatenate([np.arange(len(trades)), c2c]),
+                             "asset": np.concatenate([base, quote[c2c]]),
+                             "delta": np.concatenate([np.where(buy, vol, -vol),
+                                                      np.where(buy, -(cost + fee), cost - fee)[c2c]])})
+        holdings = {}
+        for asset, leg in legs.sort_values("position", kind="stable").groupby("asset", sort=False):
+            initial = self._wallet.amounts.get(asset, Decimal())
+            holdings[asset] = (leg["position"].to_numpy(), initial + np.cumsum(leg["delta"].to_numpy()), initial)
+        for asset, amount in self._wallet.amounts.items():
+            holdings.setdefault(asset, (np.empty(0, dtype=np.int64), np.empty(0, dtype=object), amount))
+
+        # Portfolio value before each sale: sold asset at the trade price, the others batched per asset
+        sales = np.flatnonzero(fiat & ~buy)
+        all_prices = Trades.decimal_column(df, Trades.PRICE_COL)
+        sale_prices = all_prices[start:][sales]
+        values = np.full(len(sales), Decimal(), dtype=object)
+        held = {}
+        for asset, (positions, amounts, initial) in holdings.items():
+            before = np.searchsorted(positions, sales, side="left") - 1
+            amount = np.where(before >= 0, amounts[np.maximum(before, 0)] if len(amounts) else initial, initial)
+            sold = base[sales] == asset
+            values[sold] += amount[sold] * sale_prices[sold]
+            others = np.flatnonzero(~sold & (amount != 0))
+            if len(others): held[asset] = (others, amount[others])
+
+        needed = {asset: times[sales[others]] for asset, (others, _) in held.items()}
+        traded = None
+        if self.prices is not None: 
+            self.prices.prefetch(None, needed = needed)
+        elif held:
+            fiat_positions = np.flatnonzero(all_fiat)
+            cryptos = pair_base[codes[fiat_positions]]
+            traded = ({crypto: fiat_positions[i] for crypto, i in pd.Series(cryptos).groupby(cryptos).indices.items()}, 
+                      all_prices, price_series.to_ns_array(df[Trades.TIME_COL]))
+        for asset, (others, amount) in held.items():
+            values[others] += amount * self._valuation_prices(asset, start + sales[others], needed[asset], traded)
+
+        # Cost recurrence over the sales
+        purchased = np.cumsum(np.where(fiat & buy, cost + fee, Decimal()))
+        proceeds, net = cost[sales], cost[sales] - fee[sales]
+        sale_times = trades[Trades.TIME_COL].iloc[sales]
+        total, counted = self._wallet.getWalletCost(), Decimal()
+        basis = np.empty(len(sales), dtype=object)
+        for j, time in enumerate(sale_times):
+            total += purchased[sales[j]] - counted
+            counted = purchased[sales[j]]
+            if not values[j]: raise ValueError(f"Nothing to sell at {time}.")
+            basis[j] = proceeds[j] / values[j] * total
+            total -= basis[j]
+        self._wallet.setWalletCost(total + purchased[-1] - counted)
+        self.gains.extend(times[sales], base[sales], net, basis)
+
+        for asset, (_, amounts, _) in holdings.items():
+            if len(amounts): self._wallet.amounts[asset] = amounts[-1]
+        last = next(Trades.frame_records(trades.iloc[-1:]))
+        self._processed += len(trades)
+        self._last_trade = (last.txid, last.time)
+
+    def _valuation_prices(self, asset:str, positions:np.ndarray, times:np.ndarray, traded:tuple = None) -> np.ndarray:
+        """
+        Prices of an asset before the trades at some positions, resolved at once
+
+        Parameters
+        ----------
+        asset (str) : crypto name
+        positions (numpy.ndarray) : positions of the trades in the trades dataframe
+        times (numpy.ndarray) : times of the trades (ns)
+        traded (tuple) : ({crypto: positions of its fiat trades}, prices and times of all the trades),
+                         used without a price store
+
+        Returns
+        -------
+        numpy.ndarray of Decimal prices
+
+        Raises
+        ------
+        ValueError : if there is no price of the asset at one of the times, or 
+                     (without price store) if its latest fiat trade is older than max_price_age
+        """
+        if self.prices is not None:
+            found = self.prices.getPrices(asset, times)
+            for i in np.flatnonzero(found == None): # elementwise
+                found[i] = self._checked_price(asset, times[i], self.prices.getPrice(asset, pd.Timestamp(int(times[i]))))
+            return found
+
+        trade_positions, trade_prices, trade_times = traded
+        trade_positions = trade_positions.get(asset, np.empty(0, dtype=np.int64))
+        before = np.searchsorted(trade_positions, positions, side="left") - 1
+        if (before < 0).any(): self._checked_price(asset, times[np.argmax(before < 0)], None)
+        if self.max_price_age is not None:
+            stale = times - trade_times[trade_positions[before]] > self.max_price_age
+            if stale.any(): 
+                i = np.argmax(stale)
+                self._checked_age(asset, times[i], trade_times[trade_positions[before[i]]])
+        return trade_prices[trade_positions[before]]
+
+    @staticmethod
+    def _checked_price(asset:str, time, price):
+        if price is None: raise ValueError(f"No price of {asset} at {pd.Timestamp(int(time))}.")
+        return Decimal(str(price))
+
+    def _checked_age(self, asset:str, time, traded):
+        """ Raises a ValueError if a traded price (time in ns) is too old to value an asset at a time (ns) """
+        if self.max_price_age is None or time - traded <= self.max_price_age: return
+        raise ValueError(f"Latest price of {asset} at {pd.Timestamp(int(time))} is from {pd.Timestamp(int(traded))}, "
+                         f"older than {pd.Timedelta(self.max_price_age)} (give a price store or a larger max_price_age).")
+
+    def portfolio_value(self, time, known:dict = None) -> Decimal:
+        """
+        Fiat value of the holdings at a given time
+
+        Parameters
+        ----------
+        time (pandas.Timestamp) : time of the valuation
+        known (dict) : (optional) {crypto: price} of the assets with a known price
+
+        Returns
+        -------
+        Decimal value
+
+        Raises
+        ------
+        ValueError : if a held asset has no price (or a stale one, see max_price_age)
+        """
+        known = known or {}
+        value = Decimal()
+        for crypto, amount in self._wallet.amounts.items():
+            if not amount: continue
+            if crypto in known: price = known[crypto]
+            elif self.prices is not None: price = self._checked_price(crypto, time.value, self.prices.getPrice(crypto, time))
+            else: 
+                traded, price = self._last_prices.get(crypto, (None, None))
+                price = self._checked_price(crypto, time.value, price)
+                self._checked_age(crypto, time.value, traded.value)
+            value += amount * price
+        return value
+
+    def process_trade(self, trade: pd.Series) -> None:
+        """
+        Check type of trade
+
+        Parameters
+        ----------
+        trade: (pandas.dataFrame.row)
+        """
+        if trade.pair.endswith(average_cost.FIAT) and trade.type == "buy":
+            self.fiat2crypto(trade)
+        elif trade.pair.endswith(average_cost.FIAT) and trade.type == "sell":
+            self.crypto2fiat(trade)
+        else:
+            self.crypto2crypto(trade)
+
+    def fiat2crypto(self, trade: pd.Series) -> None:
+        """
+        Digest a fiat -> crypto transaction
+
+        It adds the crypto amount to the wallet and the cost to the portfolio cost
+
+        Parameters
+        ----------
+        trade: (pandas.dataFrame.row)
+        """
+        crypto = trade.pair[:-4]
+        self._wallet.amounts[crypto] += trade.vol
+        self._wallet.updateCost(cost = trade.cost, fee = trade.fee)
+        self._last_prices[crypto] = (trade.time, trade.price)
+
+    def crypto2fiat(self, trade: pd.Series) -> bool:
+        """
+        Digest a crypto -> fiat transaction
+
+        It values the portfolio before the sale and releases the share of the
+        portfolio cost sold
+
+        Parameters
+        ----------
+        trade: (pandas.dataFrame.row)
+
+        Returns
+        -------
+        profit: (boolean) True / False for profit / loss
+        """
+        crypto = trade.pair[:-4]
+        value = self.portfolio_value(trade.time, {crypto: trade.price})
+        if not value: raise ValueError(f"Nothing to sell at {trade.time}.")
+        total = self._wallet.getWalletCost()
+        basis = trade.cost / value * total
+        profit = trade.cost - trade.fee - basis
+        self._wallet.setWalletCost(total - basis)
+        self._wallet.amounts[crypto] -= trade.vol
+        self._last_prices[crypto] = (trade.time, trade.price)
+        self.gains.append(trade.time, crypto, trade.cost - trade.fee, basis, profit)
+        return profit > 0
+
+    def crypto2crypto(self, trade: pd.Series) -> None:
+        """
+        Digest a crypto -> crypto transaction
+
+        It only moves the amounts (the portfolio cost is unchanged), the fee
+        being paid in the quote crypto
+
+        Parameters
+        ----------
+        trade: (pandas.dataFrame.row)
+        """
+        base, quote = trade.pair[:4], trade.pair[4:]
+        if trade.type == "buy":
+            self._wallet.amounts[base] += trade.vol
+            self._wallet.amounts[quote] -= trade.cost + trade.fee
+        else:
+            self._wallet.amounts[base] -= trade.vol
+            self._wallet.amounts[quote] += trade.cost - trade.fee
@@ -0,0 +1,133 @@
+import collections
+import csv
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from cryptopnl.main.average_cost import average_cost
+from cryptopnl.main.fifo_with_ledger import fifo_with_ledger
+from cryptopnl.main.fifo_with_trades import fifo_with_trades
+
+# Strategies available to a batch (a ledger is needed by fifo_with_ledger only)
+STRATEGIES = {
+    "fifo_with_trades": fifo_with_trades,
+    "fifo_with_ledger": fifo_with_ledger,
+    "average_cost": average_cost,
+    }
+LEDGER_STRATEGIES = ("fifo_with_ledger",)
+
+# Manifest columns
+ACCOUNT = "account"
+TRADES = "trades_file"
+LEDGER = "ledger_file"
+
+account = collections.namedtuple("account", [ACCOUNT, TRADES, LEDGER])
+account_result = collections.namedtuple("account_result", ["account", "summary", "error", "seconds"])
+
+def accounts_from_manifest(manifest_file:str) -> list:
+    """
+    Accounts listed in a csv manifest (account, trades_file, ledger_file columns,
+    the ledger is optional). Relative paths are relative to the manifest.
+
+    Parameters
+    ----------
+    manifest_file (str) : location of the manifest
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+    locate = lambda file: os.path.join(base_dir, file) if file else None
+    with open(manifest_file, "r", newline="") as fp:
+        return [account(row[ACCOUNT], locate(row[TRADES]), locate(row.get(LEDGER)))
+                    for row in csv.DictReader(fp)]
+
+def accounts_from_directory(directory:str) -> list:
+    """
+    Accounts of a directory, one sub directory per account holding its
+    trades*.csv export and optionally its ledger*.csv export
+
+    Parameters
+    ----------
+    directory (str) : location of the accounts
+    """
+    accounts = []
+    for name in sorted(os.listdir(directory)):
+        account_dir = os.path.join(directory, name)
+        if not os.path.isdir(account_dir): continue
+        trades_files = sorted(glob.glob(os.path.join(account_dir, "trades*.csv")))
+        ledger_files = sorted(glob.glob(os.path.join(account_dir, "ledger*.csv")))
+        if not trades_files: continue
+        accounts.append(account(name, trades_files[0], ledger_files[0] if ledger_files else None))
+    return accounts
+
+def load_accounts(source:str) -> list:
+    """ Accounts of a manifest file or of a directory """
+    return accounts_from_directory(source) if os.path.isdir(source) else accounts_from_manifest(source)
+
+def run_account(job) -> account_result:
+    """
+    Compute the profits and losses of one account (run in a worker process).
+    Any failure is reported in the result instead of stopping the batch.
+
+    Parameters
+    ----------
+    job (tuple) : (account, strategy name or None, strategy options)
+                  without a strategy, fifo_with_ledger is used if there is a ledger
+    """
+    acc, strategy, options = job
+    start = time.perf_counter()
+    try:
+        if strategy is None: strategy = "fifo_with_ledger" if acc.ledger_file else "fifo_with_trades"
+        if strategy in LEDGER_STRATEGIES:
+            if not acc.ledger_file: raise ValueError(f"{strategy} needs a ledger file")
+            calculator = STRATEGIES[strategy](trades_file=acc.trades_file, ledger_file=acc.ledger_file, **options)
+        else:
+            calculator = STRATEGIES[strategy](trades_file=acc.trades_file, **options)
+        calculator.process_all_trades()
+        return account_result(acc.account, calculator.gains_summary(), None, time.perf_counter() - start)
+    except Exception as e:
+        return account_result(acc.account, None, f"{type(e).__name__}: {e}", time.perf_counter() - start)
+
+def run_batch(accounts:list, strategy:str = None, workers:int = None, **options) -> list:
+    """
+    Compute the profits and losses of many accounts across a process pool.
+    Each worker imports the package once and processes several accounts.
+
+    Parameters
+    ----------
+    accounts (list) : account tuples (see load_accounts)
+    strategy (str) : (optional) name of a strategy in STRATEGIES
+    workers (int) : (optional) number of processes (cpu count by default),
+                    1 runs the accounts in the current process
+    options : keyword arguments of the strategy (fixed_point, cache_dir...),
+              a cache_dir is shared by all the workers (see trades_cache)
+
+    Returns
+    -------
+    list of account_result in the order of the accounts
+    """
+    if strategy is not None and strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy} (one of {', '.join(STRATEGIES)})")
+
+    jobs = [(acc, strategy, options) for acc in accounts]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1: return [run_account(job) for job in jobs]
+
+    chunksize = max(1, len(jobs) // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run_account, jobs, chunksize=chunksize))
+
+def write_report(results:list, report_file:str) -> None:
+    """
+    Save the results of a batch in a json file
+
+    Parameters
+    ----------
+    results (list) : account_result list returned by run_batch
+    report_file (str) : location of the report
+    """
+    report = [{ACCOUNT: r.account,
+               "summary": {str(year): str(p) for (year, p) in r.summary.items()} if r.summary is not None else None,
+               "error": r.error,
+               "seconds": r.seconds} for r in results]
+    with open(report_file, "w") as fp:
+        json.dump(report, fp, indent=1)
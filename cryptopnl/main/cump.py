@@ -1,10 +1,10 @@
 import pandas as pd
 import numpy as np
 from decimal import Decimal as D
+from cryptopnl.main.trades import Trades
 from cryptopnl.wallet.wallet import wallet 
-from cryptopnl.price_api.prices import prices
+from cryptopnl.api.to_include_in_exchangeAPI_prices import prices
 from cryptopnl.utils.Logger import Logger
-from cryptopnl.calc.balanceCheck import checkBalanceWithFees
 
 
 EUR = "ZEUR"
@@ -19,13 +19,21 @@ def dec(num):
 "Weighted average cost method (CUMP in french)"    
 class cumpCalculator:
     
-    def __init__(self, ledgerName, tradeName, priceName):
+    def __init__(self, ledgerName, tradeName, priceName, verbose = False):
+        """
+        :param verbose: log every trade and the wallet value after it (one
+                        price lookup per held asset and trade), otherwise the
+                        wallet is only valued by sales and requested snapshots
+        """
+        self.verbose = verbose
         self.trades = self.readCSV(tradeName)
         self.ledger = self.readCSV(ledgerName)
+        self.ledgerIndex = Trades.index_by_txid(self.ledger)
         self.tradeIndex = 0
         self.log = Logger()
 
         self.prices = prices(priceName, CRYPTO)
+        self.prices.prefetch(self.trades)
         self.wallet = wallet()
 
         self.totalGains = {}
@@ -44,8 +52,8 @@ class cumpCalculator:
         
         # Get corresponding ledgers
         (l0, l1) = nextTrade.ledgers.split(',')        
-        l0 = self.ledger.loc[self.ledger['txid'] == l0].iloc[0]
-        l1 = self.ledger.loc[self.ledger['txid'] == l1].iloc[0]
+        l0 = self.ledger.iloc[self.ledgerIndex[l0]]
+        l1 = self.ledger.iloc[self.ledgerIndex[l1]]
         ining = l0 if l0.amount > 0 else l1
         outing = l1 if l0.amount > 0 else l0
 
@@ -59,16 +67,28 @@ class cumpCalculator:
         else:
             self.crypto2crypto(nextTrade, ining, outing)
 
-        walletValue = dec(self.wallet.getCurrentValue(self.prices, nextTrade.time))
-        self.log.logTrade(outing, ining)
-        self.log.logWallet(walletValue, self.wallet)
+        if self.verbose:
+            self.log.logTrade(outing, ining)
+            self.log.logWallet(self.walletValue(nextTrade.time), self.wallet)
+
+    def walletValue(self, time):
+        """ Value of the wallet at a time (one price lookup per held asset) """
+        return dec(self.wallet.getCurrentWalletValue(time, self.prices))
+
+    def snapshot(self, time = None):
+        """
+        Value and cost of the wallet on demand
+
+        :param time: time of the valuation (last processed trade by default)
+        :return : (time, value, cost)
+        """
+        if time is None: time = self.trades.loc[max(self.tradeIndex - 1, 0)].time
+        return (time, self.walletValue(time), self.wallet.getWalletCost())
 
     def fiat2crypto(self, trade, crypto, fiat):
         assert(crypto.amount == trade.vol) 
 
-        self.wallet.add(crypto.asset, 
-                        self.chunk(dec(crypto.amount),dec(trade.price),
-                                   dec(crypto.fee)))
+        self.wallet.add(crypto.asset, amount = dec(crypto.amount) - dec(crypto.fee), price = dec(trade.price))
         self.wallet.updateCost(dec(abs(fiat.amount)) + dec(fiat.fee))
 
     def crypto2fiat(self, trade, crypto, fiat):
@@ -79,14 +99,14 @@ class cumpCalculator:
         CashWFee = dec(fiat.amount) # IMPORTANT to calculate proportion chi
 
         self.prices.addPrice(crypto.asset, trade.time, str(trade.price))
-        walletValue = self.wallet.getCurrentValue(self.prices, trade.time)
-        walletCost = self.wallet.getCost()
+        walletValue = self.walletValue(trade.time)
+        walletCost = self.wallet.getWalletCost()
 
-        self.wallet.take(crypto.asset, outAmount, inCash) 
+        self.wallet.take(crypto.asset, outAmount) 
         chi = round(CashWFee / walletValue, 5)
         self.totalGains[str(trade.time.year)].append(inCash - chi*walletCost)
 
-        self.wallet.setCost((D("1") - chi)*walletCost)
+        self.wallet.setWalletCost((D("1") - chi)*walletCost)
 
     def crypto2crypto(self, trade, ining, outing):        
 
@@ -98,13 +118,9 @@ class cumpCalculator:
 
         # Approx price of bought crypto (it really doesnt matter)
         pr = dec(self.prices.getPrice(cryptoBought, trade.time))
-        boughtInFiat = bought*pr
-
-        self.wallet.take(cryptoSold, sold, boughtInFiat)
-        self.wallet.add(cryptoBought, self.chunk(bought, pr))
 
-    def chunk(self, vol, price, fee = dec(0)):
-        return {"vol": vol-fee, "price": price}
+        self.wallet.take(cryptoSold, sold)
+        self.wallet.add(cryptoBought, amount = bought, price = pr)
 
     def next(self):
         self.tradeIndex +=1
@@ -124,15 +140,15 @@ class cumpCalculator:
         return totsies
         
 
-def doCumpCalculation(ledgers, trades, prices):
-    plc = cumpCalculator(ledgers, trades,prices)
+def doCumpCalculation(ledgers, trades, prices, verbose = False):
+    plc = cumpCalculator(ledgers, trades, prices, verbose)
 
     # Processing all trades 
     plc.processAll() 
-    plc.log.save()
+    if verbose: plc.log.save()
     # print(plc.log.getTrades())
     gains = plc.totalSurplus()
-    cost = plc.wallet.getCost()
+    cost = plc.wallet.getWalletCost()
     print(f"Total gains are : {gains}")
     print(f"Remaining cost is : {cost}")
     print(f"Final Gains : {gains-cost}")
@@ -140,10 +156,7 @@ def doCumpCalculation(ledgers, trades, prices):
     # print(plc.log.getTrades())
     # Verifying balance
 
-    (bal, ledgerBal) = checkBalanceWithFees(plc.ledger)
-    # print(f"Calculated balance is {bal}")
-    # print(f"Ledger balance is {ledgerBal}")
-    assert(bal==ledgerBal)
+    assert(Trades(trades_file=trades, ledger_file=ledgers).balance_check())
 
 """ Todo
 
@@ -1,7 +1,7 @@
 import os
-from collections import defaultdict
 from cryptopnl.main.trades import Trades
 from cryptopnl.main.abstract_strategy import abstract_strategy
+from cryptopnl.main.gains import gains_table
 from cryptopnl.wallet.wallet import wallet
 import pandas as pd
 from typing import Tuple
@@ -17,12 +17,14 @@ class fifo_with_ledger(abstract_strategy):
     ----------
     :param _trades: Trade instance with all trades information (optional ledger)
     :param _wallet: wallet instance to track all cryptocurrency
-    TODO :param gains: pandas dataframe tracking current profits or losses
+    :param gains: gains_table of the realised profits or losses (one row per sale and lot)
 
     Methods:
     --------
     process_all_trades()
         Loop over all the trades to calculate all the profits / losses
+    save_checkpoint() / load_checkpoint()
+        Persist / restore the progress to resume later on appended trades
     process_trade()
         Process one trade identifying the type : crypto/fiat or vice versa
     fiat2crypto()
@@ -37,7 +39,7 @@ class fifo_with_ledger(abstract_strategy):
         Process and generates a summary of earning
     """
 
-    def __init__(self, trades_file:str, ledger_file:str) -> None:  
+    def __init__(self, trades_file:str, ledger_file:str, fixed_point:bool = False, backend = None, chunksize:int = None, cache_dir:str = None) -> None:  
         """ 
         Initialize an instance with a Trades object and a Wallet
 
@@ -45,13 +47,19 @@ class fifo_with_ledger(abstract_strategy):
         ----------
         trades_file (str) : location of a file with the trades
         ledger_file (str) . (optional) location of a file with the ledger 
+        fixed_point (bool) : (optional) fast load of trades and ledger as scaled integers
+        backend : (optional) numeric backend of the wallet (Decimal by default)
+        chunksize (int) : (optional) stream the files by chunks of rows instead of loading them
+        cache_dir (str) : (optional) directory of a binary cache of the parsed files
         """
         if not os.path.exists(trades_file): raise FileNotFoundError
         if not os.path.exists(ledger_file): raise FileNotFoundError
 
-        self._trades = Trades(trades_file=trades_file, ledger_file=ledger_file)
-        self._wallet = wallet()
-        self.fifo_gains = defaultdict(list)
+        self._trades = Trades(trades_file=trades_file, ledger_file=ledger_file, fixed_point=fixed_point, chunksize=chunksize, cache_dir=cache_dir)
+        self._wallet = wallet(backend=backend)
+        self.gains = gains_table()
+        self._processed = 0 # number of trades already processed
+        self._last_trade = None # (txid, time) of the last processed trade
         return 
 
     def get_ledgers_from_trade(self, trade: pd.Series) -> Tuple[pd.Series, pd.Series]:
@@ -60,18 +68,17 @@ class fifo_with_ledger(abstract_strategy):
         
         Parameters
         ----------
-        trade (pd.Series) : trade instance 
+        trade (pd.Series) : trade instance (or Trades record)
         
         Returns
         -------
         ledger (str, str) : tupple with the ining and outing amount
         """
-        indices = trade[Trades.LEDGER_COL].split(",")
-        l = self._trades._ledger
-        l_id_1 = l[l[Trades.TXID_COL] == indices[0]].iloc[0]
-        l_id_2 = l[l[Trades.TXID_COL] == indices[1]].iloc[0]
+        indices = getattr(trade, Trades.LEDGER_COL).split(",")
+        l_id_1 = self._trades.get_ledger(indices[0], trade.time)
+        l_id_2 = self._trades.get_ledger(indices[1], trade.time)
 
-        if l_id_1[Trades.AMOUNT_COL] > 0: return (l_id_1, l_id_2)
+        if getattr(l_id_1, Trades.AMOUNT_COL) > 0: return (l_id_1, l_id_2)
         else: return (l_id_2, l_id_1)
 
     def process_trade(self, trade: pd.Series) -> None:
@@ -96,7 +103,7 @@ class fifo_with_ledger(abstract_strategy):
             assert trade.price == - id_ining.amount / id_outing.amount
             self.crypto2fiat(crypto = id_outing, fiat = id_ining)
         else:
-            self.crypto2crypto(trade)
+            self.crypto2crypto(id_ining, id_outing)
         return 
 
     def fiat2crypto(self, crypto: pd.Series, fiat: pd.Series) -> None:
@@ -111,7 +118,7 @@ class fifo_with_ledger(abstract_strategy):
         fiat: (pandas.dataFrame.row) 
         """
         price = - fiat.amount / crypto.amount
-        self._wallet.add(crypto.asset, amount = crypto.amount, price = price, fee = fiat.fee)
+        self._wallet.add(crypto.asset, amount = crypto.amount, price = price, fee = fiat.fee, lot_id = str(getattr(crypto, Trades.REFID_COL)))
         self._wallet.updateCost(cost = - fiat.amount, fee = fiat.fee) 
         return 
 
@@ -133,10 +140,10 @@ class fifo_with_ledger(abstract_strategy):
         # TODO : if ledger fees can be in both sides (in EUR and in crypto)
         """
         crypto_name = crypto.asset 
-        initial_cost = self._wallet.take(crypto = crypto_name, vol = - crypto.amount)
+        consumed = []
+        initial_cost = self._wallet.take(crypto = crypto_name, vol = - crypto.amount, consumed = consumed)
         cash_in = fiat.amount - fiat.fee 
-        profit = cash_in - initial_cost
-        self.fifo_gains[crypto.time.year].append((crypto.time, profit))
+        profit = self.record_sale(crypto.time, crypto_name, cash_in, initial_cost, consumed)
         return profit > 0
 
     def crypto2crypto(self, crypto_in: pd.Series, crypto_out: pd.Series) -> None:
@@ -157,4 +164,4 @@ class fifo_with_ledger(abstract_strategy):
 
         initial_cost_in_fiat = self._wallet.take(crypto = crypto_sold, vol = sold_amount)
         equivalent_price = initial_cost_in_fiat / bought_amount
-        self._wallet.add(crypto = crypto_bought, amount = bought_amount, price = equivalent_price)#TODO define this , fee = fee_in_fiat)
+        self._wallet.add(crypto = crypto_bought, amount = bought_amount, price = equivalent_price, lot_id = str(getattr(crypto_in, Trades.REFID_COL)))#TODO define this , fee = fee_in_fiat)
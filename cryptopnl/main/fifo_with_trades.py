@@ -1,11 +1,19 @@
 import os
-from collections import defaultdict
+from decimal import Decimal
+from concurrent.futures import ProcessPoolExecutor
 from cryptopnl.main.abstract_strategy import abstract_strategy
+from cryptopnl.main.gains import gains_table
 from cryptopnl.main.trades import Trades
+from cryptopnl.wallet.numeric import difference
 from cryptopnl.wallet.wallet import wallet
 import pandas as pd
 from typing import Tuple
 
+# Columns sent to the worker processes (see process_all_trades)
+PARTITION_COLUMNS = (Trades.TXID_COL, Trades.PAIR_COL, Trades.TIME_COL, Trades.TYPE_COL, 
+                     Trades.PRICE_COL, Trades.COST_COL, Trades.FEE_COL, Trades.VOL_COL)
+DECIMAL_COLUMNS = (Trades.PRICE_COL, Trades.COST_COL, Trades.FEE_COL, Trades.VOL_COL)
+
 class fifo_with_trades(abstract_strategy):
     """
     Profits N Losses Calculator.
@@ -16,10 +24,14 @@ class fifo_with_trades(abstract_strategy):
     ----------
     :param _trades: Trade instance with all trades information (optional ledger)
     :param _wallet: wallet instance to track all cryptocurrency
-    TODO :param gains: pandas dataframe tracking current profits or losses
+    :param gains: gains_table of the realised profits or losses (one row per sale and lot)
 
     Methods:
     --------
+    process_all_trades()
+        Loop over all the trades (assets processed in parallel if possible)
+    save_checkpoint() / load_checkpoint()
+        Persist / restore the progress to resume later on appended trades
     process_trade()
         Process one trade identifying the type : crypto/fiat or vice versa
     fiat2crypto()
@@ -33,21 +45,85 @@ class fifo_with_trades(abstract_strategy):
     go()
         Process and generates a summary of earning
     """
-    def __init__(self, trades_file:str) -> None:  
+    def __init__(self, trades_file, fixed_point:bool = False, backend = None, chunksize:int = None, cache_dir:str = None, 
+                 workers:int = None) -> None:  
         """ 
         Initialize an instance with a Trades object and a Wallet
 
         Parameters
         ----------
-        trades_file (str) : location of a file with the trades
+        trades_file (str or pandas.DataFrame) : location of a file with the trades, or the trades already read
+        fixed_point (bool) : (optional) fast load of the trades as scaled integers
+        backend : (optional) numeric backend of the wallet (Decimal by default)
+        chunksize (int) : (optional) stream the files by chunks of rows instead of loading them
+        cache_dir (str) : (optional) directory of a binary cache of the parsed files
+        workers (int) : (optional) number of processes sharing the assets of a fiat only history
+                        (at most one per cpu, serial run by default)
         """
-        if not os.path.exists(trades_file): raise FileNotFoundError
+        if not isinstance(trades_file, pd.DataFrame) and not os.path.exists(trades_file): raise FileNotFoundError
 
-        self._trades = Trades(trades_file=trades_file)
-        self._wallet = wallet()
-        self.fifo_gains = defaultdict(list)
+        self._trades = Trades(trades_file=trades_file, fixed_point=fixed_point, chunksize=chunksize, cache_dir=cache_dir)
+        self._wallet = wallet(backend=backend)
+        self.gains = gains_table()
+        self._processed = 0 # number of trades already processed
+        self._last_trade = None # (txid, time) of the last processed trade
+        self._workers = workers
         return 
 
+    def process_all_trades(self) -> None:
+        """
+        Iterate over all trades. 
+        When every trade is a fiat one, the lots of an asset never depend on 
+        the other assets: the trades are split by asset, processed by several
+        worker processes and the gains merged back in the trades order (same 
+        result as the serial run). Histories with crypto to crypto trades, 
+        resumed or streamed runs, and single cpu machines are processed serially.
+        """
+        workers = min(self._workers or 1, os.cpu_count() or 1)
+        partitions = self._asset_partitions() if workers > 1 else None
+        if not partitions or len(partitions) < 2: return super().process_all_trades()
+
+        trades = self._trades.get_trades()
+        columns = trades[list(PARTITION_COLUMNS)]
+        scales = trades.attrs.get(Trades.SCALES_ATTR) or {}
+        columns.attrs[Trades.SCALES_ATTR] = {c: scale for c, scale in scales.items() if c in PARTITION_COLUMNS}
+        # Decimals are sent as str, several times faster to pickle
+        decimals = [c for c in DECIMAL_COLUMNS if c not in scales]
+        for c in decimals: columns[c] = list(map(str, columns[c].tolist()))
+        jobs = [(columns.iloc[positions], decimals, self._wallet._backend) for positions in partitions.values()]
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            results = list(executor.map(_process_partition, jobs))
+
+        sells = (trades[Trades.TYPE_COL] == "sell").to_numpy()
+        tables = []
+        for crypto, (chunks, amount, cost, gains) in zip(partitions, results):
+            self._wallet.set_chunks(crypto, chunks, amount)
+            self._wallet.updateCost(cost = cost)
+            tables.append(gains_table(len(gains[gains_table.TIME])))
+            tables[-1].set_state(gains)
+        # the sales of a partition are its sell trades, in order
+        self.gains = gains_table.merge(tables, [positions[sells[positions]] for positions in partitions.values()])
+
+        last = next(Trades.frame_records(trades.iloc[-1:]))
+        self._processed = len(trades)
+        self._last_trade = (last.txid, last.time)
+
+    def _asset_partitions(self) -> dict:
+        """
+        Positions of the trades of each asset, ordered by first trade 
+        (None if the history can not be split: crypto to crypto trades, 
+        resumed or streamed run)
+        """
+        if self._processed: return None
+        try:
+            pairs = self._trades.get_trades()[Trades.PAIR_COL]
+        except ValueError:
+            return None
+        if not pairs.str.endswith("EUR").all(): return None
+        cryptos = pairs.str[:-4]
+        indices = cryptos.groupby(cryptos.to_numpy()).indices
+        return dict(sorted(indices.items(), key=lambda item: item[1][0]))
+
     def process_trade(self, trade: pd.Series) -> None:
         """
         Check type of trade 
@@ -76,8 +152,10 @@ class fifo_with_trades(abstract_strategy):
         trade: (pandas.dataFrame.row) 
         """
         crypto_name = trade.pair[:-4] # Likely to bug
-        self._wallet.add(crypto_name, amount = trade.vol, price = trade.price, fee = trade.fee)
-        self._wallet.updateCost(cost = trade.cost, fee = trade.fee) # TODO redondant
+        # Scaled integers of a fixed point frame go to the wallet as is (see Trades.scaled)
+        vol, price, cost, fee = Trades.getter(trade, Trades.VOL_COL, Trades.PRICE_COL, Trades.COST_COL, Trades.FEE_COL)(trade)
+        self._wallet.add(crypto_name, amount = vol, price = price, fee = fee, lot_id = trade.txid)
+        self._wallet.updateCost(cost = cost, fee = fee) # TODO redondant
         return 
 
     def crypto2fiat(self, trade: pd.Series) -> None:
@@ -97,11 +175,12 @@ class fifo_with_trades(abstract_strategy):
         # TODO : if ledger fees can be in both sides (in EUR and in crypto)
         """
         crypto = trade.pair[:-4]
-        initial_cost = self._wallet.take(crypto = crypto, vol = trade.vol)
+        consumed = []
+        vol, cost, fee = Trades.getter(trade, Trades.VOL_COL, Trades.COST_COL, Trades.FEE_COL)(trade)
+        initial_cost = self._wallet.take(crypto = crypto, vol = vol, consumed = consumed)
         #cash_in = trade.price * trade.vol - trade.fee # TODO redondant cost
-        cash_in = trade.cost - trade.fee
-        profit = cash_in - initial_cost
-        self.fifo_gains[trade.time.year].append((trade.time, profit))
+        cash_in = difference(cost, fee)
+        profit = self.record_sale(trade.time, crypto, cash_in, initial_cost, consumed)
         return profit > 0
 
     def crypto2crypto(self, trade: pd.Series) -> None:
@@ -132,4 +211,25 @@ class fifo_with_trades(abstract_strategy):
         initial_cost_in_fiat = self._wallet.take(crypto = crypto_sold, vol = sold_amount)
         equivalent_price = initial_cost_in_fiat / bought_amount
         fee_in_fiat = equivalent_price * fee 
-        self._wallet.add(crypto = crypto_bought, amount = bought_amount, price = equivalent_price, fee = fee_in_fiat)
\ No newline at end of file
+        self._wallet.add(crypto = crypto_bought, amount = bought_amount, price = equivalent_price, fee = fee_in_fiat, lot_id = trade.txid)
+
+def _process_partition(job) -> tuple:
+    """
+    Process the trades of a single asset (run in a worker process)
+
+    Parameters
+    ----------
+    job (tuple) : (trades dataframe of one asset, its Decimal columns sent as str, 
+                   numeric backend of the wallet)
+
+    Returns
+    -------
+    (remaining lots, amount, wallet cost, state of the gains table of the sales)
+    """
+    trades, decimals, backend = job
+    for c in decimals: trades[c] = list(map(Decimal, trades[c].tolist()))
+    strategy = fifo_with_trades(trades_file=trades, backend=backend)
+    strategy.process_all_trades()
+
+    crypto = trades[Trades.PAIR_COL].iloc[0][:-4]
+    return strategy._wallet.wallet[crypto], strategy._wallet.amounts[crypto], strategy._wallet.getWalletCost(), strategy.gains.get_state()
@@ -0,0 +1,295 @@
+from collections import defaultdict
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+
+class gains_table:
+    """
+    Realised gains of a profits and losses run, stored by columns.
+
+    One row per realised gain: time, asset sold, proceeds (net of fees),
+    cost basis, gain, id of the acquiring lot (the txid of the trade
+    that bought it, None when the cost is not traced to a lot, e.g. with
+    the average cost method) and index of the sale (the rows of a sale over
+    several lots are consecutive and share it). The columns are numpy arrays 
+    preallocated and doubled when full, so appending a row is amortised 
+    constant time, and the group-bys and exports work on whole columns.
+
+    Methods
+    -------
+    append(time, asset, proceeds, cost_basis, gain, lot)
+        Adds a row (a sale)
+    extend(times, assets, proceeds, cost_basis, gains, lots, sale)
+        Adds rows given by columns (one sale per row, or the lots of one sale)
+    column(name)
+        Array of a column
+    rows(start)
+        Iterates over the rows as tuples
+    summary(by)
+        Total gain by year, month or asset (sums of the sale totals)
+    to_frame()
+        pandas.DataFrame of the table
+    to_csv(file) / save(file) / load(file)
+        Exports to csv, saves to / loads from a binary npz file
+    get_state() / set_state(state)
+        Exports / restores the table as plain (json friendly) values
+    merge(tables, keys)
+        Table of the sales of several tables, ordered by a key
+    by_year()
+        Legacy view {year: [(time, gain)]}, one entry per sale
+    """
+
+    TIME = "time"
+    ASSET = "asset"
+    PROCEEDS = "proceeds"
+    COST_BASIS = "cost_basis"
+    GAIN = "gain"
+    LOT = "lot"
+    SALE = "sale"
+    ROW = (TIME, ASSET, PROCEEDS, COST_BASIS, GAIN, LOT)
+    COLUMNS = ROW + (SALE,)
+    INT_COLUMNS = (TIME, SALE)
+    DECIMAL_COLUMNS = (PROCEEDS, COST_BASIS, GAIN)
+    STR_COLUMNS = (ASSET, LOT)
+    MISSING = "_missing" # suffix of the None masks of the str columns (npz)
+    PERIODS = {"year": "datetime64[Y]", "month": "datetime64[M]", "day": "datetime64[D]"}
+
+    CAPACITY = 1024
+
+    def __init__(self, capacity:int = CAPACITY) -> None:
+        """
+        :param capacity: (int) rows preallocated
+        """
+        self._size = 0
+        self._sales = 0
+        self._columns = gains_table._allocate(max(capacity, 1))
+        self._reset_view()
+
+    @staticmethod
+    def _allocate(capacity:int) -> dict:
+        return {c: np.empty(capacity, dtype=np.int64 if c in gains_table.INT_COLUMNS else object) for c in gains_table.COLUMNS}
+
+    def _reset_view(self) -> None:
+        self._view, self._viewed = defaultdict(list), 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, gains_table): return NotImplemented
+        return len(self) == len(other) and all(np.array_equal(self.column(c), other.column(c)) for c in gains_table.COLUMNS)
+
+    def _reserve(self, size:int) -> None:
+        capacity = len(self._columns[gains_table.TIME])
+        if size <= capacity: return
+        while capacity < size: capacity *= 2
+        columns = gains_table._allocate(capacity)
+        for c, values in self._columns.items(): columns[c][:self._size] = values[:self._size]
+        self._columns = columns
+
+    def append(self, time, asset:str, proceeds:Decimal, cost_basis:Decimal, gain:Decimal = None, lot:str = None) -> None:
+        """
+        Add a realised gain (a sale)
+
+        Parameters
+        ----------
+        time (pandas.Timestamp or int ns) : time of the sale
+        asset (str) : crypto sold
+        proceeds (Decimal) : fiat received (net of fees)
+        cost_basis (Decimal) : fiat cost of the amount sold
+        gain (Decimal) : (optional) realised gain, proceeds - cost_basis by default
+        lot (str) : (optional) id of the acquiring lot
+        """
+        self._reserve(self._size + 1)
+        i, columns = self._size, self._columns
+        columns[gains_table.TIME][i] = getattr(time, "value", time)
+        columns[gains_table.ASSET][i] = asset
+        columns[gains_table.PROCEEDS][i] = proceeds
+        columns[gains_table.COST_BASIS][i] = cost_basis
+        columns[gains_table.GAIN][i] = proceeds - cost_basis if gain is None else gain
+        columns[gains_table.LOT][i] = lot
+        columns[gains_table.SALE][i] = self._sales
+        self._size += 1
+        self._sales += 1
+
+    def extend(self, times, assets, proceeds, cost_basis, gains = None, lots = None, sale:bool = False) -> None:
+        """
+        Add realised gains given by columns (arrays or lists of the same length,
+        or a single value for all the rows)
+
+        Parameters
+        ----------
+        times (array) : times of the sales (int ns or datetime64)
+        assets (array) : cryptos sold
+        proceeds (array) : Decimal fiat received (net of fees)
+        cost_basis (array) : Decimal fiat costs of the amounts sold
+        gains (array) : (optional) realised gains, proceeds - cost_basis by default
+        lots (array) : (optional) ids of the acquiring lots
+        sale (bool) : the rows are the lots of a single sale (one sale per row by default)
+        """
+        proceeds, cost_basis = np.asarray(proceeds, dtype=object), np.asarray(cost_basis, dtype=object)
+        start, size = self._size, self._size + len(proceeds)
+        self._reserve(size)
+        columns = self._columns
+        columns[gains_table.TIME][start:size] = np.asarray(times).astype("datetime64[ns]").astype(np.int64)
+        columns[gains_table.ASSET][start:size] = assets
+        columns[gains_table.PROCEEDS][start:size] = proceeds
+        columns[gains_table.COST_BASIS][start:size] = cost_basis
+        columns[gains_table.GAIN][start:size] = proceeds - cost_basis if gains is None else gains
+        columns[gains_table.LOT][start:size] = lots
+        sales = 1 if sale else size - start
+        columns[gains_table.SALE][start:size] = self._sales if sale else np.arange(self._sales, self._sales + sales)
+        self._size = size
+        self._sales += sales
+
+    def column(self, name:str) -> np.ndarray:
+        """ Array of a column (a view, not to be modified) """
+        return self._columns[name][:self._size]
+
+    def rows(self, start:int = 0):
+        """ Iterate over the rows as (time ns, asset, proceeds, cost_basis, gain, lot) tuples """
+        return zip(*(self.column(c)[start:].tolist() for c in gains_table.ROW))
+
+    def _sale_starts(self, start:int = 0) -> np.ndarray:
+        """ Positions (from start) of the first row of each sale """
+        sales = self.column(gains_table.SALE)[start:]
+        return np.flatnonzero(np.r_[True, sales[1:] != sales[:-1]])
+
+    def _keys(self, by:str) -> np.ndarray:
+        if by == gains_table.ASSET: return self.column(gains_table.ASSET)
+        if by not in gains_table.PERIODS: raise ValueError(f"Unknown group {by} (asset, {', '.join(gains_table.PERIODS)})")
+        periods = self.column(gains_table.TIME).astype("datetime64[ns]").astype(gains_table.PERIODS[by])
+        return periods.astype(int) + 1970 if by == "year" else periods.astype(str)
+
+    def summary(self, by:str = "year", column:str = GAIN) -> dict:
+        """
+        Total of a column by group. The rows of each sale are summed first, so
+        the totals are the sums of the sale totals (e.g. of the profits of 
+        the sales, whatever their number of lots).
+
+        Parameters
+        ----------
+        by (str) : "year", "month", "day" or "asset"
+        column (str) : column summed (the gains by default)
+
+        Returns
+        -------
+        dict {group: Decimal total} in the order of first appearance
+        """
+        keys = self._keys(by)
+        if not self._size: return {}
+        starts = self._sale_starts()
+        groups, first, inverse = np.unique(keys[starts], return_index=True, return_inverse=True)
+        totals = np.full(len(groups), Decimal(), dtype=object)
+        np.add.at(totals, inverse, np.add.reduceat(self.column(column), starts))
+        groups = groups.tolist()
+        return {groups[g]: totals[g] for g in np.argsort(first, kind="stable")}
+
+    def to_frame(self) -> pd.DataFrame:
+        """ pandas.DataFrame of the table (datetime time column, Decimal amounts) """
+        df = pd.DataFrame({c: self.column(c).copy() for c in gains_table.COLUMNS})
+        df[gains_table.TIME] = pd.to_datetime(df[gains_table.TIME])
+        return df
+
+    def to_csv(self, file:str) -> None:
+        """ Export the table to a csv file (exact Decimal strings) """
+        self.to_frame().to_csv(file, index=False)
+
+    def save(self, file:str) -> None:
+        """ Save the table to a binary npz file (no pickled objects) """
+        np.savez(file, **gains_table._strings(self.get_state()), **{c: self.column(c) for c in gains_table.INT_COLUMNS})
+
+    @classmethod
+    def load(cls, file:str) -> "gains_table":
+        """ Table saved by save """
+        with np.load(file, allow_pickle=False) as data:
+            state = {c: data[c].tolist() for c in gains_table.COLUMNS}
+            for c in gains_table.STR_COLUMNS:
+                state[c] = [None if missing else v for v, missing in zip(state[c], data[c + gains_table.MISSING].tolist())]
+        table = cls(len(state[gains_table.TIME]))
+        table.set_state(state)
+        return table
+
+    @classmethod
+    def merge(cls, tables:list, keys:list) -> "gains_table":
+        """
+        Table of the rows of several tables, their sales ordered by a key
+        (e.g. the positions of the sales in a history processed in parts)
+
+        Parameters
+        ----------
+        tables (list) : gains_table to merge
+        keys (list) : for each table, an array of the (distinct) keys of its sales
+
+        Returns
+        -------
+        gains_table with the sales of all the tables, the rows of a sale kept together
+        """
+        size = sum(len(table) for table in tables)
+        merged = cls(size)
+        if not size: return merged
+        sales = np.concatenate([np.asarray(k, dtype=np.int64)[table.column(gains_table.SALE)] for table, k in zip(tables, keys)])
+        order = np.argsort(sales, kind="stable")
+        for c in gains_table.ROW: merged._columns[c][:size] = np.concatenate([table.column(c) for table in tables])[order]
+        sales = sales[order]
+        merged._columns[gains_table.SALE][:size] = np.cumsum(np.r_[False, sales[1:] != sales[:-1]])
+        merged._size = size
+        merged._sales = int(merged._columns[gains_table.SALE][size - 1]) + 1
+        return merged
+
+    @staticmethod
+    def _strings(state:dict) -> dict:
+        """ Non int columns as str arrays, the None of the str columns as "" and a mask """
+        strings = {c: np.array(state[c], dtype=str) for c in gains_table.DECIMAL_COLUMNS}
+        for c in gains_table.STR_COLUMNS:
+            strings[c] = np.array(["" if v is None else v for v in state[c]], dtype=str)
+            strings[c + gains_table.MISSING] = np.array([v is None for v in state[c]], dtype=bool)
+        return strings
+
+    def get_state(self) -> dict:
+        """
+        Export the table as plain (json friendly) values
+
+        Returns
+        -------
+        dict {column: list}, times in ns and amounts as exact Decimal strings
+        """
+        state = {c: self.column(c).tolist() for c in gains_table.COLUMNS}
+        for c in gains_table.DECIMAL_COLUMNS: state[c] = [str(v) for v in state[c]]
+        return state
+
+    def set_state(self, state:dict) -> None:
+        """
+        Restore the rows exported by get_state (replaces the current ones)
+
+        Parameters
+        ----------
+        state (dict) : table as returned by get_state (without sales, one sale per row)
+        """
+        size = len(state[gains_table.TIME])
+        self._size = 0
+        self._reserve(size)
+        for c in gains_table.COLUMNS:
+            values = state.get(c, range(size)) if c == gains_table.SALE else state[c]
+            if c in gains_table.DECIMAL_COLUMNS: values = [Decimal(v) for v in values]
+            self._columns[c][:size] = values
+        self._size = size
+        self._sales = int(self._columns[gains_table.SALE][size - 1]) + 1 if size else 0
+        self._reset_view()
+
+    def by_year(self) -> defaultdict:
+        """
+        Legacy view of the gains {year: [(pandas.Timestamp, gain of the sale)]},
+        one entry per sale. The view is kept and only the rows added since the 
+        last call are visited (it is not to be modified).
+        """
+        start = self._viewed
+        if start < self._size:
+            starts = self._sale_starts(start)
+            times = self.column(gains_table.TIME)[start:][starts]
+            gains = np.add.reduceat(self.column(gains_table.GAIN)[start:], starts)
+            for time, gain in zip(times.tolist(), gains.tolist()):
+                time = pd.Timestamp(time)
+                self._view[time.year].append((time, gain))
+            self._viewed = self._size
+        return self._view
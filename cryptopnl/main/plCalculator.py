@@ -1,20 +1,23 @@
 import pandas as pd
 import numpy as np
 from decimal import Decimal as D
+from cryptopnl.api.to_include_in_exchangeAPI_prices import prices
+from cryptopnl.main.trades import Trades
 from cryptopnl.wallet.wallet import wallet
 from cryptopnl.utils.Logger import Logger
-from cryptopnl.calc.balanceCheck import checkBalanceWithFees
 
 class plCalculator:
     
     def __init__(self, ledgerName, tradeName, priceName):
         self.ledger = self.readCSV(ledgerName)
+        self.ledgerIndex = Trades.index_by_txid(self.ledger)
         self.trades = self.readCSV(tradeName)
         self.log = Logger()
         self.tradeIndex = 0
 
         self.prices = prices(priceName, ["XBT", "ETH", "LTC"])
-        self.wallet = wallet(["XBT", "ETH", "LTC"])
+        self.prices.prefetch(None, needed = self.neededPrices())
+        self.wallet = wallet()
         self.fees = {"XXBT": [], "XETH": [], "XLTC": []}
         self.feesInEur = {"ZEUR": [], "XXBT": [], "XETH": [], "XLTC": []}
 
@@ -27,6 +30,19 @@ class plCalculator:
         csvFile['time'] = pd.to_datetime(csvFile['time'])
         return csvFile
 
+    def neededPrices(self):
+        """
+        Times of the prices of the cryptos bought by the crypto to crypto trades,
+        by short crypto name (XBT, ETH...) as they are looked up
+
+        :return : {crypto: numpy.ndarray of times in ns}
+        """
+        crypto2crypto = self.trades[~self.trades.pair.str.endswith("EUR")]
+        pairs = crypto2crypto.pair
+        bought = np.where(crypto2crypto.type == "buy", pairs.str[1:4], pairs.str[5:]).astype(str)
+        times = crypto2crypto.time.astype("datetime64[ns]").to_numpy().view(np.int64)
+        return {crypto: times[bought == crypto] for crypto in np.unique(bought)}
+
     def processNextTrade(self):
         nextTrade = self.trades.loc[self.tradeIndex]
         pair = nextTrade.pair 
@@ -34,8 +50,8 @@ class plCalculator:
         
         # Get corresponding ledgers
         (l0, l1) = nextTrade.ledgers.split(',')        
-        l0 = self.ledger.loc[self.ledger['txid'] == l0].iloc[0]
-        l1 = self.ledger.loc[self.ledger['txid'] == l1].iloc[0]
+        l0 = self.ledger.iloc[self.ledgerIndex[l0]]
+        l1 = self.ledger.iloc[self.ledgerIndex[l1]]
         ining = l0 if l0.amount > 0 else l1
         outing = l1 if l0.amount > 0 else l0
 
@@ -55,7 +71,7 @@ class plCalculator:
         quote = trade.pair[5:]
 
         assert(crypto.amount == trade.vol) 
-        self.wallet.add(base, self.chunk(crypto.amount, trade.price))
+        self.wallet.add(base, amount = D(str(crypto.amount)), price = D(str(trade.price)))
 
         # Saving fees
         if fiat.fee > 0:  self.feesInEur[fiat.asset].append(fiat.fee) 
@@ -63,7 +79,7 @@ class plCalculator:
             self.fees[crypto.asset].append(crypto.fee) 
             self.feesInEur[crypto.asset].append(crypto.fee*trade.price) 
         
-        self.log.logTrade(f"{self.tradeIndex}: {trade.cost} of FIAT {quote} ==> {trade.vol} Crypto {base}")
+        self.log.logLine(f"{self.tradeIndex}: {trade.cost} of FIAT {quote} ==> {trade.vol} Crypto {base}")
 
     def crypto2fiat(self, trade, crypto, fiat):
         base = trade.pair[1:4]
@@ -73,7 +89,7 @@ class plCalculator:
         boughtInFiat = trade.vol*trade.price 
 
         # Possible gains/losses
-        gains = self.wallet.take(base, D(str(trade.vol)), D(str(boughtInFiat)))
+        gains = D(str(boughtInFiat)) - self.wallet.take(base, D(str(trade.vol)))
         self.totalGains[str(trade.time.year)].append(gains)
 
         # Saving fees
@@ -82,7 +98,7 @@ class plCalculator:
             self.fees[crypto.asset].append(crypto.fee) 
             self.feesInEur[crypto.asset].append(crypto.fee*trade.price) 
 
-        self.log.logTrade(f"{self.tradeIndex}: {trade.vol} of {base} ==> {boughtInFiat} of {quote} (GAINS : {gains})")
+        self.log.logLine(f"{self.tradeIndex}: {trade.vol} of {base} ==> {boughtInFiat} of {quote} (GAINS : {gains})")
 
     def crypto2crypto(self, trade, ining, outing):        
 
@@ -106,14 +122,11 @@ class plCalculator:
         pr = float(self.prices.getPrice(cryptoBought, trade.time))
         boughtInFiat = bought*pr
 
-        gains = self.wallet.take(cryptoSold, D(str(sold)), D(str(boughtInFiat)))
+        gains = D(str(boughtInFiat)) - self.wallet.take(cryptoSold, D(str(sold)))
         self.totalGains[str(trade.time.year)].append(gains)
-        self.wallet.add(cryptoBought, self.chunk(bought, pr))
-
-        self.log.logTrade(f"{self.tradeIndex}: {sold} of {cryptoSold} ==> {bought} of {cryptoBought} (GAINS : {gains})")
+        self.wallet.add(cryptoBought, amount = D(str(bought)), price = D(str(pr)))
 
-    def chunk(self, vol, price):
-        return {"vol": D(str(vol)), "price": D(str(price))}
+        self.log.logLine(f"{self.tradeIndex}: {sold} of {cryptoSold} ==> {bought} of {cryptoBought} (GAINS : {gains})")
 
     def next(self):
         self.tradeIndex +=1
@@ -125,9 +138,9 @@ class plCalculator:
             self.next()
     
     def totalSurplus(self):
-        totsies = 0
+        totsies = D(0)
         for year in self.totalGains:
-            totsies += np.sum(self.totalGains[year])
+            totsies += sum(self.totalGains[year], D(0))
 
         allFees = 0 
         for cur in self.feesInEur:
@@ -146,10 +159,7 @@ if __name__ == "__main__":
     print(f"Total gains are : {gains} (fees : {fees}) -> TOTAL : {gains-fees}")
 
     # Verifying balance
-    (bal, ledgerBal) = checkBalanceWithFees(plc.ledger)
-    # print(f"Calculated balance is {bal}")
-    # print(f"Ledger balance is {ledgerBal}")
-    assert(bal==ledgerBal)
+    assert(Trades(trades_file="myHistory/trades.csv", ledger_file="myHistory/ledgers.csv").balance_check())
 
 """ Todo
 fees : substract fees to processing
@@ -1,6 +1,13 @@
+import os
+import numpy as np
 import pandas as pd
 import collections
+import contextlib
+import csv
+import itertools
+import operator
 from decimal import Decimal 
+from cryptopnl.main.trades_cache import trades_cache
 
 class Trades:
     """
@@ -10,15 +17,56 @@ class Trades:
     ----------
     :param _trades: pandas dataframe with the trades information
     :para _ledgers: (optional) pandas dataframe with the ledger information
+    :param _ledger_index: (optional) dict mapping each ledger txid to its row position
+    :param _fixed_point: if True, numeric columns are kept as scaled integers
+    :param _chunksize: (optional) number of rows read at once when streaming the files
+    :param _cache: (optional) trades_cache of the parsed files
+    :param _offsets: byte offsets the files are read from (see seek)
 
     Methods
     -------
     __iter__() 
         Loops through the trades dataframe
+    records(start)
+        Loops through the trades as lightweight named tuples
+    get_trades()
+        Retrieves the whole trades dataframe
+    first_row()
+        Row of the trades file the trades are read from
+    seek(row, trades_offset, ledger_offset)
+        Reads the files from byte offsets, skipping the rows before unparsed
+    offsets(row, time)
+        Byte offsets to resume reading the files at a position
+    skip_ledger_before(time)
+        Ignores older ledger entries when streaming a resumed run
+    get_ledger(txid, time)
+        Retrieves a ledger entry from its transaction id
     balance_check()
         Checks the coherence in the ledger file
+    balance_report()
+        First divergent txid of the ledger balances, asset by asset
     readKrakeCSV()
         Reads file and transform it into a pandas dataframe object
+    readCachedKrakenCSV()
+        Same as readKrakenCSV going through a binary cache
+    index_by_txid()
+        Maps the transaction ids of a dataframe to their row positions
+    frame_records()
+        Loops through a dataframe as named tuples (with Decimal numbers)
+    record_type()
+        Named tuple class of the rows of a dataframe
+    scaled()
+        Exact value of a numeric field of a row, as a scaled integer if possible
+    getter()
+        Reads several fields of a row at once, as scaled does
+    to_fixed_point()
+        Parses a column of decimal strings into scaled integers
+    from_fixed_point()
+        Converts a scaled integer back into a Decimal
+    decimal_column()
+        Column of a dataframe as an array of Decimals
+    to_decimal_frame()
+        Converts the scaled integer columns of a dataframe into Decimals
 
     """
 
@@ -34,60 +82,658 @@ class Trades:
     AMOUNT_COL = "amount"
     BALANCE_COL ="balance"
     LEDGER_COL = "ledgers"
+    REFID_COL = "refid" # ledger reference to the trade
+    RECORD_NAME = "Trade"
+    NUMERIC_COLS = (AMOUNT_COL, FEE_COL, COST_COL, PRICE_COL, VOL_COL, BALANCE_COL)
+    SCALES_ATTR = "scales"
+    MAX_DIGITS = 18 # int64 safe number of digits
+    BLOCK_SIZE = 1 << 20 # bytes read at once when scanning a file
+    LEDGER_TRADE_TYPES = ("trade", "margin") # ledger entries referenced by trades
+    LEDGER_WINDOW = pd.Timedelta(seconds=1) # streaming: tolerated gap between a trade and its ledger entries
+    LEDGER_BUFFER = 10000 # streaming: most ledger entries buffered (at least two chunks)
+    _RECORD_TYPES = {} # record classes by (columns, scales)
+    _GETTERS = {} # field getters by (record class, field names)
+    _POWERS = 10 ** np.arange(MAX_DIGITS + 1, dtype=np.int64)
 
-    def __init__(self, trades_file, ledger_file = None):
+    def __init__(self, trades_file, ledger_file = None, fixed_point = False, chunksize = None, cache_dir = None):
         """
         Construction of the trades (and ledger) objects
 
-        :param trades_file: (str) file location
+        :param trades_file: (str) file location, or an already read trades
+                            pandas.DataFrame (e.g. a part of a history, see readKrakenCSV)
         :param ledger_file: (str) file location
+        :param fixed_point: (bool) fast load keeping amounts as scaled integers,
+                            Decimals are only built when a field is read
+        :param chunksize: (int) stream the files chunksize rows at a time instead
+                          of loading them (memory bounded by the chunk size, 
+                          ignored with a trades dataframe)
+        :param cache_dir: (str) directory of a binary cache of the parsed files,
+                          an unchanged file is only parsed once (ignored when streaming)
         """
-        self._trades = Trades.readKrakenCSV(trades_file)
-        self._ledger = Trades.readKrakenCSV(ledger_file) if ledger_file else None
+        self._fixed_point = fixed_point
+        self._chunksize = None if isinstance(trades_file, pd.DataFrame) else chunksize
+        self._cache = trades_cache(cache_dir) if cache_dir and self._chunksize is None else None
+        self._trades_file = trades_file
+        self._ledger_file = ledger_file
+        self._first_row = 0 # row of the trades file at the trades offset
+        self._offsets = (None, None) # byte offsets of the trades and ledger files (None: beginning)
+        self._frames = None # (trades, ledger, ledger index), loaded on first use
+        self._ledger_records = None # records of the ledger, built on the first lookup
+        if self._chunksize is not None:
+            self._ledger_chunks = None
+            self._ledger_buffer = {} # unclaimed trade entries by txid, oldest first
+            self._ledger_read = None # time of the last ledger entry read
+            self._ledger_since = None
 
         # TODO check balance check
         # TODO create trades check : price*vol = cost
 
+    @property
+    def _trades(self):
+        """ Trades dataframe (None when streaming), the file being read on first use """
+        return self._load()[0]
+
+    @property
+    def _ledger(self):
+        """ Ledger dataframe (None without ledger or when streaming), read on first use """
+        return self._load()[1]
+
+    @property
+    def _ledger_index(self):
+        """ dict mapping each ledger txid to its row position (None without ledger) """
+        return self._load()[2]
+
+    def _load(self):
+        """ Reads the files once (from the offsets given to seek, if any) """
+        if self._frames is not None: return self._frames
+        if self._chunksize is not None: return (None, None, None)
+        trades_offset, ledger_offset = self._offsets
+        if isinstance(self._trades_file, pd.DataFrame): trades = self._trades_file
+        else: trades = self._read(self._trades_file, trades_offset)
+        ledger = self._read(self._ledger_file, ledger_offset) if self._ledger_file else None
+        self._frames = (trades, ledger, Trades.index_by_txid(ledger) if self._ledger_file else None)
+        return self._frames
+
+    def _read(self, file, offset):
+        # the cache holds whole files only
+        if offset is None and self._cache is not None: return Trades.readCachedKrakenCSV(file, self._cache, self._fixed_point)
+        return Trades.readKrakenCSV(file, self._fixed_point, offset=offset)
+
     def __iter__(self):
         """
         Iterator that loops on the trades
         """
         return self._trades.iterrows()
 
+    def records(self, start = 0):
+        """
+        Iterator that loops on the trades yielding named tuples.
+        The columns are extracted once as plain arrays, so no pandas.Series
+        is built per row and fields are plain tuple attributes.
+        When streaming, the trades file is read one chunk at a time.
+
+        :param start: (int) row of the first trade (previous rows are skipped)
+        :raises ValueError: if the row is before the offset the file is read from (see seek)
+        """
+        start -= self._first_row
+        if start < 0: raise ValueError("The trades are read from a later row (see seek).")
+        if self._chunksize is not None: return self._stream_records(start)
+        return Trades.frame_records(self._trades.iloc[start:] if start else self._trades)
+
+    def get_trades(self):
+        """
+        Whole trades dataframe (scaled integer columns when read as fixed point),
+        from the row given by first_row
+
+        :returns : pandas.DataFrame
+        :raises ValueError: if the trades are streamed (not loaded)
+        """
+        if self._chunksize is not None: raise ValueError("The trades are streamed (not loaded).")
+        return self._trades
+
+    def first_row(self):
+        """
+        Row of the trades file the trades are read from (0 unless seek was used),
+        the first row of get_trades
+
+        :returns : int
+        """
+        return self._first_row
+
+    def seek(self, row, trades_offset, ledger_offset = None):
+        """
+        Read the files from byte offsets (see offsets) instead of their 
+        beginning: the rows before are neither read nor parsed (e.g. a 
+        resumed run). Only possible before the files are read, and if the
+        offsets are the start of a line of the files.
+
+        :param row: (int) row of the trades file at trades_offset
+        :param trades_offset: (int) byte offset of the row in the trades file
+        :param ledger_offset: (int) (optional) byte offset of the first ledger row to read
+        :returns : (bool) True if the files are going to be read from the offsets
+        """
+        if isinstance(self._trades_file, pd.DataFrame): return False
+        if self._frames is not None or (self._chunksize is not None and self._ledger_chunks is not None): return False
+        files = ((self._trades_file, trades_offset), (self._ledger_file, ledger_offset))
+        if not all(offset is None or (file and Trades._is_line_start(file, offset)) for file, offset in files): return False
+        self._first_row = row
+        self._offsets = (trades_offset, ledger_offset if self._ledger_file else None)
+        return True
+
+    def offsets(self, row, time):
+        """
+        Byte offsets to resume reading the files at a position (see seek): 
+        the start of a row of the trades file and of the first ledger entry
+        a trade at or after a time can be joined with (the ledger being 
+        sorted by time). The trades file is scanned from the current offset.
+
+        :param row: (int) row of the trades file
+        :param time: (datetime) time of the trade of that row
+        :returns : (trades offset, ledger offset or None without ledger), 
+                   None if the trades are not read from a file
+        """
+        if isinstance(self._trades_file, pd.DataFrame): return None
+        trades_offset = Trades.row_offset(self._trades_file, row - self._first_row, self._offsets[0])
+        if not self._ledger_file: return trades_offset, None
+        return trades_offset, Trades.time_offset(self._ledger_file, time - Trades.LEDGER_WINDOW, self._offsets[1])
+
+    def _stream_records(self, start):
+        """ Generator over the trades file read by chunks """
+        offset = self._offsets[0]
+        skiprows = (range(start) if offset else range(1, start + 1)) if start else None
+        for chunk in Trades.readKrakenCSV(self._trades_file, self._fixed_point, self._chunksize, skiprows, offset):
+            yield from Trades.frame_records(chunk)
+
+    def skip_ledger_before(self, time):
+        """
+        When streaming, ignore the ledger entries older than time
+        (already joined by the trades of a previous run).
+
+        :param time: (datetime) time of the last trade already processed
+        """
+        if self._chunksize is not None: self._ledger_since = time
+
+    def get_ledger(self, txid, time = None):
+        """
+        Ledger entry of a transaction id (constant time lookup).
+        The records of the ledger are built once, on the first lookup
+        (fixed point fields are only decoded when read, see frame_records).
+
+        :param txid: (str) ledger transaction id
+        :param time: (datetime) (optional) time of the trade of the entry, 
+                     bounds the part of the ledger kept and read when streaming
+        :returns : named tuple with the ledger entry
+        :raises ValueError: if attempting to read a non existing ledger
+        :raises KeyError: if the txid is not in the ledger
+        """
+        if self._chunksize is not None: return self._stream_ledger(txid, time)
+        if self._ledger is None: raise ValueError("Theres is no ledger loaded.")
+        if self._ledger_records is None: self._ledger_records = list(Trades.frame_records(self._ledger))
+        return self._ledger_records[self._ledger_index[txid]]
+
+    def _stream_ledger(self, txid, time):
+        """
+        Ledger entry of a transaction id when streaming.
+
+        The ledger is read chunk by chunk until the txid shows up. Trade
+        entries are buffered, other entries are never joined and are skipped.
+        Both files being sorted by time, given the time of the trade:
+        - buffered entries older than it (LEDGER_WINDOW tolerance) are dropped,
+          their trades are processed
+        - the lookup fails as soon as the ledger is read past it, instead of
+          reading the rest of the file
+        Entries stay buffered until dropped, so a lookup can be repeated. The
+        buffer is bounded anyway (LEDGER_BUFFER, oldest entries dropped first).
+        """
+        if self._ledger_file is None: raise ValueError("Theres is no ledger loaded.")
+        if self._ledger_chunks is None:
+            self._ledger_chunks = Trades.readKrakenCSV(self._ledger_file, self._fixed_point, self._chunksize, offset=self._offsets[1])
+
+        buffer = self._ledger_buffer
+        while txid not in buffer:
+            if time is not None and self._ledger_read is not None and self._ledger_read > time + Trades.LEDGER_WINDOW:
+                raise KeyError(txid)
+            chunk = next(self._ledger_chunks, None)
+            if chunk is None: raise KeyError(txid)
+            for row in Trades.frame_records(chunk):
+                if self._ledger_since is not None and row.time < self._ledger_since: continue
+                if row.type in Trades.LEDGER_TRADE_TYPES and type(row.txid) == str and row.txid:
+                    buffer.setdefault(row.txid, row)
+            if len(chunk): self._ledger_read = chunk[Trades.TIME_COL].iloc[-1]
+            for _ in range(len(buffer) - max(Trades.LEDGER_BUFFER, 2*self._chunksize)): del buffer[next(iter(buffer))]
+
+        entry = buffer[txid]
+        if time is not None:
+            oldest = time - Trades.LEDGER_WINDOW
+            while buffer and next(iter(buffer.values())).time < oldest: del buffer[next(iter(buffer))]
+        return entry
+
     def balance_check(self):
         """ Balance check based on the ledger information
         
         :returns : True if coherent
                    False if non coherent
         :raises ValueError: if attempting to read a non existing ledger
-        # TODO loop could be optimized
         """
+        return not self.balance_report()
+
+    def balance_report(self):
+        """ Reconciliation of the ledger balances, asset by asset
+
+        The running balance of each asset (cumulative sum of amount - fee over
+        the ledger entries with a txid) is compared to the balance column on
+        every row. The sums are grouped and vectorized over exact scaled
+        integers: fixed point ledgers are used as is, Decimal ones converted
+        with decimal_to_fixed_point (array operations as well, but each 
+        Decimal object is formatted once, the bulk of the time on large 
+        ledgers: load them with fixed_point to check millions of rows).
+
+        :returns : dict {asset: txid of the first divergent row}, empty if coherent
+        :raises ValueError: if attempting to read a non existing ledger
+        """
+        if self._chunksize is not None: raise ValueError("Balance check needs the whole ledger (not streamed).")
         if self._ledger is None: raise ValueError("Theres is no ledger loaded.")
 
-        ledger_status = collections.defaultdict(lambda: Decimal("0"))
-        ledger_calculus = collections.defaultdict(lambda: Decimal("0"))
-        for _, row in self._ledger.iterrows():
-            if type(row[Trades.TXID_COL]) == str and row[Trades.TXID_COL]:
-                ledger_calculus[Trades.ASSET_COL] += row[Trades.AMOUNT_COL] - row[Trades.FEE_COL]
-                ledger_status[Trades.ASSET_COL] = row[Trades.BALANCE_COL]
+        txid = self._ledger[Trades.TXID_COL]
+        ledger = self._ledger[(txid.notna() & (txid != "")).to_numpy(dtype=bool)]
+        if ledger.empty: return {}
 
-        for asset in ledger_status:
-            if ledger_status[asset] != ledger_calculus[asset]: return False
+        cols = (Trades.AMOUNT_COL, Trades.FEE_COL, Trades.BALANCE_COL)
+        values, scales = Trades._scaled_columns(ledger, cols)
+        scale = max(scales)
+        factors = [10 ** (scale - s) for s in scales]
+        bound = max((int(v.abs().max()) if v.notna().any() else 0) * f for v, f in zip(values, factors))
+        if not bound < 2**62: values = [v.astype(object) for v in values] # exact Python integers
+        amount, fee, balance = (v * f for v, f in zip(values, factors))
 
-        return True
-          
+        running = (amount - fee).groupby(ledger[Trades.ASSET_COL].to_numpy()).cumsum()
+        diverged = (balance.notna() & (running != balance)).to_numpy(dtype=bool)
+        first = ledger[diverged].groupby(Trades.ASSET_COL, sort=False)[Trades.TXID_COL].first()
+        return first.to_dict()
 
     @staticmethod
-    def readKrakenCSV(file):
+    def _scaled_columns(df, cols):
+        """ Columns of a ledger as (scaled integer Series, scale) pairs """
+        fixed = df.attrs.get(Trades.SCALES_ATTR) or {}
+        values, scales = [], []
+        for c in cols:
+            if c in fixed: parsed, scale = df[c], fixed[c]
+            else: parsed, scale = Trades.decimal_to_fixed_point(df[c])
+            values.append(parsed)
+            scales.append(scale)
+        return values, scales
+
+    @staticmethod
+    def readKrakenCSV(file, fixed_point = False, chunksize = None, skiprows = None, offset = None):
         """
         Static method to read and convert trades into a pandas dataframe
+
+        Numeric columns are exact: Decimals by default or, with fixed_point,
+        integers scaled by 10**scale (one scale per column, stored in
+        df.attrs[Trades.SCALES_ATTR]) parsed in a vectorized way. A column 
+        with too many digits for 64 bits integers is kept as Decimals (and
+        left out of the scales).
         
         :param file: (str) file location
+        :param fixed_point: (bool) keep numeric columns as scaled integers
+        :param chunksize: (int) if given, iterate over the file chunksize rows at a time
+        :param skiprows: (optional) line numbers to skip (see pandas.read_csv)
+        :param offset: (int) (optional) byte offset of the first row to read, 
+                       the start of a line (the header is still read first)
+        :return : pandas.DataFrame (trades or ledger), or an iterator of
+                  dataframes if chunksize is given
+        :raises ValueError: if a numeric column holds a non decimal value
+        """
+        if chunksize is not None: return Trades._read_chunks(file, fixed_point, chunksize, skiprows, offset)
+        dtype = {c: str for c in Trades.NUMERIC_COLS} if fixed_point else None
+        with Trades._csv_source(file, offset) as source:
+            return Trades._convert(pd.read_csv(dtype=dtype, skiprows=skiprows, **source), fixed_point)
+
+    @staticmethod
+    def readCachedKrakenCSV(file, cache, fixed_point = False):
+        """
+        Static method reading a file like readKrakenCSV through a cache.
+        The cache holds the fixed point frame, parsed only if the file
+        content is not cached yet.
+
+        :param file: (str) file location
+        :param cache: trades_cache instance
+        :param fixed_point: (bool) keep numeric columns as scaled integers
         :return : pandas.DataFrame (trades or ledger)
         """
-        df = pd.read_csv(file)
+        df = cache.load(file)
+        if df is None:
+            df = Trades.readKrakenCSV(file, fixed_point=True)
+            cache.store(file, df)
+        return df if fixed_point else Trades.to_decimal_frame(df)
+
+    @staticmethod
+    def _read_chunks(file, fixed_point, chunksize, skiprows = None, offset = None):
+        """ Generator of converted dataframes of chunksize rows """
+        dtype = {c: str for c in Trades.NUMERIC_COLS} if fixed_point else None
+        with Trades._csv_source(file, offset) as source:
+            with pd.read_csv(dtype=dtype, chunksize=chunksize, skiprows=skiprows, **source) as reader:
+                for df in reader:
+                    yield Trades._convert(df, fixed_point)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _csv_source(file, offset):
+        """ pandas.read_csv arguments reading a file from a byte offset (rows numbered from it) """
+        if not offset:
+            yield {"filepath_or_buffer": file}
+            return
+        with open(file, "rb") as fp:
+            names = next(csv.reader([fp.readline().decode()]))
+            fp.seek(offset)
+            yield {"filepath_or_buffer": fp, "names": names, "header": None}
+
+    @staticmethod
+    def _is_line_start(file, offset):
+        """ True if a byte offset of a file is the start of a line after the header (or its end) """
+        with open(file, "rb") as fp:
+            header = len(fp.readline())
+            if offset < header or offset > os.fstat(fp.fileno()).st_size: return False
+            fp.seek(offset - 1)
+            return fp.read(1) == b"\n"
+
+    @staticmethod
+    def row_offset(file, rows, offset = None):
+        """
+        Static method giving the byte offset of a row of a csv file, counting
+        lines (one per row, as in the Kraken exports) with array operations
+
+        :param file: (str) file location
+        :param rows: (int) number of rows before it, from offset
+        :param offset: (int) (optional) byte offset of a row, the first one by default
+        :return : int byte offset
+        :raises ValueError: if the file has less rows
+        """
+        with open(file, "rb") as fp:
+            if offset is None: fp.readline()
+            else: fp.seek(offset)
+            position = fp.tell()
+            while rows:
+                block = fp.read(Trades.BLOCK_SIZE)
+                if not block: raise ValueError(f"{file} has less rows than expected.")
+                newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord("\n"))
+                if len(newlines) >= rows: return position + int(newlines[rows - 1]) + 1
+                rows -= len(newlines)
+                position += len(block)
+            return position
+
+    @staticmethod
+    def time_offset(file, time, offset = None):
+        """
+        Static method giving the byte offset of the first row at or after a
+        time in a csv file sorted by time (binary search, a few lines parsed)
+
+        :param file: (str) file location
+        :param time: (datetime) time searched
+        :param offset: (int) (optional) byte offset of the row the search starts from
+        :return : int byte offset (the file size if every row is older)
+        """
+        time = pd.Timestamp(time)
+        with open(file, "rb") as fp:
+            column = next(csv.reader([fp.readline().decode()])).index(Trades.TIME_COL)
+            low, high = offset or fp.tell(), os.fstat(fp.fileno()).st_size
+
+            def line_from(position):
+                # (start, content) of the first line starting at or after position
+                fp.seek(position - 1)
+                if fp.read(1) != b"\n": fp.readline()
+                return fp.tell(), fp.readline()
+
+            while low < high:
+                middle = (low + high) // 2
+                line = line_from(middle)[1]
+                if not line.strip() or pd.Timestamp(next(csv.reader([line.decode()]))[column]) >= time: high = middle
+                else: low = middle + 1
+            return line_from(low)[0]
+
+    @staticmethod
+    def _convert(df, fixed_point):
+        """ Converts the time and numeric columns of a raw Kraken dataframe """
         df[Trades.TIME_COL] = pd.to_datetime(df[Trades.TIME_COL])
-        for c in (Trades.AMOUNT_COL, Trades.FEE_COL, Trades.COST_COL, Trades.PRICE_COL, Trades.VOL_COL, Trades.AMOUNT_COL, Trades.BALANCE_COL):
-            try: df[c] = df[c].apply(str).apply(Decimal)
-            except: pass
+        if not fixed_point:
+            for c in Trades.NUMERIC_COLS:
+                if c in df: df[c] = df[c].apply(str).apply(Decimal)
+            return df
+
+        scales = {}
+        for c in Trades.NUMERIC_COLS:
+            if c not in df: continue
+            try:
+                df[c], scales[c] = Trades.to_fixed_point(df[c])
+            except OverflowError:
+                df[c] = df[c].apply(str).apply(Decimal)
+        df.attrs[Trades.SCALES_ATTR] = scales
+        return df
+
+    @staticmethod
+    def index_by_txid(df):
+        """
+        Static method mapping each transaction id to its row position.
+        Built once so that joining a trade with its ledger entries is O(1).
+        Empty ids are skipped and the first occurrence wins in case of duplicates.
+
+        :param df: pandas.DataFrame (usually the ledger)
+        :return : dict {txid: row position}
+        """
+        index = {}
+        if Trades.TXID_COL not in df: return index
+        for position, txid in enumerate(df[Trades.TXID_COL]):
+            if type(txid) == str and txid: index.setdefault(txid, position)
+        return index
+
+    @staticmethod
+    def frame_records(df):
+        """
+        Static method looping on a dataframe as named tuples.
+        The columns are extracted once as lists and zipped into records.
+        Scaled integer columns (fixed point frames) are kept in the tuples as
+        (scaled integer, scale) pairs: a field reads as a Decimal, decoded only
+        when it is read (see record_type), and scaled gives the exact pair.
+
+        :param df: pandas.DataFrame (trades or ledger)
+        :return : iterator of named tuples
+        """
+        record = Trades.record_type(df)
+        scales = df.attrs.get(Trades.SCALES_ATTR) or {}
+        columns = (zip(df[c].tolist(), itertools.repeat(scales[c])) if c in scales else df[c].tolist() for c in df.columns)
+        return map(record._make, zip(*columns))
+
+    @staticmethod
+    def record_type(df):
+        """
+        Static method building (once per columns and scales) the named tuple 
+        class of the rows of a dataframe. The fields of the scaled integer 
+        columns hold (scaled integer, scale) pairs and are read as Decimals.
+
+        :param df: pandas.DataFrame (trades or ledger)
+        :return : named tuple class
+        """
+        columns = tuple(df.columns)
+        scales = df.attrs.get(Trades.SCALES_ATTR) or {}
+        key = (columns, tuple(scales.items()))
+        record = Trades._RECORD_TYPES.get(key)
+        if record is not None: return record
+
+        base = collections.namedtuple(Trades.RECORD_NAME, columns, rename=True)
+        namespace = {"__slots__": (), "_scaled": {}}
+        for c, scale in scales.items():
+            position = columns.index(c)
+            field = base._fields[position]
+            namespace["_scaled"][field] = (position, scale)
+            namespace[field] = property(Trades._decoder(position, scale), doc=f"{c} (Decimal)")
+        record = Trades._RECORD_TYPES[key] = type(Trades.RECORD_NAME, (base,), namespace)
+        return record
+
+    @staticmethod
+    def _decoder(position, scale):
+        """ Getter of a scaled integer field as a Decimal (NaN if missing) """
+        item = operator.itemgetter(position)
+        nan = Decimal("NaN")
+        def decode(record):
+            value = item(record)[0]
+            return Decimal(value).scaleb(-scale) if type(value) is int else nan
+        return decode
+
+    @staticmethod
+    def scaled(row, name):
+        """
+        Static method giving the exact value of a numeric field of a row:
+        a (scaled integer, scale) pair for the records of a fixed point frame
+        (no Decimal built, the wallet takes it as is, see wallet.numeric), 
+        the value of the field otherwise.
+
+        :param row: record (see frame_records) or pandas.Series
+        :param name: (str) name of the field
+        :return : (int, int) pair or the field value (Decimal)
+        """
+        scaled = getattr(row, "_scaled", None)
+        if scaled and name in scaled:
+            value = row[scaled[name][0]]
+            if type(value[0]) is int: return value
+        return getattr(row, name)
+
+    @staticmethod
+    def getter(row, *names):
+        """
+        Static method giving a function reading several fields of rows of the
+        same type as row at once, each as scaled gives it. For the records of 
+        frame_records it is a single itemgetter (no Python level call per field).
+
+        :param row: record (see frame_records) or pandas.Series
+        :param names: (str) names of the fields
+        :return : function of a row giving the tuple of the field values
+        """
+        key = (type(row), names)
+        get = Trades._GETTERS.get(key)
+        if get is None:
+            fields = getattr(row, "_fields", None)
+            if fields is None: get = lambda r: tuple(Trades.scaled(r, name) for name in names)
+            else: get = operator.itemgetter(*(fields.index(name) for name in names))
+            Trades._GETTERS[key] = get
+        return get
+
+    @staticmethod
+    def to_fixed_point(column):
+        """
+        Static method parsing decimal strings into exact scaled integers.
+        The strings are viewed as a byte matrix and the digits are
+        accumulated column by column (no Python level loop over the rows).
+        The scale is the largest number of decimals found in the column.
+
+        :param column: pandas.Series of strings (missing or empty values allowed)
+        :return : (pandas.Series of integers, scale)
+        :raises ValueError: if a value is not a plain decimal number (e.g. "-" or ".")
+        :raises OverflowError: if the column has too many digits for 64 bits integers
+        """
+        text = column.to_numpy(dtype=object, na_value="").astype(bytes)
+        missing = text == b""
+        text[missing] = b"0"
+        return Trades._parse_fixed_point(text, missing, column.index, column.name)
+
+    @staticmethod
+    def decimal_to_fixed_point(column):
+        """
+        Static method converting Decimals into exact scaled integers.
+        The Decimals are formatted in a single numpy pass and parsed like
+        decimal strings, the exponent notation (e.g. 0E-10) being resolved 
+        on the arrays. A column too large for 64 bits integers is converted
+        value by value into Python integers.
+
+        :param column: pandas.Series of Decimals (missing values allowed)
+        :return : (pandas.Series of integers, scale)
+        """
+        missing = column.isna().to_numpy()
+        text = column.to_numpy(dtype=object).astype(bytes)
+        text[missing] = b"0"
+        exponents = 0
+        if (np.char.find(text, b"E") >= 0).any():
+            parts = np.char.partition(text, b"E")
+            text, exponents = np.ascontiguousarray(parts[:, 0]), np.where(parts[:, 2] == b"", b"0", parts[:, 2]).astype(np.int64)
+        try:
+            return Trades._parse_fixed_point(text, missing, column.index, column.name, exponents)
+        except OverflowError:
+            scale = max([0] + [-d.as_tuple().exponent for d in column[~missing]])
+            return column.map(lambda d: None if pd.isna(d) else int(d.scaleb(scale))), scale
+
+    @staticmethod
+    def _parse_fixed_point(text, missing, index, name, exponents = 0):
+        """
+        Scaled integers of an array of decimal bytes strings, each value 
+        multiplied by 10**exponents (see to_fixed_point)
+        """
+        chars = text.view(np.uint8).reshape(len(text), -1) if len(text) else np.zeros((0, 1), np.uint8)
+
+        is_digit = (chars >= ord("0")) & (chars <= ord("9"))
+        is_dot = chars == ord(".")
+        is_sign = np.zeros_like(is_digit)
+        is_sign[:, 0] = (chars[:, 0] == ord("-")) | (chars[:, 0] == ord("+"))
+        if not (is_digit | is_dot | is_sign | (chars == 0)).all() or (is_dot.sum(axis=1) > 1).any() \
+                or not is_digit.any(axis=1).all():
+            raise ValueError(f"Non decimal value in column {name}")
+
+        length = (chars != 0).sum(axis=1)
+        decimals = np.where(is_dot.any(axis=1), length - is_dot.argmax(axis=1) - 1, 0) - exponents
+        scale = max(int(decimals.max()), 0) if len(decimals) else 0
+        if (is_digit.sum(axis=1) - decimals).max(initial=0) + scale > Trades.MAX_DIGITS:
+            raise OverflowError(f"Too many digits for a fixed point column {name}")
+
+        # Each digit weighs 10**(number of digits after it in its row)
+        digits = np.where(is_digit, chars - ord("0"), 0).astype(np.int64)
+        after = np.cumsum(is_digit[:, ::-1], axis=1)[:, ::-1] - is_digit
+        values = (digits * Trades._POWERS[after]).sum(axis=1)
+        values *= Trades._POWERS[scale - decimals]
+        values[chars[:, 0] == ord("-")] *= -1
+
+        parsed = pd.Series(values, index=index, name=name)
+        if missing.any(): parsed = parsed.astype("Int64").mask(missing)
+        return parsed, scale
+
+    @staticmethod
+    def from_fixed_point(value, scale):
+        """
+        Static method converting a scaled integer into a Decimal
+
+        :param value: (int) integer scaled by 10**scale (or a missing value)
+        :param scale: (int) number of decimals
+        :return : Decimal (NaN if the value is missing)
+        """
+        if pd.isna(value): return Decimal("NaN")
+        return Decimal(int(value)).scaleb(-scale)
+
+    @staticmethod
+    def decimal_column(df, column):
+        """
+        Static method giving a column of a dataframe as an array of Decimals,
+        a scaled integer column being decoded in a single pass over its values
+
+        :param df: pandas.DataFrame (read with or without fixed_point)
+        :param column: (str) numeric column
+        :return : numpy.ndarray of Decimals (object)
+        """
+        scales = df.attrs.get(Trades.SCALES_ATTR) or {}
+        if column not in scales: return df[column].to_numpy(dtype=object)
+        scale, nan = -scales[column], Decimal("NaN")
+        values = np.empty(len(df), dtype=object)
+        values[:] = [Decimal(v).scaleb(scale) if type(v) is int else nan for v in df[column].tolist()]
+        return values
+
+    @staticmethod
+    def to_decimal_frame(df):
+        """
+        Static method converting the scaled integer columns of a fixed point
+        dataframe into Decimal columns (in place)
+
+        :param df: pandas.DataFrame read with fixed_point
+        :return : the same pandas.DataFrame with Decimal columns
+        """
+        scales = df.attrs.get(Trades.SCALES_ATTR) or {}
+        decimals = {c: Trades.decimal_column(df, c) for c in scales}
+        df.attrs.pop(Trades.SCALES_ATTR, None)
+        for c, values in decimals.items():
+            df[c] = pd.Series(values, index=df.index, dtype=object)
         return df
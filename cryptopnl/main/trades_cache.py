@@ -0,0 +1,192 @@
+import hashlib
+from decimal import Decimal
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+class trades_cache:
+    """
+    On disk cache of parsed Kraken exports (trades or ledger).
+
+    Each parsed file is stored as one numpy .npy file per column in a
+    directory named after the hash of the file content, so an export is
+    only parsed once and any change of the source invalidates its entry.
+    Frames are meant to be cached in their fixed point form (exact scaled
+    integers, see Trades.readKrakenCSV), their attrs are kept as well.
+
+    Cached columns are memory mapped, not copied: the numeric and time
+    columns of a loaded frame are views on the page cache, shared by every
+    process reading the same entry. The mapping is copy on write, a process
+    modifying a frame only gets private copies of the pages it writes.
+    Text columns are materialised as python objects.
+
+    Several processes may share a cache directory: every write goes to a
+    temporary file or directory of its own and is renamed into place, and
+    an entry already stored by another process (same content hash) is kept.
+
+    Attributes
+    ----------
+    :param cache_dir: directory holding the cached entries
+
+    Methods
+    -------
+    load(file)
+        Cached dataframe of a file (None if not cached)
+    store(file, df)
+        Caches a fixed point dataframe of a file
+    file_hash(file)
+        Content hash of a file
+    """
+
+    VERSION = 1
+    META_FILE = "meta.json"
+    HASHES_FILE = "hashes.json"
+    TMP_SUFFIX = ".tmp"
+    BLOCK_SIZE = 1 << 20
+    MMAP_MODE = "c" # copy on write
+
+    # Column kinds
+    NUMERIC = "numeric"
+    INTEGER = "integer" # nullable scaled integers
+    DECIMAL = "decimal" # columns too large for fixed point, stored as exact strings
+    TEXT = "text"
+
+    def __init__(self, cache_dir:str) -> None:
+        """
+        :param cache_dir: (str) cache location (created if needed)
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def file_hash(self, file:str) -> str:
+        """
+        Content hash of a file. The hash is remembered with the file size and
+        modification time, so an unchanged file is not read again.
+
+        :param file: (str) file location
+        :return : (str) hexadecimal hash
+        """
+        stat = os.stat(file)
+        signature = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+        path = os.path.realpath(file)
+        hashes = self._read_json(os.path.join(self.cache_dir, trades_cache.HASHES_FILE)) or {}
+        if path in hashes and hashes[path][0] == signature: return hashes[path][1]
+
+        content_hash = hashlib.blake2b(str(trades_cache.VERSION).encode())
+        with open(file, "rb") as fp:
+            for block in iter(lambda: fp.read(trades_cache.BLOCK_SIZE), b""):
+                content_hash.update(block)
+        hashes[path] = [signature, content_hash.hexdigest()]
+        self._write_json(os.path.join(self.cache_dir, trades_cache.HASHES_FILE), hashes)
+        return hashes[path][1]
+
+    def load(self, file:str) -> pd.DataFrame:
+        """
+        Cached dataframe of a file
+
+        :param file: (str) file location
+        :return : pandas.DataFrame or None if the file is not cached
+        """
+        entry = os.path.join(self.cache_dir, self.file_hash(file))
+        meta = self._read_json(os.path.join(entry, trades_cache.META_FILE))
+        if meta is None: return None
+        try:
+            columns = self._load_columns(entry, meta)
+        except FileNotFoundError: # entry pruned meanwhile by another process
+            return None
+        df = pd.DataFrame(columns, copy=False)
+        df.attrs.update(meta["attrs"])
+        return df
+
+    def _load_columns(self, entry:str, meta:dict) -> dict:
+        columns = {}
+        for i, (name, kind) in enumerate(meta["columns"]):
+            values = self._load_array(entry, f"{i}.npy")
+            if kind == trades_cache.INTEGER:
+                values = pd.arrays.IntegerArray(values, self._load_array(entry, f"{i}.mask.npy"))
+            elif kind == trades_cache.DECIMAL:
+                values = np.array([Decimal(v) for v in values.tolist()], dtype=object)
+            elif kind == trades_cache.TEXT:
+                mask = self._load_array(entry, f"{i}.mask.npy")
+                values = values.astype(object)
+                values[mask] = np.nan
+            columns[name] = values
+        return columns
+
+    def store(self, file:str, df:pd.DataFrame) -> None:
+        """
+        Cache the dataframe of a file (older entries of the same file are removed)
+
+        :param file: (str) file location
+        :param df: pandas.DataFrame parsed from the file (json friendly attrs)
+        """
+        key = self.file_hash(file)
+        entry = os.path.join(self.cache_dir, key)
+        tmp_entry = tempfile.mkdtemp(dir=self.cache_dir, prefix=key + ".", suffix=trades_cache.TMP_SUFFIX)
+
+        columns = []
+        for i, name in enumerate(df.columns):
+            column = df[name]
+            if isinstance(column.dtype, pd.Int64Dtype):
+                kind = trades_cache.INTEGER
+                np.save(os.path.join(tmp_entry, f"{i}.npy"), column.to_numpy(dtype=np.int64, na_value=0))
+                np.save(os.path.join(tmp_entry, f"{i}.mask.npy"), column.isna().to_numpy())
+            elif column.dtype.kind in "biufcmM":
+                kind = trades_cache.NUMERIC
+                np.save(os.path.join(tmp_entry, f"{i}.npy"), column.to_numpy())
+            elif len(column) and isinstance(column.iloc[0], Decimal):
+                kind = trades_cache.DECIMAL
+                np.save(os.path.join(tmp_entry, f"{i}.npy"), column.to_numpy(dtype=str))
+            else:
+                kind = trades_cache.TEXT
+                mask = column.isna().to_numpy()
+                np.save(os.path.join(tmp_entry, f"{i}.npy"), column.astype(object).where(~mask, "").to_numpy(dtype=str))
+                np.save(os.path.join(tmp_entry, f"{i}.mask.npy"), mask)
+            columns.append((name, kind))
+
+        meta = {"version": trades_cache.VERSION, "source": os.path.realpath(file),
+                "columns": columns, "attrs": df.attrs}
+        self._write_json(os.path.join(tmp_entry, trades_cache.META_FILE), meta)
+        try:
+            os.rename(tmp_entry, entry)
+        except OSError: # stored meanwhile by another process (same content)
+            if not os.path.isdir(entry): raise
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+        self._prune(meta["source"], key)
+
+    def _prune(self, source:str, key:str) -> None:
+        """ Remove the entries of older versions of a source file """
+        for other in os.listdir(self.cache_dir):
+            if other == key or other.endswith(trades_cache.TMP_SUFFIX): continue
+            if not os.path.isdir(os.path.join(self.cache_dir, other)): continue
+            meta = self._read_json(os.path.join(self.cache_dir, other, trades_cache.META_FILE))
+            if meta is not None and meta["source"] == source:
+                shutil.rmtree(os.path.join(self.cache_dir, other), ignore_errors=True)
+
+    def _load_array(self, entry:str, name:str) -> np.ndarray:
+        # plain ndarray view of the mapping (pandas keeps array subclasses)
+        return np.asarray(np.load(os.path.join(entry, name), mmap_mode=trades_cache.MMAP_MODE))
+
+    @staticmethod
+    def _read_json(file:str):
+        try:
+            with open(file, "r") as fp:
+                return json.load(fp)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_json(file:str, content) -> None:
+        # unique temporary file, atomically renamed (the last writer wins)
+        directory, name = os.path.split(file)
+        fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=name + ".", suffix=trades_cache.TMP_SUFFIX)
+        try:
+            with os.fdopen(fd, "w") as fp:
+                json.dump(content, fp)
+            os.replace(tmp_file, file)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
@@ -9,8 +9,11 @@ class Logger:
         line += f"+++ {ining.asset} {ining.amount} (-{ining.fee})\n"
         self.trades.append(line)
     
+    def logLine(self, line):
+        self.trades.append(line + "\n")
+
     def logWallet(self, value, wallet):
-        self.trades.append(f"Cost: {wallet.getCost()} \tValue: {value}\n")
+        self.trades.append(f"Cost: {wallet.getWalletCost()} \tValue: {value}\n")
         bal = ""
         for c in wallet.amounts.keys():
             bal += f"{c} :\t {wallet.amounts[c]}\n"
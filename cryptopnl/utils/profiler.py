@@ -0,0 +1,133 @@
+import cProfile
+import functools
+import json
+import time
+from cryptopnl.api.to_include_in_exchangeAPI_prices import prices
+from cryptopnl.main.abstract_strategy import abstract_strategy
+from cryptopnl.main.trades import Trades
+from cryptopnl.wallet.wallet import wallet
+
+class profiler:
+    """
+    Opt-in instrumentation of a profits and losses run.
+
+    While active (as a context manager), the methods of every phase are
+    wrapped with a counter and a timer, and restored on exit: nothing is
+    measured (nor slowed down) outside of it. Times are inclusive (e.g. the
+    process_trade dispatches include their wallet operations and ledger
+    joins) and work done in worker processes is not measured.
+
+        with profiler(cprofile_file="run.prof") as prof:
+            strategy = fifo_with_ledger(trades_file, ledger_file)
+            strategy.go()
+        prof.save("report.json")
+
+    Attributes
+    ----------
+    :param phases: {phase: [calls, seconds]}
+    :param seconds: wall time of the run
+
+    Methods
+    -------
+    report()
+        Structured report of the run
+    save(file)
+        Writes the report as json
+    """
+
+    LOAD = "load" # Trades construction (csv parsing or cache load)
+    LEDGER_JOIN = "ledger_join"
+    PROCESS_TRADE = "process_trade"
+    WALLET_ADD = "wallet.add"
+    WALLET_TAKE = "wallet.take"
+    PRICE_LOOKUP = "price_lookup"
+    PRICE_API = "price_api"
+    SUMMARY = "pnl_summary"
+    DISPATCHES = ("fiat2crypto", "crypto2fiat", "crypto2crypto")
+
+    def __init__(self, cprofile_file:str = None) -> None:
+        """
+        :param cprofile_file: (str) (optional) location of a cProfile dump of the run
+        """
+        self.cprofile_file = cprofile_file
+        self.phases = {}
+        self.seconds = None
+        self._patched = []
+        self._cprofile = None
+        self._start = None
+
+    def targets(self) -> list:
+        """ (phase, class, method name) of every instrumented method """
+        targets = [(profiler.LOAD, Trades, "__init__"),
+                   (profiler.LEDGER_JOIN, Trades, "get_ledger"),
+                   (profiler.WALLET_ADD, wallet, "add"),
+                   (profiler.WALLET_TAKE, wallet, "take"),
+                   (profiler.PRICE_LOOKUP, prices, "getPrice"),
+                   (profiler.PRICE_LOOKUP, prices, "getPrices"),
+                   (profiler.PRICE_API, prices, "getPriceAPI")]
+        for strategy in [abstract_strategy] + _subclasses(abstract_strategy):
+            targets.append((profiler.PROCESS_TRADE, strategy, "process_trade"))
+            targets.append((profiler.SUMMARY, strategy, "pnl_summary"))
+            targets += [(f"{profiler.PROCESS_TRADE}[{name}]", strategy, name) for name in profiler.DISPATCHES]
+        # Only the methods defined by each class (inherited ones are wrapped once, in their class)
+        return [(phase, cls, name) for phase, cls, name in targets if name in vars(cls)]
+
+    def __enter__(self):
+        for phase, cls, name in self.targets():
+            original = vars(cls)[name]
+            setattr(cls, name, self._timed(phase, original))
+            self._patched.append((cls, name, original))
+        if self.cprofile_file:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.seconds = time.perf_counter() - self._start
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_file)
+            self._cprofile = None
+        for cls, name, original in reversed(self._patched):
+            setattr(cls, name, original)
+        self._patched = []
+
+    def _timed(self, phase:str, function):
+        """ function wrapped with the counter and timer of a phase """
+        stats = self.phases.setdefault(phase, [0, 0.0])
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stats[0] += 1
+                stats[1] += time.perf_counter() - start
+        return timed
+
+    def report(self) -> dict:
+        """
+        Structured report of the run
+
+        Returns
+        -------
+        dict {"seconds": wall time, "phases": {phase: {"calls", "seconds", "share"}}, "cprofile"}
+        with the phases sorted by decreasing time (share of the wall time)
+        """
+        total = self.seconds or 0.0
+        phases = {phase: {"calls": calls, "seconds": seconds, "share": seconds / total if total else None}
+                  for phase, (calls, seconds) in sorted(self.phases.items(), key=lambda p: -p[1][1]) if calls}
+        return {"seconds": total, "phases": phases, "cprofile": self.cprofile_file}
+
+    def save(self, file:str) -> None:
+        """ Write the report as json """
+        with open(file, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+def _subclasses(cls) -> list:
+    """ All the (direct or not) subclasses of a class """
+    found = []
+    for sub in cls.__subclasses__():
+        found += [sub] + _subclasses(sub)
+    return found
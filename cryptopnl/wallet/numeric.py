@@ -0,0 +1,158 @@
+from decimal import Decimal, ROUND_HALF_EVEN
+
+def to_decimal(value) -> Decimal:
+    """
+    Decimal of a number given as a Decimal or as an exact (scaled integer, scale)
+    pair, the fields of a fixed point trades frame (see Trades.scaled)
+    """
+    if type(value) is tuple: return Decimal(value[0]).scaleb(-value[1])
+    return value
+
+def difference(a, b) -> Decimal:
+    """
+    Decimal a - b of two numbers given as Decimals or scaled integer pairs
+    (see to_decimal), pairs being subtracted as integers and decoded once
+    """
+    if type(a) is tuple and type(b) is tuple:
+        scale = max(a[1], b[1])
+        return Decimal(a[0]*10**(scale - a[1]) - b[0]*10**(scale - b[1])).scaleb(-scale)
+    return to_decimal(a) - to_decimal(b)
+
+def _divide_half_even(numerator:int, denominator:int) -> int:
+    # numerator / denominator (denominator > 0) to the nearest integer, ties to even
+    quotient, remainder = divmod(numerator, denominator)
+    if 2*remainder > denominator or (2*remainder == denominator and quotient % 2): quotient += 1
+    return quotient
+
+class decimal_backend:
+    """
+    Numeric backend storing the wallet chunks as Decimals (default).
+
+    Volumes and costs are kept untouched, so the results are exactly the
+    ones of the plain Decimal arithmetic. Scaled integer pairs are decoded.
+
+    Methods
+    -------
+    to_vol(crypto, amount) / from_vol(crypto, vol)
+        Converts a Decimal volume into the inner representation and back
+    to_cost(cost) / from_cost(cost)
+        Converts a Decimal fiat cost into the inner representation and back
+    cost_of(amount, price, fee)
+        Inner representation of the cost price*amount + fee of a purchase
+    cost_fraction(cost, vol, chunk_vol)
+        Cost of taking vol out of a chunk of chunk_vol with a given cost
+    """
+
+    ZERO = Decimal()
+
+    def to_vol(self, crypto:str, amount:Decimal) -> Decimal:
+        return amount if type(amount) is not tuple else to_decimal(amount)
+
+    def from_vol(self, crypto:str, vol:Decimal) -> Decimal:
+        return vol
+
+    def to_cost(self, cost:Decimal) -> Decimal:
+        return to_decimal(cost)
+
+    def from_cost(self, cost:Decimal) -> Decimal:
+        return cost
+
+    def cost_of(self, amount:Decimal, price:Decimal, fee:Decimal) -> Decimal:
+        if type(amount) is tuple or type(price) is tuple or type(fee) is tuple:
+            return to_decimal(price)*to_decimal(amount) + to_decimal(fee)
+        return price*amount + fee
+
+    def cost_fraction(self, cost:Decimal, vol:Decimal, chunk_vol:Decimal) -> Decimal:
+        vol_fraction = vol / chunk_vol
+        return cost * vol_fraction
+
+class fixed_point_backend:
+    """
+    Numeric backend storing the wallet chunks as exact scaled integers.
+
+    Volumes are integers in units of 10**-scale (one scale per crypto) and
+    costs integers in units of 10**-cost_scale. Additions and comparisons are
+    exact integer operations; the only roundings happen when converting a
+    number with too many decimals and when splitting the cost of a chunk,
+    both to the nearest unit with ties to even (ROUND_HALF_EVEN).
+
+    Numbers are taken as Decimals or as the (scaled integer, scale) pairs of
+    a fixed point trades frame (Trades(fixed_point=True), see Trades.scaled).
+    Pairs are only rescaled, so fed with them the wallet never builds a
+    Decimal for a volume, a price or a cost; fed with Decimals every add and
+    take pays a Decimal -> int conversion. Either way it is an exactness mode,
+    not a speedup: Python integers are no faster than the C Decimals of
+    decimal_backend, and a run is about as fast or slower.
+
+    Methods
+    -------
+    to_vol(crypto, amount) / from_vol(crypto, vol)
+        Converts a volume into scaled integers and back (Decimal)
+    to_cost(cost) / from_cost(cost)
+        Converts a fiat cost into scaled integers and back (Decimal)
+    cost_of(amount, price, fee)
+        Scaled integer cost price*amount + fee of a purchase (rounded once)
+    cost_fraction(cost, vol, chunk_vol)
+        Cost of taking vol out of a chunk of chunk_vol with a given cost
+    """
+
+    ZERO = 0
+    DEFAULT_SCALE = 10 # Kraken amounts have at most 10 decimals
+    COST_SCALE = 10
+
+    def __init__(self, scales:dict = None, default_scale:int = DEFAULT_SCALE,
+                 cost_scale:int = COST_SCALE) -> None:
+        """
+        Parameters
+        ----------
+        scales (dict) : (optional) number of decimals kept for each crypto
+        default_scale (int) : number of decimals of the cryptos not in scales
+        cost_scale (int) : number of decimals kept for the fiat costs
+        """
+        self.scales = dict(scales or {})
+        self.default_scale = default_scale
+        self.cost_scale = cost_scale
+
+    def _scale(self, crypto:str) -> int:
+        return self.scales.get(crypto, self.default_scale)
+
+    def _to_int(self, value:Decimal, scale:int) -> int:
+        if type(value) is tuple: 
+            value, shift = value[0], scale - value[1]
+            if shift >= 0: return value * 10**shift
+            return _divide_half_even(value, 10**-shift)
+        if type(value) is not Decimal: value = Decimal(value)
+        scaled = value.scaleb(scale)
+        integral = int(scaled)
+        if integral == scaled: return integral
+        return int(scaled.to_integral_value(rounding=ROUND_HALF_EVEN))
+
+    def to_vol(self, crypto:str, amount:Decimal) -> int:
+        if type(amount) is tuple: # inlined _to_int, the hot path
+            shift = self.scales.get(crypto, self.default_scale) - amount[1]
+            if shift >= 0: return amount[0] * 10**shift
+            return _divide_half_even(amount[0], 10**-shift)
+        return self._to_int(amount, self._scale(crypto))
+
+    def from_vol(self, crypto:str, vol:int) -> Decimal:
+        return Decimal(vol).scaleb(-self._scale(crypto))
+
+    def to_cost(self, cost:Decimal) -> int:
+        return self._to_int(cost, self.cost_scale)
+
+    def from_cost(self, cost:int) -> Decimal:
+        return Decimal(cost).scaleb(-self.cost_scale)
+
+    def cost_of(self, amount, price, fee) -> int:
+        if type(amount) is tuple and type(price) is tuple and type(fee) is tuple:
+            # exact price*amount + fee at the largest of their scales, rounded once
+            exact, scale = amount[0]*price[0], amount[1] + price[1]
+            if fee[1] > scale: exact, scale = exact*10**(fee[1] - scale) + fee[0], fee[1]
+            else: exact += fee[0]*10**(scale - fee[1])
+            if scale <= self.cost_scale: return exact * 10**(self.cost_scale - scale)
+            return _divide_half_even(exact, 10**(scale - self.cost_scale))
+        return self.to_cost(to_decimal(price)*to_decimal(amount) + to_decimal(fee))
+
+    def cost_fraction(self, cost:int, vol:int, chunk_vol:int) -> int:
+        # cost * vol / chunk_vol rounded half even (exact integer division)
+        return _divide_half_even(cost * vol, chunk_vol)
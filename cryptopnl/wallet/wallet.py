@@ -1,5 +1,27 @@
 from decimal import Decimal 
-from collections import defaultdict
+from collections import defaultdict, deque
+import numpy as np
+import pandas as pd
+from cryptopnl.api.price_series import price_series
+from cryptopnl.wallet.numeric import decimal_backend, to_decimal
+
+class lot:
+    """
+    A chunk of crypto acquired at once.
+
+    Compact record (no per instance dict) holding the remaining volume,
+    its fiat cost (fee included), both in the wallet's numeric backend
+    representation, the acquisition price (Decimal or scaled integer pair,
+    see numeric.to_decimal) and the id of the acquiring trade (None if unknown).
+    """
+
+    __slots__ = ("cost", "vol", "price", "id")
+
+    def __init__(self, cost, vol, price:Decimal, id:str = None) -> None:
+        self.cost = cost
+        self.vol = vol
+        self.price = price
+        self.id = id
 
 class wallet:
     """
@@ -9,13 +31,23 @@ class wallet:
     -------
     add(crypto, chunk)
         Adds a crypto amount to the wallet (quantity and price)
-    take(crypto, vol, boughtInFiat)
+    get_chunks(crypto)
+        Gets a dict view of the chunks of a crypto
+    set_chunks(crypto, chunks, amount)
+        Replaces the chunks of a crypto (totals recomputed)
+    get_cost_basis(crypto)
+        Gets the fiat cost of the remaining amount of a crypto
+    holdings()
+        Gets the amounts held (snapshot for a later valuation)
+    get_state() / set_state(state)
+        Exports / restores the wallet content (for checkpoints)
+    take(crypto, vol, consumed)
         Takes a ammount of crypto using FIFO and computes surplus 
     updateCost(cost)
         Updates the wallet's average cost
     setWalletCost(cost)
         Sets average cost value
-    getCurrentWalletValue(prices, time)
+    getCurrentWalletValue(time, prices)
         Gets the wallet's current value
     getWalletCost()
         Gets the wallet's current average cost value
@@ -24,23 +56,39 @@ class wallet:
     COST = "cost"
     VOL = "vol"
     PRICE = "price"
+    AMOUNTS = "amounts"
+    CHUNKS = "chunks"
 
-    def __init__(self):
+    def __init__(self, backend = None):
         """
         Constructs the wallet and sets the inital cost value to zero 
+
+        Parameters
+        ----------
+        backend : (optional) numeric backend of the chunks (see wallet.numeric),
+                  Decimal arithmetic by default
         """
 
-        # Dict containing all the chunks 
-        self.wallet = defaultdict(list) 
+        # Arithmetic used for the chunks
+        self._backend = backend if backend is not None else decimal_backend()
+
+        # Dict containing all the chunks (FIFO queues of lots, oldest first)
+        self.wallet = defaultdict(deque) 
 
         # Dict containing the total amounts of each crypto
         self.amounts = defaultdict(Decimal) 
+
+        # Dict containing the total cost of the chunks of each crypto (backend representation)
+        self._costs = defaultdict(type(self._backend.ZERO))
             
         # Current wallet value set to zero
         self._walletCost = Decimal()
+
+        # Scaled integer costs added by updateCost {scale: sum}, folded into _walletCost when read
+        self._scaledCost = defaultdict(int)
         return
 
-    def add(self, crypto:str, amount:Decimal, price:Decimal, fee:Decimal = Decimal()) -> None:
+    def add(self, crypto:str, amount:Decimal, price:Decimal, fee:Decimal = Decimal(), lot_id:str = None) -> None:
         """
         Adds an amount of crypto
 
@@ -50,27 +98,124 @@ class wallet:
         amount (float)
         price (float): price of crypto with respect to fiat (eur)
         fee (float): fee of transaction (in fiat)
+        lot_id (str): (optional) id of the acquiring trade (e.g. its txid)
+
+        The numbers can also be (scaled integer, scale) pairs (see Trades.scaled),
+        which fixed_point_backend stores without building any Decimal.
         """
 
-        chunk = {
-            wallet.COST: price*amount + fee,
-            wallet.VOL: amount, 
-            wallet.PRICE: price, 
-            }
-        self.wallet[crypto].append(chunk)
-        self.amounts[crypto] += amount   # TODO do it elsewhere
+        backend = self._backend
+        cost = backend.cost_of(amount, price, fee)
+        self.wallet[crypto].append(lot(cost, backend.to_vol(crypto, amount), price, lot_id))
+        self.amounts[crypto] += amount if type(amount) is not tuple else to_decimal(amount)
+        self._costs[crypto] += cost
         return
+
+    def get_chunks(self, crypto:str) -> list:
+        """
+        Dict view of the chunks of a crypto (copies, mostly meant for inspection)
+
+        Parameters
+        ----------
+        crypto (str) : crypto-currency name
+
+        Returns
+        -------
+        list of dict {COST, VOL, PRICE} ordered from oldest to newest
+        """
+        backend = self._backend
+        return [{wallet.COST: backend.from_cost(chunk.cost),
+                 wallet.VOL: backend.from_vol(crypto, chunk.vol),
+                 wallet.PRICE: to_decimal(chunk.price)} for chunk in self.wallet.get(crypto, ())]
+
+    def set_chunks(self, crypto:str, chunks:deque, amount:Decimal) -> None:
+        """
+        Replace the chunks of a crypto (e.g. processed elsewhere), its totals
+        being recomputed
+
+        Parameters
+        ----------
+        crypto (str) : crypto-currency name
+        chunks (deque) : lots of the crypto, oldest first
+        amount (Decimal) : total amount of the crypto
+        """
+        self.wallet[crypto] = chunks
+        self.amounts[crypto] = amount
+        self._costs[crypto] = sum((chunk.cost for chunk in chunks), self._backend.ZERO)
+
+    def get_cost_basis(self, crypto:str) -> Decimal:
+        """
+        Fiat cost (fees included) of the remaining amount of a crypto, 
+        maintained on every add and take
+
+        Parameters
+        ----------
+        crypto (str) : crypto-currency name
+        """
+        return self._backend.from_cost(self._costs.get(crypto, self._backend.ZERO))
+
+    def holdings(self) -> dict:
+        """
+        Amounts held (zero amounts left out), e.g. a snapshot to value later 
+        with value_snapshots
+
+        Returns
+        -------
+        dict {crypto: amount}
+        """
+        return {crypto: amount for crypto, amount in self.amounts.items() if amount}
+
+    def get_state(self) -> dict:
+        """
+        Export the wallet content as plain (json friendly) values.
+        Numbers are exact Decimal strings, independent of the numeric backend.
+
+        Returns
+        -------
+        dict {COST: str, "amounts": {crypto: str}, "chunks": {crypto: [[cost, vol, price, lot id], ]}}
+        """
+        return {
+            wallet.COST: str(self.getWalletCost()),
+            wallet.AMOUNTS: {crypto: str(amount) for crypto, amount in self.amounts.items()},
+            wallet.CHUNKS: {crypto: [[str(c[wallet.COST]), str(c[wallet.VOL]), str(c[wallet.PRICE]), chunk.id] 
+                                        for c, chunk in zip(self.get_chunks(crypto), self.wallet[crypto])]
+                            for crypto in self.wallet},
+            }
+
+    def set_state(self, state:dict) -> None:
+        """
+        Restore the wallet content exported by get_state (replaces the current one)
+
+        Parameters
+        ----------
+        state (dict) : wallet content as returned by get_state (chunks without 
+                       lot id, from older checkpoints, are accepted)
+        """
+        backend = self._backend
+        self._walletCost = Decimal(state[wallet.COST])
+        self._scaledCost.clear()
+        self.amounts = defaultdict(Decimal, {crypto: Decimal(amount) for crypto, amount in state[wallet.AMOUNTS].items()})
+        self.wallet = defaultdict(deque)
+        self._costs = defaultdict(type(backend.ZERO))
+        for crypto, chunks in state[wallet.CHUNKS].items():
+            self.wallet[crypto].extend(lot(backend.to_cost(Decimal(cost)), backend.to_vol(crypto, Decimal(vol)), Decimal(price), *lot_id)
+                                       for cost, vol, price, *lot_id in chunks)
+            self._costs[crypto] = sum((chunk.cost for chunk in self.wallet[crypto]), backend.ZERO)
           
-    def take(self, crypto:str, vol:Decimal) -> Decimal:
+    def take(self, crypto:str, vol:Decimal, consumed:list = None) -> Decimal:
         """
         Takes an amount of crypto following the FIFO method 
+        Exhausted chunks are dropped, so each call only visits the chunks it consumes
 
         Parameters
         ----------
         crypto : str
             Crypto-currency name
         vol : dec
-            Amount to be deducted
+            Amount to be deducted (or a scaled integer pair, see add)
+        consumed : list
+            (optional) filled with a (lot id, volume, cost) tuple per chunk 
+            (partially) taken, oldest first
 
         Returns
         -------
@@ -82,34 +227,44 @@ class wallet:
         NotImplementedError
             If the crypto is not included in the wallet
         
-        TODO remove empty chunks...
         TODO abstract amounts into single method 
         """
         if crypto not in self.wallet:
             raise ValueError("ERROR - CRYPTO NOT FOUND IN WALLET")
 
+        backend = self._backend
         chunks = self.wallet[crypto]
         initialCost = 0
-        self.amounts[crypto] -= vol
-        for chunk in chunks:
+        amount = vol if type(vol) is not tuple else to_decimal(vol)
+        self.amounts[crypto] -= amount
+        vol = backend.to_vol(crypto, vol)
+        start = len(consumed) if consumed is not None else 0
+        while chunks:
+            chunk = chunks[0]
             # Take all the chunk
-            if chunk[wallet.VOL] <= vol:
-                initialCost += chunk[wallet.COST]
-                vol -= chunk[wallet.VOL]
-                chunk[wallet.VOL] = Decimal() 
-                chunk[wallet.COST] = Decimal() 
+            if chunk.vol <= vol:
+                initialCost += chunk.cost
+                vol -= chunk.vol
+                chunks.popleft()
+                if consumed is not None: consumed.append((chunk.id, chunk.vol, chunk.cost))
             # Reduce current chunk and break the loop
             else :
-                vol_fraction = vol  / chunk[wallet.VOL]
-                extra_cost = chunk[wallet.COST] * vol_fraction 
-                chunk[wallet.VOL] -= vol
-                chunk[wallet.COST] -= extra_cost 
+                extra_cost = backend.cost_fraction(chunk.cost, vol, chunk.vol)
+                chunk.vol -= vol
+                chunk.cost -= extra_cost 
                 initialCost += extra_cost
+                if consumed is not None: consumed.append((chunk.id, vol, extra_cost))
                 vol = 0
                 break
         
         if vol > 0: 
             raise ValueError("Insufficient amount in the wallet")
+        self._costs[crypto] -= initialCost
+        initialCost = backend.from_cost(initialCost)
+        if consumed is not None:
+            # Back to Decimals, a single lot being the whole take (no conversion)
+            if len(consumed) - start == 1: consumed[start] = (consumed[start][0], amount, initialCost)
+            else: consumed[start:] = [(lot_id, backend.from_vol(crypto, v), backend.from_cost(c)) for lot_id, v, c in consumed[start:]]
         return initialCost
 
     def getWalletCost(self) -> Decimal:
@@ -120,6 +275,9 @@ class wallet:
         -------
         dec Wallet's cost 
         """
+        if self._scaledCost:
+            self._walletCost += sum((to_decimal((total, scale)) for scale, total in self._scaledCost.items()), Decimal())
+            self._scaledCost.clear()
         return self._walletCost
 
     def setWalletCost(self, cost:Decimal) -> None:
@@ -131,6 +289,7 @@ class wallet:
         cost : dec New wallet's cost
         """
         self._walletCost = cost 
+        self._scaledCost.clear()
 
     def updateCost(self, cost:Decimal, fee:Decimal = Decimal()) -> None:
         """
@@ -140,35 +299,80 @@ class wallet:
         ----------
         cost : (float) transaction cost
         fee : (float) transaction fee
+
+        Scaled integer pairs (see add) are summed exactly as integers and only
+        turned into a Decimal when the cost is read.
         """
-        self._walletCost += cost + fee 
+        if type(cost) is tuple and type(fee) is tuple:
+            self._scaledCost[cost[1]] += cost[0]
+            self._scaledCost[fee[1]] += fee[0]
+        else:
+            self._walletCost += to_decimal(cost) + to_decimal(fee) 
         
-    # TODO TODO TODO
-    # TODO create a function that calculates amounts
-    def getCurrentWalletValue(self, time, prices):
+    def getCurrentWalletValue(self, time, prices) -> Decimal:
         """
-        Get wallet's current value
+        Get wallet's current value (one price per crypto held)
 
         Parameters
         ----------
-        prices : class 
-            Class containing info about the classes
-        time : long
+        time : pandas.Timestamp
             Time at which the current value is asked
+        prices : prices
+            Prices of the cryptos (getPrice(crypto, time), None if unknown)
 
         Returns
         -------
         dec 
             Wallet's current value
+
+        Raises
+        ------
+        ValueError : if the price of a crypto held is unknown
         """
-        # TODO - needs some tweaking
-        currentVal = Decimal 
-        for crypto in self.amounts:
-            price = Decimal(prices.getPrice(crypto, time))
-            # With/Without Rounding
-            p = 5
-            rnd = Decimal(int(self.amounts[crypto]*Decimal(10**p))/Decimal(10**p))
-            currentVal += rnd*price
-            #currentVal += (self.amounts[crypto])*price
-        return currentVal 
+        value = Decimal()
+        for crypto, amount in self.holdings().items():
+            price = prices.getPrice(crypto, time)
+            if price is None: raise ValueError(f"No price of {crypto} at {time}.")
+            value += amount * Decimal(str(price))
+        return value
+
+def value_snapshots(snapshots:list, series) -> np.ndarray:
+    """
+    Value many portfolio snapshots in one vectorized pass: for each asset,
+    the times of all the snapshots holding it are priced at once against
+    its price series.
+
+    Parameters
+    ----------
+    snapshots (list) : (time, {crypto: amount}) pairs, e.g. (time, wallet.holdings())
+    series : {crypto: price_series} or a prices instance (stored prices, see prices.getPrices)
+
+    Returns
+    -------
+    numpy.ndarray of the Decimal values of the snapshots
+
+    Raises
+    ------
+    ValueError : if a crypto held has no price at or before the time of a snapshot
+    """
+    times = price_series.to_ns_array([time for time, _ in snapshots])
+    positions, cryptos, amounts = [], [], []
+    for i, (_, held) in enumerate(snapshots):
+        positions += [i] * len(held)
+        cryptos += held.keys()
+        amounts += held.values()
+    positions, cryptos = np.array(positions, dtype=np.int64), np.array(cryptos, dtype=object)
+    amounts = np.array(amounts, dtype=object)
 
+    values = np.full(len(snapshots), Decimal(), dtype=object)
+    for crypto in dict.fromkeys(cryptos):
+        held = np.flatnonzero(cryptos == crypto)
+        held_times = times[positions[held]]
+        if hasattr(series, "getPrices"): found = series.getPrices(crypto, held_times)
+        elif crypto in series: found = series[crypto].prices_at(held_times)[1]
+        else: found = np.full(len(held), None, dtype=object)
+        missing = np.flatnonzero(found == None) # elementwise
+        if len(missing): raise ValueError(f"No price of {crypto} at {pd.Timestamp(int(held_times[missing[0]]))}.")
+        found = np.array([p if isinstance(p, Decimal) else Decimal(str(p)) for p in found], dtype=object)
+        np.add.at(values, positions[held], amounts[held] * found)
+    return values
@@ -0,0 +1,12 @@
+import pytest
+
+from cryptopnl.api.krakenAPI import krakenAPI
+from test.api.kraken_stub import kraken_stub_server
+
+@pytest.fixture
+def kraken_stub(mocker):
+    """ Kraken stand-in, krakenAPI is pointed to it """
+    stub = kraken_stub_server()
+    mocker.patch.object(krakenAPI, "API_DOMAIN", stub.url)
+    yield stub
+    stub.close()
@@ -0,0 +1,70 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import json
+import pandas as pd
+import threading
+
+T0 = pd.Timestamp("2021-01-01 00:00:00")
+STEP = 600 # seconds between two history trades
+PAGE = 50 # history trades per reply
+
+def history(asset):
+    """ Synthetic history trades of an asset over two days [(time ns, price)] """
+    base = {"XXBT": 30000, "XETH": 700, "XLTC": 100}[asset]
+    return [(T0.value + i*STEP*10**9, f"{base + i}.5") for i in range(2*24*3600 // STEP)]
+
+class kraken_stub_server:
+    """
+    Local stand-in of the Kraken public Trades endpoint (since exclusive, PAGE 
+    trades per reply) over keep-alive HTTP/1.1. 
+    Replies listed in failures (HTTP status or Kraken error) are served first.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.connections = set()
+        self.failures = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                with stub._lock:
+                    stub.queries.append((url.path, params))
+                    stub.connections.add(self.client_address)
+                    failure = stub.failures.pop(0) if stub.failures else None
+
+                status, reply = 200, None
+                if isinstance(failure, int): status, reply = failure, {"error": ["EService:Unavailable"]}
+                elif failure is not None: reply = {"error": [failure]}
+                else:
+                    pair = params["pair"]
+                    since = int(params.get("since", 0))
+                    page = [p for p in history(pair[:4]) if p[0] > since][:PAGE]
+                    last = page[-1][0] if page else since
+                    result = {pair: [[price, "0.1", t / 1e9, "b", "l", ""] for t, price in page], "last": str(last)}
+                    reply = {"error": [], "result": result}
+
+                body = json.dumps(reply).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
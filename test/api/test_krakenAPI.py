@@ -131,3 +131,51 @@ def test_mock_getTickerAPI():
     """NOT IMPLEMENTED"""
     with pytest.raises(NotImplementedError):
         krakenAPI.getTickerAPI()
+
+def test_mock_iterHistoryTrades(mocker):
+    """
+    Assert the pages are followed with the exact last cursor until an empty page
+    """
+    pair = "XXBTZEUR"
+    replies = [
+        {pair:[["1.0","0.1",1642967070.1,"b","l",""]], "last":"1642967070100000123"},
+        {pair:[["2.0","0.1",1642967071.2,"b","l",""], ["3.0","0.1",1642967072.3,"b","l",""]], "last":"1642967072300000456"},
+        {pair:[], "last":"1642967072300000456"},
+        ]
+    public_mock = mocker.patch("cryptopnl.api.krakenAPI.krakenAPI._publicAPI", side_effect=replies)
+    pages = krakenAPI.iterHistoryTrades(pair, since=5)
+
+    assert next(pages) == replies[0][pair]
+    public_mock.assert_called_once_with("Trades", {"pair": pair, "since": "5"})
+    assert list(pages) == [replies[1][pair]]
+    assert public_mock.call_args_list[1] == mocker.call("Trades", {"pair": pair, "since": "1642967070100000123"})
+    assert public_mock.call_args_list[2] == mocker.call("Trades", {"pair": pair, "since": "1642967072300000456"})
+
+def test_mock_iterHistoryTrades_until(mocker):
+    """
+    Assert the iteration stops at the until time (last page trimmed)
+    """
+    pair = "XXBTZEUR"
+    replies = [
+        {pair:[["1.0","0.1",10.0,"b","l",""], ["2.0","0.1",20.0,"b","l",""]], "last":"20000000000"},
+        {pair:[["3.0","0.1",30.0,"b","l",""], ["4.0","0.1",40.0,"b","l",""]], "last":"40000000000"},
+        ]
+    public_mock = mocker.patch("cryptopnl.api.krakenAPI.krakenAPI._publicAPI", side_effect=replies)
+
+    pages = list(krakenAPI.iterHistoryTrades(pair, until=int(35e9)))
+    assert pages == [replies[0][pair], replies[1][pair][:1]]
+    assert public_mock.call_count == 2
+
+    public_mock.reset_mock(side_effect=True)
+    public_mock.side_effect = replies
+    assert list(krakenAPI.iterHistoryTrades(pair, until=int(20e9))) == [replies[0][pair]]
+    assert public_mock.call_count == 1
+
+@pytest.mark.parametrize("output", ["Im drunk", {"XXBTZEUR":[]}, {"last":"12"}])
+def test_mock_iterHistoryTrades_ImproperFormat(output, mocker):
+    """
+    Assert improper formats are dealt with 
+    """
+    mocker.patch("cryptopnl.api.krakenAPI.krakenAPI._publicAPI", return_value=output)
+    with pytest.raises(APIException):
+        list(krakenAPI.iterHistoryTrades("XXBTZEUR"))
@@ -0,0 +1,96 @@
+import pytest
+
+from cryptopnl.api.exchangeAPI import APIException
+from cryptopnl.api.krakenAPI import krakenAPI
+from cryptopnl.api.krakenClient import krakenClient, token_bucket
+from test.api.kraken_stub import PAGE, history
+
+@pytest.fixture
+def client(kraken_stub):
+    with krakenClient(kraken_stub.url, workers=3, rate=1000, burst=10, backoff=0) as client:
+        yield client
+
+def test_token_bucket():
+    """
+    Assert requests beyond the burst wait for the refill rate
+    """
+    now = [0.0]
+    waits = []
+    def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+    bucket = token_bucket(rate=2, capacity=2, clock=lambda: now[0], sleep=sleep)
+
+    for _ in range(4): bucket.acquire()
+    assert waits == [0.5, 0.5]
+    now[0] += 10
+    for _ in range(2): bucket.acquire()
+    assert waits == [0.5, 0.5]
+
+def test_getHistoryTrades(client, kraken_stub):
+    """
+    Assert a page is the one of krakenAPI, over a reused connection
+    """
+    since = history("XXBT")[10][0]
+    data, last = client.getHistoryTrades("XXBTZEUR", since=since)
+    expected = krakenAPI.getHistoryTrades("XXBTZEUR", since=since)
+
+    assert (data, last) == expected
+    assert len(data) == PAGE
+    assert kraken_stub.queries[0] == ("/0/public/Trades", {"pair": "XXBTZEUR", "since": str(since)})
+
+    for _ in range(5): client.getHistoryTrades("XXBTZEUR")
+    # krakenAPI opens one connection, the client a single keep-alive one
+    assert len(kraken_stub.connections) == 2
+
+def test_map_concurrent(client, kraken_stub):
+    """
+    Assert the pages of many pairs are fetched concurrently in order, with at most one connection per worker
+    """
+    pairs = ["XXBTZEUR", "XETHZEUR", "XLTCZEUR"] * 4
+    pages = client.map(lambda pair: client.getHistoryTrades(pair), pairs)
+
+    assert [page[0][0][0] for page in pages] == [history(pair[:4])[0][1] for pair in pairs]
+    assert len(kraken_stub.connections) <= client.workers
+
+@pytest.mark.parametrize("failures", [[503], [429, 502], ["EAPI:Rate limit exceeded"], ["EService:Busy", 500, 503]])
+def test_retry_transient(client, kraken_stub, failures):
+    """
+    Assert transient failures are retried
+    """
+    kraken_stub.failures.extend(failures)
+    data, _ = client.getHistoryTrades("XETHZEUR")
+
+    assert len(data) == PAGE
+    assert len(kraken_stub.queries) == len(failures) + 1
+
+def test_retry_exhausted(client, kraken_stub):
+    """
+    Assert an APIException is raised after the last retry
+    """
+    kraken_stub.failures.extend([503] * (client.retries + 1))
+    with pytest.raises(APIException):
+        client.getHistoryTrades("XETHZEUR")
+    assert len(kraken_stub.queries) == client.retries + 1
+
+def test_permanent_error(client, kraken_stub):
+    """
+    Assert a non transient Kraken error is not retried
+    """
+    kraken_stub.failures.append("EQuery:Unknown asset pair")
+    with pytest.raises(APIException):
+        client.getHistoryTrades("NOTAPAIR")
+    assert len(kraken_stub.queries) == 1
+
+def test_connection_error():
+    """
+    Assert a connection failure ends in an APIException after the retries
+    """
+    with krakenClient("http://127.0.0.1:1", workers=1, rate=1000, retries=1, backoff=0, timeout=1) as client:
+        with pytest.raises(APIException):
+            client.getHistoryTrades("XXBTZEUR")
+
+def test_getTickerAPI(client):
+    """NOT IMPLEMENTED"""
+    with pytest.raises(NotImplementedError):
+        client.getTickerAPI()
@@ -0,0 +1,95 @@
+from decimal import Decimal as D
+import pandas as pd
+import pytest
+
+from cryptopnl.api.price_cache import price_cache
+from cryptopnl.api.to_include_in_exchangeAPI_prices import prices
+
+def test_price_cache_buckets():
+    """
+    Assert a price answers the times of its span in its bucket and the counters are updated
+    """
+    cache = price_cache(resolution="1min")
+    time = pd.Timestamp("2021-01-01 12:00:10")
+    assert cache.get("XXBT", time) is None
+    cache.put("XXBT", time + pd.Timedelta(seconds=40), D("1"), since=time) # latest price before 12:00:50
+
+    assert cache.get("XXBT", time) == D("1")
+    assert cache.get("XXBT", time + pd.Timedelta(seconds=40)) == D("1")
+    assert cache.get("XXBT", time.value - 10 * 10**9) is None # before the price
+    assert cache.get("XXBT", time + pd.Timedelta(seconds=45)) is None # after the time resolved
+    assert cache.get("XETH", time) is None
+    assert cache.info() == {"hits": 2, "misses": 4, "evictions": 0, "size": 1, "maxsize": price_cache.MAXSIZE}
+
+    cache.put("XXBT", time + pd.Timedelta(seconds=45), D("1"), since=time) # same price, longer span
+    assert cache.get("XXBT", time + pd.Timedelta(seconds=45)) == D("1")
+
+    exact = price_cache(resolution=1)
+    exact.put("XXBT", time, D("1"))
+    assert exact.get("XXBT", time.value + 1) is None
+
+def test_price_cache_no_look_ahead():
+    """
+    Assert a later price does not replace an earlier one and only ends its span
+    """
+    cache = price_cache(resolution="1min")
+    time = pd.Timestamp("2021-01-01 12:00:00")
+    cache.put("XXBT", time + pd.Timedelta(seconds=50), D("1"), since=time)
+    cache.put("XXBT", time + pd.Timedelta(seconds=30), D("2"))
+
+    assert cache.get("XXBT", time + pd.Timedelta(seconds=5)) == D("1")
+    assert cache.get("XXBT", time + pd.Timedelta(seconds=30)) is None
+    assert cache.get("XXBT", time + pd.Timedelta(seconds=40)) is None
+
+    cache.put("XXBT", time + pd.Timedelta(minutes=1, seconds=50), D("1"), since=time) # next bucket
+    cache.truncate("XXBT", time + pd.Timedelta(minutes=1, seconds=10))
+    assert cache.get("XXBT", time + pd.Timedelta(minutes=1, seconds=5)) == D("1")
+    assert cache.get("XXBT", time + pd.Timedelta(minutes=1, seconds=20)) is None
+
+def test_price_cache_lru():
+    """
+    Assert the least recently used price is evicted beyond the size
+    """
+    cache = price_cache(maxsize=2, resolution=1)
+    cache.put("XXBT", 1, D("1"))
+    cache.put("XXBT", 2, D("2"))
+    assert cache.get("XXBT", 1) == D("1")
+    cache.put("XXBT", 3, D("3"))
+
+    assert len(cache) == 2
+    assert cache.get("XXBT", 2) is None
+    assert cache.get("XXBT", 1) == D("1") and cache.get("XXBT", 3) == D("3")
+    assert cache.evictions == 1
+
+    cache.clear()
+    assert len(cache) == 0 and cache.info()["hits"] == 0
+
+@pytest.mark.parametrize("maxsize, resolution", [(0, "1min"), (10, "0s")])
+def test_price_cache_invalid(maxsize, resolution):
+    with pytest.raises(ValueError):
+        price_cache(maxsize, resolution)
+
+def test_prices_cache(tmpdir, mocker):
+    """
+    Assert near identical times are priced from memory, without the store
+    """
+    pr = prices(str(tmpdir.join("prices.sqlite")), ["XXBT"], cache_size=16, resolution="1min")
+    time = pd.Timestamp("2021-01-01 12:00:00")
+    pr.store.add_price("XXBT", time, "30000.0")
+    store = mocker.spy(pr.store, "get_price")
+
+    for _ in range(10):
+        assert pr.getPrice("XXBT", time) == D("30000.0")
+    assert store.call_count == 1
+    assert (pr.cache.hits, pr.cache.misses) == (9, 1)
+
+    pr.store.add_coverage("XXBT", time, time + pd.Timedelta(minutes=1))
+    assert pr.getPrice("XXBT", time + pd.Timedelta(seconds=50)) == D("30000.0") # latest price before
+    for ms in range(0, 50000, 1000):
+        assert pr.getPrice("XXBT", time + pd.Timedelta(milliseconds=ms)) == D("30000.0")
+    assert store.call_count == 2
+
+    pr.addPrice("XXBT", time + pd.Timedelta(seconds=30), "30500.0")
+    assert pr.getPrice("XXBT", time + pd.Timedelta(seconds=5)) == D("30000.0") # no look ahead
+    assert pr.getPrice("XXBT", time + pd.Timedelta(seconds=40)) == D("30500.0")
+    assert store.call_count == 3
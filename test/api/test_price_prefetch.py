@@ -0,0 +1,153 @@
+from decimal import Decimal as D
+import pandas as pd
+import pytest
+
+from cryptopnl.api import price_prefetch
+from cryptopnl.api.krakenClient import krakenClient
+from cryptopnl.api.price_store import price_store
+from cryptopnl.api.to_include_in_exchangeAPI_prices import prices
+from cryptopnl.main.trades import Trades
+from test.api.kraken_stub import PAGE, T0, history
+
+@pytest.fixture
+def trades():
+    times = [T0 + pd.Timedelta(hours=h) for h in (2, 3, 5, 40)]
+    return pd.DataFrame({Trades.PAIR_COL: ["XETHXXBT", "XXBTZEUR", "XETHXXBT", "XETHXXBT"],
+                         Trades.TIME_COL: times})
+
+def test_price_windows(trades):
+    """
+    Assert the crypto to crypto trades needs are merged into windows per asset
+    """
+    hour = 3600 * 10**9
+    windows = price_prefetch.price_windows(trades, lookback=hour, max_gap=12*hour)
+    t = lambda h: (T0 + pd.Timedelta(hours=h)).value
+
+    assert windows == {"XETH": [(t(1), t(5)), (t(39), t(40))], "XXBT": [(t(1), t(5)), (t(39), t(40))]}
+    assert price_prefetch.price_windows(trades[trades[Trades.PAIR_COL] == "XXBTZEUR"]) == {}
+
+def test_price_windows_lookback(trades):
+    """
+    Assert by default only the needed times within a lookback of each other share a window
+    """
+    hour = 3600 * 10**9
+    t = lambda h: (T0 + pd.Timedelta(hours=h)).value
+    windows = price_prefetch.price_windows(trades, lookback=hour, needed={"XLTC": [t(h) for h in (7, 7.5, 20, 900)]})
+
+    assert windows["XETH"] == [(t(1), t(2)), (t(4), t(5)), (t(39), t(40))]
+    assert windows["XLTC"] == [(t(6), t(7.5)), (t(19), t(20)), (t(899), t(900))]
+
+def test_price_windows_needed(trades):
+    """
+    Assert other needed times (e.g. valuations) are merged with the ones of the trades
+    """
+    hour = 3600 * 10**9
+    t = lambda h: (T0 + pd.Timedelta(hours=h)).value
+    windows = price_prefetch.price_windows(trades, lookback=hour, max_gap=12*hour, needed={"XETH": [t(20)], "XLTC": [t(7), t(8)]})
+
+    assert windows["XETH"] == [(t(1), t(5)), (t(19), t(20)), (t(39), t(40))]
+    assert windows["XLTC"] == [(t(6), t(8))]
+    assert price_prefetch.price_windows(None, lookback=hour, needed={"XLTC": [t(7)]}) == {"XLTC": [(t(6), t(7))]}
+
+def test_prefetch_prices(kraken_stub, trades, tmpdir):
+    """
+    Assert the needed prices are fetched in a few paginated requests and stored
+    Assert a covered window is not fetched again
+    """
+    store = price_store(str(tmpdir.join("prices.sqlite")))
+    count = price_prefetch.prefetch_prices(store, trades)
+
+    assert count > 0 and len(store) > 0
+    assert {p["pair"] for _, p in kraken_stub.queries} == {"XETHZEUR", "XXBTZEUR"}
+    assert len(kraken_stub.queries) <= 8
+    for h in (2, 5, 40):
+        time = T0 + pd.Timedelta(hours=h)
+        for asset in ("XETH", "XXBT"):
+            assert store.covers(asset, time)
+            expected = max(p for p in history(asset) if p[0] <= time.value)
+            assert store.get_price_before(asset, time) == (expected[0], D(expected[1]))
+
+    queries = len(kraken_stub.queries)
+    assert price_prefetch.prefetch_prices(store, trades) == 0
+    assert len(kraken_stub.queries) == queries
+
+def test_prices_prefetch(kraken_stub, trades, tmpdir, mocker):
+    """
+    Assert the prices of the crypto to crypto trades are served without API calls once prefetched
+    """
+    pr = prices(str(tmpdir.join("prices.sqlite")), ["XXBT", "XETH"])
+    pr.prefetch(trades)
+    api = mocker.patch.object(prices, "getPriceAPI")
+
+    time = T0 + pd.Timedelta(hours=1, minutes=55)
+    assert pr.getPrice("XETH", time) == D(max(p for p in history("XETH") if p[0] <= time.value)[1])
+    api.assert_not_called()
+    pr.getPrice("XETH", T0 + pd.Timedelta(hours=20))
+    api.assert_called_once()
+
+def test_prefetch_prices_concurrent_client(kraken_stub, trades, tmpdir):
+    """
+    Assert a concurrent client fetches the same prices as the serial API
+    """
+    serial = price_store(str(tmpdir.join("serial.sqlite")))
+    price_prefetch.prefetch_prices(serial, trades)
+    concurrent = price_store(str(tmpdir.join("concurrent.sqlite")))
+    with krakenClient(kraken_stub.url, workers=4, rate=1000, burst=10) as client:
+        price_prefetch.prefetch_prices(concurrent, trades, api=client)
+
+    for asset in ("XETH", "XXBT"):
+        assert concurrent.get_series(asset).times.tolist() == serial.get_series(asset).times.tolist()
+        assert concurrent.get_series(asset).prices.tolist() == serial.get_series(asset).prices.tolist()
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_prefetch_prices_pages(kraken_stub, trades, tmpdir, mocker, concurrent):
+    """
+    Assert the windows are stored page by page, as they are fetched
+    """
+    store = price_store(str(tmpdir.join("prices.sqlite")))
+    add_prices = mocker.spy(store, "add_prices")
+    if concurrent:
+        with krakenClient(kraken_stub.url, workers=4, rate=1000, burst=10) as client:
+            count = price_prefetch.prefetch_prices(store, trades, api=client)
+    else:
+        count = price_prefetch.prefetch_prices(store, trades)
+
+    assert add_prices.call_count == len(kraken_stub.queries)
+    assert max(len(call.args[1]) for call in add_prices.call_args_list) <= PAGE
+    assert count == sum(len(call.args[1]) for call in add_prices.call_args_list)
+
+def test_window_pages_error():
+    """
+    Assert a failed fetch of a concurrent client is raised and its window not completed
+    """
+    class failing_client:
+        def map(self, function, items): return [function(i) for i in items]
+        def iterHistoryTrades(self, pair, since, until):
+            yield [[D("1"), D("1"), 1]]
+            raise ConnectionError(pair)
+
+    pages = price_prefetch.window_pages([("XETH", 0, 10)], api=failing_client())
+    assert next(pages) == (0, [(10**9, D("1"))])
+    with pytest.raises(ConnectionError):
+        next(pages)
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_backfill(kraken_stub, tmpdir, concurrent):
+    """
+    Assert a whole history range is stored page by page and covered
+    """
+    store = price_store(str(tmpdir.join("prices.sqlite")))
+    points = history("XXBT")
+    start, end = points[3][0], points[-10][0]
+
+    if concurrent:
+        with krakenClient(kraken_stub.url, rate=1000, burst=10) as client:
+            count = price_prefetch.backfill(store, "XXBT", start, end, api=client)
+    else:
+        count = price_prefetch.backfill(store, "XXBT", start, end)
+
+    expected = [p for p in points if start < p[0] <= end]
+    assert count == len(expected) == len(store)
+    assert len(kraken_stub.queries) == -(-len(expected) // PAGE)
+    assert store.get_series("XXBT").times.tolist() == [t for t, _ in expected]
+    assert store.covers("XXBT", start, end)
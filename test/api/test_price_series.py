@@ -0,0 +1,71 @@
+from decimal import Decimal as D
+import numpy as np
+import pandas as pd
+import pytest
+
+from cryptopnl.api.price_series import price_series
+from cryptopnl.api.to_include_in_exchangeAPI_prices import getCloserTime
+
+@pytest.fixture
+def series():
+    return price_series([300, 100, 200], [D("3"), D("1"), D("2")])
+
+def test_price_series_sorted(series):
+    """
+    Assert the points are sorted by time
+    """
+    assert series.times.tolist() == [100, 200, 300]
+    assert series.prices.tolist() == [D("1"), D("2"), D("3")]
+    assert len(series) == 3
+
+@pytest.mark.parametrize("time, expected", [
+    (99, (price_series.MISSING, price_series.MISSING)),
+    (100, (100, D("1"))),
+    (250, (200, D("2"))),
+    (10**18, (300, D("3"))),
+    ])
+def test_price_series_price_at(series, time, expected):
+    """
+    Assert the latest point at or before a time is found
+    """
+    assert series.price_at(time) == expected
+
+def test_price_series_prices_at(series):
+    """
+    Assert a column of times is resolved at once, as the single lookups
+    """
+    times = [99, 100, 250, 10**18, 150]
+    found_times, found_prices = series.prices_at(times)
+
+    assert found_times.tolist() == [price_series.MISSING, 100, 200, 300, 100]
+    assert found_prices.tolist() == [None, D("1"), D("2"), D("3"), D("1")]
+    for time, found_time, found_price in zip(times[1:], found_times[1:], found_prices[1:]):
+        assert series.price_at(time) == (found_time, found_price)
+
+    empty_times, empty_prices = price_series([], []).prices_at(times)
+    assert empty_times.tolist() == [price_series.MISSING] * len(times)
+    assert empty_prices.tolist() == [None] * len(times)
+
+def test_price_series_timestamps():
+    """
+    Assert timestamps, datetime64 and ns integers are the same times
+    """
+    stamps = pd.to_datetime(["2021-01-01", "2021-01-03"])
+    series = price_series(list(stamps), ["1", "3"])
+
+    assert series.price_at(pd.Timestamp("2021-01-02")) == (stamps[0].value, "1")
+    expected = np.array([stamps[0].value, stamps[1].value])
+    query = pd.Series(pd.to_datetime(["2021-01-02", "2021-01-04"]))
+    assert (series.prices_at(query)[0] == expected).all()
+    assert (series.prices_at(query.to_numpy())[0] == expected).all()
+    assert (series.prices_at(query.tolist())[0] == expected).all()
+
+def test_getCloserTime():
+    """
+    Assert the closest earlier point is returned (not the first one found)
+    """
+    data = [["1.0", "0.1", 10.0], ["2.0", "0.1", 20.0], ["3.0", "0.1", 30.0]]
+
+    assert getCloserTime(data, int(25e9)) == (int(20e9), "2.0")
+    assert getCloserTime(data, int(30e9)) == (int(30e9), "3.0")
+    assert getCloserTime(data, int(5e9)) == (-1, -1)
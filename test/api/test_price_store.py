@@ -0,0 +1,111 @@
+from decimal import Decimal as D
+import json
+import pandas as pd
+import pytest
+
+from cryptopnl.api.price_store import price_store
+from cryptopnl.api.to_include_in_exchangeAPI_prices import prices
+
+@pytest.fixture
+def store(tmpdir):
+    return price_store(str(tmpdir.join("prices.sqlite")))
+
+def test_price_store_add_get(store):
+    """
+    Assert prices are stored by asset and exact time, as exact decimals
+    """
+    time = pd.Timestamp("2021-01-01 12:00:00")
+    store.add_price("XXBT", time, "30668.70000")
+    store.add_price("XETH", time, D("700.1"))
+
+    assert store.get_price("XXBT", time) == D("30668.70000")
+    assert str(store.get_price("XXBT", time.value)) == "30668.70000"
+    assert store.get_price("XETH", time) == D("700.1")
+    assert store.get_price("XXBT", time + pd.Timedelta(seconds=1)) is None
+    assert len(store) == 2
+
+def test_price_store_get_price_before(store):
+    """
+    Assert the latest price at or before a time is retrieved
+    """
+    store.add_prices("XXBT", [(300, "3"), (100, "1"), (200, "2")])
+    store.add_prices("XETH", [(150, "15")])
+
+    assert store.get_price_before("XXBT", 99) is None
+    assert store.get_price_before("XXBT", 100) == (100, D("1"))
+    assert store.get_price_before("XXBT", 250) == (200, D("2"))
+    assert store.get_price_before("XXBT", 10**18) == (300, D("3"))
+    assert store.get_price_before("XETH", 175) == (150, D("15"))
+
+def test_price_store_persistence(tmpdir):
+    """
+    Assert prices survive reopening the store and a price can be replaced
+    """
+    db_file = str(tmpdir.join("prices.sqlite"))
+    store = price_store(db_file)
+    store.add_prices("XXBT", [(1, "1"), (2, "2")])
+    store.add_price("XXBT", 2, "2.5")
+    store.close()
+
+    store = price_store(db_file)
+    assert len(store) == 2
+    assert store.get_price("XXBT", 2) == D("2.5")
+
+def test_price_store_import_json(store, tmpdir):
+    """
+    Assert a legacy json cache is imported
+    """
+    json_file = tmpdir.join("prices.json")
+    json_file.write(json.dumps({"XXBT": {"100": "1.5", "200": "2.5"}, "XETH": {}}))
+
+    assert store.import_json(str(json_file)) == 2
+    assert store.get_price_before("XXBT", 150) == (100, D("1.5"))
+
+def test_prices_json_migration(tmpdir, mocker):
+    """
+    Assert the prices class imports its legacy json cache once and only
+    queries the API on a miss
+    """
+    time = pd.Timestamp("2021-01-01 12:00:00")
+    json_file = tmpdir.join("prices.json")
+    json_file.write(json.dumps({"XXBT": {str(time.value): "30000.0"}}))
+
+    pr = prices(str(json_file), ["XXBT"])
+    assert tmpdir.join("prices.sqlite").exists()
+    assert pr.getPrice("XXBT", time) == D("30000.0")
+
+    api = mocker.patch("cryptopnl.api.krakenAPI.krakenAPI.getHistoryTrades",
+                       return_value=([["31000.0", "0.1", (time.value - 10**9) / 1e9]], 0.0))
+    later = time + pd.Timedelta(seconds=1)
+    assert pr.getPrice("XXBT", later) == D("31000.0")
+    assert pr.getPrice("XXBT", later) == D("31000.0")
+    api.assert_called_once()
+
+    api.return_value = ([["32000.0", "0.1", (later.value + 10**9) / 1e9]], 0.0) # no earlier trade
+    assert pr.getPrice("XETH", later) is None
+
+    json_file.write(json.dumps({"XXBT": {str(time.value): "1.0"}}))
+    assert prices(str(json_file), ["XXBT"]).getPrice("XXBT", time) == D("30000.0")
+
+def test_price_store_get_series(store):
+    """
+    Assert a time range is loaded with the latest earlier price
+    """
+    store.add_prices("XXBT", [(100, "1"), (200, "2"), (300, "3"), (400, "4")])
+
+    assert store.get_series("XXBT").times.tolist() == [100, 200, 300, 400]
+    assert store.get_series("XXBT", start=250, end=300).times.tolist() == [200, 300]
+    assert store.get_series("XXBT", start=50, end=150).prices.tolist() == [D("1")]
+    assert len(store.get_series("XETH")) == 0
+
+def test_prices_getPrices(tmpdir):
+    """
+    Assert a column of trade times is resolved from the store at once
+    """
+    pr = prices(str(tmpdir.join("prices.sqlite")), ["XXBT"])
+    times = pd.to_datetime(["2021-01-01", "2021-01-02", "2021-01-03"])
+    pr.store.add_prices("XXBT", [(times[0], "1"), (times[2], "3")])
+
+    query = pd.Series(times + pd.Timedelta(hours=1))
+    assert pr.getPrices("XXBT", query).tolist() == [D("1"), D("1"), D("3")]
+    assert pr.getPrices("XXBT", [times[0] - pd.Timedelta(hours=1)]).tolist() == [None]
@@ -0,0 +1,60 @@
+import contextlib
+import io
+import json
+import pytest
+
+from benchmarks import run
+from benchmarks.synthetic import generate
+from cryptopnl.main.fifo_with_ledger import fifo_with_ledger
+from cryptopnl.main.fifo_with_trades import fifo_with_trades
+from cryptopnl.main.trades import Trades
+
+@pytest.fixture
+def history(tmpdir):
+    trades_file, ledger_file = str(tmpdir.join("trades.csv")), str(tmpdir.join("ledger.csv"))
+    counts = generate(trades_file, ledger_file, rows=500, seed=3)
+    return trades_file, ledger_file, counts
+
+def test_generate(history, tmpdir):
+    """
+    Assert the synthetic trades and ledger are consistent and reproducible
+    """
+    trades_file, ledger_file, counts = history
+    trades = Trades(trades_file, ledger_file)
+
+    assert len(trades.get_trades()) == counts["trades"] == 500
+    assert counts["ledger"] == 2 * 500 + 1 and counts["crypto2crypto"] > 0
+    assert trades.balance_check()
+
+    again = str(tmpdir.join("again.csv"))
+    generate(again, str(tmpdir.join("again_ledger.csv")), rows=500, seed=3)
+    assert open(again).read() == open(trades_file).read()
+
+@pytest.mark.parametrize("fixed_point", [False, True])
+def test_generate_strategies(history, fixed_point):
+    """
+    Assert both strategies process the whole synthetic history (ledger checks included)
+    """
+    trades_file, ledger_file, _ = history
+    for strategy in (fifo_with_trades(trades_file, fixed_point=fixed_point),
+                     fifo_with_ledger(trades_file, ledger_file, fixed_point=fixed_point)):
+        with contextlib.redirect_stdout(io.StringIO()): strategy.go()
+        assert strategy._processed == 500
+
+def test_run_and_compare(tmpdir):
+    """
+    Assert every benchmark is timed or skipped with a reason, and two reports compare
+    """
+    report = run.run_benchmarks(rows=200, repeat=1, workdir=str(tmpdir))
+    names = [r["name"] for r in report["results"]]
+
+    assert {"readKrakenCSV[trades]", "wallet.add", "wallet.take", "fifo_with_trades.go", "fifo_with_ledger.go", "average_cost.go", "cump"} <= set(names)
+    assert all("seconds" in r or r["skipped"] for r in report["results"])
+    json.dumps(report)
+
+    slower = json.loads(json.dumps(report))
+    for r in slower["results"]:
+        if "seconds" in r: r["seconds"] *= 2
+    compared = run.compare(report, slower)
+    assert compared and all(regression for *_, regression in compared)
+    assert not any(regression for *_, regression in run.compare(slower, report))
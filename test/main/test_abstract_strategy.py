@@ -1,5 +1,6 @@
-from datetime import datetime as dt
+from decimal import Decimal as D
 import os
+import pandas as pd
 import pytest
 import re
 from collections import defaultdict
@@ -56,10 +57,7 @@ def test_abstract_strategy_process_all_trades(abstract_strategy_fixture, mocker)
     mock_process = mocker.patch(f"{__name__}.not_so_abstract_strategy.process_trade", return_value=True)
 
     abstract_strategy_fixture.process_all_trades()
-    t0 = abstract_strategy_fixture._trades._trades.iloc[0]
-    t1 = abstract_strategy_fixture._trades._trades.iloc[1]
-    t2 = abstract_strategy_fixture._trades._trades.iloc[2]
-    t3 = abstract_strategy_fixture._trades._trades.iloc[3]
+    t0, t1, t2, t3 = abstract_strategy_fixture._trades.records()
 
     assert mock_process.call_count == 4
     assert str(mocker.call(t0)) == str(mock_process.call_args_list[0])
@@ -71,17 +69,18 @@ def test_abstract_strategy_process_all_trades(abstract_strategy_fixture, mocker)
 def test_abstract_strategy_pnl_summary(abstract_strategy_fixture, capsys):
     """ Assert it returns summay info and prints it"""
 
-    timestamp = dt.timestamp(dt.now())
     all_gains = {
-        "2020": [(timestamp, 1.0), (timestamp, 2.0)], 
-        "2021": [(timestamp, 10.0), (timestamp, 20.0)],
+        2020: [D("1.0"), D("2.0")], 
+        2021: [D("10.0"), D("20.0")],
     }
-    abstract_strategy_fixture.fifo_gains = all_gains
+    for year, profits in all_gains.items():
+        for profit in profits: 
+            abstract_strategy_fixture.gains.append(pd.Timestamp(f"{year}-06-01"), "XXBT", profit, D(0))
 
     pnl = abstract_strategy_fixture.pnl_summary()
 
     capture = capsys.readouterr()
-    assert pnl == {"2020": 3.0, "2021": 30.0}
+    assert pnl == {2020: D(3), 2021: D(30)}
     assert re.match('2020(.*)3.0(\n)*(.*)2021(.*)30.0', capture.out)
 
 def test_abstract_strategy_go(abstract_strategy_fixture, mocker):
@@ -0,0 +1,128 @@
+from decimal import Decimal as D
+import pandas as pd
+import pytest
+from cryptopnl.api.price_store import price_store
+from cryptopnl.api.to_include_in_exchangeAPI_prices import prices
+from cryptopnl.main.average_cost import average_cost
+from cryptopnl.main.gains import gains_table
+
+HEADER = '"txid","ordertxid","pair","time","type","ordertype","price","cost","fee","vol","margin","misc","ledgers"\n'
+ROWS = ['"t1","o","XXBTZEUR","2017-09-01 10:00:00.0000","buy","limit",1000.00,1000.00,10.00,1.00000000,0.0,"",""\n',
+        '"t2","o","XETHZEUR","2017-09-02 10:00:00.0000","buy","limit",100.00,1000.00,10.00,10.00000000,0.0,"",""\n',
+        '"t3","o","XXBTZEUR","2017-09-03 10:00:00.0000","sell","limit",2000.00,1000.00,5.00,0.50000000,0.0,"",""\n',
+        '"t4","o","XETHXXBT","2017-09-04 10:00:00.0000","buy","limit",0.050000,0.2500,0.0010,5.00000000,0.0,"",""\n',
+        '"t5","o","XETHZEUR","2018-01-05 10:00:00.0000","sell","limit",200.00,3000.00,6.00,15.00000000,0.0,"",""\n']
+
+@pytest.fixture
+def trades_file(tmpdir):
+    file = tmpdir.join("trades.csv")
+    file.write(HEADER + "".join(ROWS))
+    return str(file)
+
+def expected_gains(btc_price = D("2000.00")):
+    """ Gains of the history computed by hand """
+    cost = D("2020")
+    share = D("1000") / (D("1") * D("2000") + D("10") * D("100"))
+    first = D("995") - share * cost
+    cost -= share * cost
+    share = D("3000") / (D("15") * D("200") + D("0.249") * btc_price)
+    second = D("2994") - share * cost
+    return {2017: first, 2018: second}, cost - share * cost
+
+@pytest.mark.parametrize("options", [{}, {"fixed_point": True}, {"chunksize": 2}])
+def test_average_cost(trades_file, options):
+    """
+    Assert the gains and the remaining cost follow the weighted average cost method,
+    the same with fixed point parsing and when streaming (one by one processing)
+    """
+    strategy = average_cost(trades_file, max_price_age=None, **options) # XXBT valued at its 4 months old sale
+    strategy.process_all_trades()
+    gains, cost = expected_gains()
+
+    assert strategy.gains_summary() == gains
+    assert strategy._wallet.getWalletCost() == cost
+    assert strategy._wallet.amounts["XXBT"] == D("0.249")
+    assert strategy._wallet.amounts["XETH"] == D("0")
+    assert strategy._processed == 5
+
+def test_average_cost_gains_table(trades_file):
+    """
+    Assert the vectorized and the one by one runs give the same gains table, one row per sale
+    """
+    vectorized = average_cost(trades_file, max_price_age=None)
+    vectorized.process_all_trades()
+    streamed = average_cost(trades_file, chunksize=2, max_price_age=None)
+    streamed.process_all_trades()
+
+    assert vectorized.gains == streamed.gains
+    assert list(vectorized.gains.column(gains_table.ASSET)) == ["XXBT", "XETH"]
+    assert list(vectorized.gains.column(gains_table.PROCEEDS)) == [D("995"), D("2994")]
+
+def test_average_cost_checkpoint(trades_file, tmpdir):
+    """
+    Assert a run resumed from a checkpoint on appended trades ends as a single run
+    """
+    partial = tmpdir.join("partial.csv")
+    partial.write(HEADER + "".join(ROWS[:3]))
+    checkpoint = str(tmpdir.join("checkpoint.json"))
+    first = average_cost(str(partial), max_price_age=None)
+    first.process_all_trades()
+    first.save_checkpoint(checkpoint)
+
+    resumed = average_cost(trades_file, max_price_age=None)
+    resumed.load_checkpoint(checkpoint)
+    resumed.process_all_trades()
+    gains, cost = expected_gains()
+
+    assert resumed.gains_summary() == gains
+    assert resumed._wallet.getWalletCost() == cost
+
+def test_average_cost_prices(trades_file, tmpdir, mocker):
+    """
+    Assert the held assets are valued from the price store, in a single prefetch
+    """
+    store_file = str(tmpdir.join("prices.sqlite"))
+    store = price_store(store_file)
+    time = pd.Timestamp("2018-01-05 09:00:00")
+    for asset, price in (("XXBT", "2500"), ("XETH", "90")):
+        store.add_price(asset, time - pd.Timedelta(days=200), price)
+        store.add_price(asset, time, price)
+        store.add_coverage(asset, (time - pd.Timedelta(days=200)).value, (time + pd.Timedelta(days=1)).value)
+    store.close()
+    prefetch = mocker.spy(prices, "prefetch")
+    api = mocker.patch.object(prices, "getPriceAPI")
+
+    strategy = average_cost(trades_file, prices_file=store_file)
+    strategy.process_all_trades()
+
+    cost = D("2020")
+    share = D("1000") / (D("1") * D("2000") + D("10") * D("90"))
+    cost -= share * cost
+    share = D("3000") / (D("15") * D("200") + D("0.249") * D("2500"))
+    assert strategy.gains_summary()[2018] == D("2994") - share * cost
+    prefetch.assert_called_once()
+    assert set(prefetch.call_args.kwargs["needed"]) == {"XETH", "XXBT"}
+    api.assert_not_called()
+
+@pytest.mark.parametrize("chunksize", [None, 2])
+def test_average_cost_stale_price(trades_file, chunksize):
+    """
+    Assert a held asset valued at a fiat trade older than max_price_age stops the run
+    """
+    with pytest.raises(ValueError, match="XXBT"):
+        average_cost(trades_file, chunksize=chunksize).process_all_trades()
+    with pytest.raises(ValueError):
+        average_cost(trades_file, chunksize=chunksize, max_price_age="90D").process_all_trades()
+
+    strategy = average_cost(trades_file, chunksize=chunksize, max_price_age=pd.Timedelta(days=130))
+    strategy.process_all_trades()
+    assert strategy.gains_summary() == expected_gains()[0]
+
+def test_average_cost_missing_price(tmpdir):
+    """
+    Assert a held asset without any price stops the run
+    """
+    file = tmpdir.join("trades.csv")
+    file.write(HEADER + ROWS[0] + ROWS[3] + ROWS[2])
+    with pytest.raises(ValueError):
+        average_cost(str(file)).process_all_trades()
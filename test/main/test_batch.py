@@ -0,0 +1,124 @@
+import json
+import os
+import pytest
+import shutil
+
+from cryptopnl.main import batch
+from cryptopnl.main.fifo_with_ledger import fifo_with_ledger
+from cryptopnl.main.fifo_with_trades import fifo_with_trades
+
+@pytest.fixture
+def test_files(request):
+    filename = request.module.__file__
+    file_dir, _ = os.path.split(filename)
+    test_dir, _ = os.path.split(file_dir)
+
+    trades_file = os.path.join(test_dir, "_test_files", "test_trades.csv")
+    ledger_file = os.path.join(test_dir, "_test_files", "test_ledger.csv")
+    if not (os.path.exists(trades_file) and os.path.exists(ledger_file)):
+        raise FileNotFoundError("Test files not found")
+    return trades_file, ledger_file
+
+@pytest.fixture
+def manifest(test_files, tmpdir):
+    trades_file, ledger_file = test_files
+    manifest_file = tmpdir.join("manifest.csv")
+    manifest_file.write("\n".join([
+        "account,trades_file,ledger_file",
+        f"with_ledger,{trades_file},{ledger_file}",
+        f"trades_only,{trades_file},",
+        "missing,missing_trades.csv,",
+        ]))
+    return str(manifest_file)
+
+def test_accounts_from_manifest(manifest, test_files, tmpdir):
+    """
+    Assert the accounts of a manifest are listed in order (relative paths to the manifest)
+    """
+    trades_file, ledger_file = test_files
+    accounts = batch.load_accounts(manifest)
+
+    assert [a.account for a in accounts] == ["with_ledger", "trades_only", "missing"]
+    assert accounts[0] == batch.account("with_ledger", trades_file, ledger_file)
+    assert accounts[1].ledger_file is None
+    assert accounts[2].trades_file == str(tmpdir.join("missing_trades.csv"))
+
+def test_accounts_from_directory(test_files, tmpdir):
+    """
+    Assert the sub directories with a trades export are accounts
+    """
+    trades_file, ledger_file = test_files
+    for name in ["a", "b", "empty"]: tmpdir.mkdir(name)
+    shutil.copy(trades_file, tmpdir.join("a", "trades.csv"))
+    shutil.copy(ledger_file, tmpdir.join("a", "ledgers.csv"))
+    shutil.copy(trades_file, tmpdir.join("b", "trades_2021.csv"))
+
+    accounts = batch.load_accounts(str(tmpdir))
+    assert accounts == [
+        batch.account("a", str(tmpdir.join("a", "trades.csv")), str(tmpdir.join("a", "ledgers.csv"))),
+        batch.account("b", str(tmpdir.join("b", "trades_2021.csv")), None),
+        ]
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_batch(manifest, test_files, workers):
+    """
+    Assert every account gets the result of a single run, in order
+    Assert a failing account is reported without stopping the others
+    """
+    trades_file, ledger_file = test_files
+    results = batch.run_batch(batch.load_accounts(manifest), workers=workers)
+
+    expected_ledger = fifo_with_ledger(trades_file=trades_file, ledger_file=ledger_file)
+    expected_ledger.process_all_trades()
+    expected_trades = fifo_with_trades(trades_file=trades_file)
+    expected_trades.process_all_trades()
+
+    assert [r.account for r in results] == ["with_ledger", "trades_only", "missing"]
+    assert results[0].summary == expected_ledger.gains_summary() and results[0].error is None
+    assert results[1].summary == expected_trades.gains_summary() and results[1].error is None
+    assert results[2].summary is None and results[2].error.startswith("FileNotFoundError")
+
+def test_run_batch_cache_dir(test_files, tmpdir):
+    """
+    Assert workers sharing a cache directory all get the result of a single run
+    """
+    trades_file, ledger_file = test_files
+    accounts = []
+    for i in range(6):
+        directory = tmpdir.mkdir(f"account_{i}")
+        shutil.copy(trades_file, directory.join("trades.csv"))
+        shutil.copy(ledger_file, directory.join("ledgers.csv"))
+        accounts += [batch.account(f"{i}_{j}", str(directory.join("trades.csv")), str(directory.join("ledgers.csv")))
+                     for j in range(10)]
+    results = batch.run_batch(accounts, workers=8, cache_dir=str(tmpdir.join("cache")))
+
+    expected = fifo_with_ledger(trades_file=trades_file, ledger_file=ledger_file)
+    expected.process_all_trades()
+    assert [r.error for r in results] == [None] * len(accounts)
+    assert all(r.summary == expected.gains_summary() for r in results)
+
+def test_run_batch_strategy(manifest):
+    """
+    Assert the strategy is validated and a ledger strategy needs a ledger
+    """
+    accounts = batch.load_accounts(manifest)
+    with pytest.raises(ValueError):
+        batch.run_batch(accounts, strategy="not_a_strategy")
+
+    results = batch.run_batch(accounts[:2], strategy="fifo_with_ledger", workers=1)
+    assert results[0].error is None
+    assert results[1].error == "ValueError: fifo_with_ledger needs a ledger file"
+
+def test_write_report(manifest, tmpdir):
+    """
+    Assert the report holds the summary or the error of every account
+    """
+    results = batch.run_batch(batch.load_accounts(manifest), workers=1)
+    report_file = str(tmpdir.join("report.json"))
+    batch.write_report(results, report_file)
+
+    with open(report_file, "r") as fp:
+        report = json.load(fp)
+    assert [r["account"] for r in report] == ["with_ledger", "trades_only", "missing"]
+    assert report[0]["summary"] == {str(y): str(p) for (y, p) in results[0].summary.items()}
+    assert report[2]["summary"] is None and report[2]["error"]
@@ -0,0 +1,100 @@
+from decimal import Decimal as D
+import pandas as pd
+import pytest
+from cryptopnl.api.price_store import price_store
+from cryptopnl.api.to_include_in_exchangeAPI_prices import prices
+from cryptopnl.main.cump import cumpCalculator, doCumpCalculation
+
+TRADES = ('"txid","ordertxid","pair","time","type","ordertype","price","cost","fee","vol","margin","misc","ledgers"\n'
+          '"t1","o","XXBTZEUR","2018-01-01 10:00:00","buy","limit",1000.00,1000.00,10.00,1.00000000,0.0,"","l1b,l1a"\n'
+          '"t2","o","XETHZEUR","2018-01-02 10:00:00","buy","limit",100.00,1000.00,10.00,10.00000000,0.0,"","l2b,l2a"\n'
+          '"t3","o","XXBTZEUR","2018-01-03 10:00:00","sell","limit",2000.00,1000.00,5.00,0.50000000,0.0,"","l3b,l3a"\n'
+          '"t4","o","XETHZEUR","2018-01-04 10:00:00","sell","limit",200.00,1000.00,6.00,5.00000000,0.0,"","l4b,l4a"\n')
+LEDGER = ('"txid","refid","time","type","subtype","aclass","asset","amount","fee","balance"\n'
+          '"l0","l0","2018-01-01 09:00:00","deposit","","currency","ZEUR",5000.0000,0.0000,5000.0000\n'
+          '"l1a","t1","2018-01-01 10:00:00","trade","","currency","XXBT",1.0000000000,0.0000000000,1.0000000000\n'
+          '"l1b","t1","2018-01-01 10:00:00","trade","","currency","ZEUR",-1000.0000,10.0000,3990.0000\n'
+          '"l2a","t2","2018-01-02 10:00:00","trade","","currency","XETH",10.0000000000,0.0000000000,10.0000000000\n'
+          '"l2b","t2","2018-01-02 10:00:00","trade","","currency","ZEUR",-1000.0000,10.0000,2980.0000\n'
+          '"l3a","t3","2018-01-03 10:00:00","trade","","currency","XXBT",-0.5000000000,0.0000000000,0.5000000000\n'
+          '"l3b","t3","2018-01-03 10:00:00","trade","","currency","ZEUR",1000.0000,5.0000,3975.0000\n'
+          '"l4a","t4","2018-01-04 10:00:00","trade","","currency","XETH",-5.0000000000,0.0000000000,5.0000000000\n'
+          '"l4b","t4","2018-01-04 10:00:00","trade","","currency","ZEUR",1000.0000,6.0000,4969.0000\n')
+
+@pytest.fixture
+def files(tmpdir):
+    trades_file, ledger_file, prices_file = tmpdir.join("trades.csv"), tmpdir.join("ledger.csv"), tmpdir.join("prices.sqlite")
+    trades_file.write(TRADES)
+    ledger_file.write(LEDGER)
+    store = price_store(str(prices_file))
+    store.add_price("XETH", pd.Timestamp("2018-01-03 10:00:00"), "90")
+    store.add_price("XXBT", pd.Timestamp("2018-01-04 10:00:00"), "2500")
+    store.close()
+    return str(ledger_file), str(trades_file), str(prices_file)
+
+def test_cump_one_valuation_per_sale(files, mocker):
+    """
+    Assert the wallet is valued once per sale (one price per held asset), from the price store
+    """
+    api = mocker.patch("cryptopnl.api.krakenAPI.krakenAPI.getHistoryTrades")
+    valuations = mocker.spy(cumpCalculator, "walletValue")
+    lookups = mocker.spy(prices, "getPrice")
+
+    plc = cumpCalculator(*files)
+    plc.processAll()
+
+    assert valuations.call_count == 2
+    assert lookups.call_count == 4
+    api.assert_not_called()
+
+    cost = D("2020")
+    chi = round(D("1000") / (D("1") * D("2000") + D("10") * D("90")), 5)
+    first = D("995") - chi * cost
+    cost = (1 - chi) * cost
+    chi = round(D("1000") / (D("0.5") * D("2500") + D("10") * D("200")), 5)
+    second = D("994") - chi * cost
+    assert plc.totalGains["2018"] == [first, second]
+    assert plc.snapshot() == (pd.Timestamp("2018-01-04 10:00:00"), D("0.5") * D("2500") + D("5") * D("200"), (1 - chi) * cost)
+
+def test_cump_verbose(files, mocker, tmpdir):
+    """
+    Assert the verbose mode values the wallet after every trade and the run checks the ledger balances
+    """
+    store = price_store(files[2])
+    for asset, time, price in (("XXBT", "2018-01-01 10:00:00", "1000"), ("XXBT", "2018-01-02 10:00:00", "1000"), 
+                               ("XETH", "2018-01-02 10:00:00", "100")):
+        store.add_price(asset, pd.Timestamp(time), price)
+    store.close()
+    api = mocker.patch("cryptopnl.api.krakenAPI.krakenAPI.getHistoryTrades")
+    valuations = mocker.spy(cumpCalculator, "walletValue")
+
+    with tmpdir.as_cwd():
+        doCumpCalculation(*files, verbose=True)
+    assert valuations.call_count == 4 + 2 # after every trade and at the sales
+    assert tmpdir.join("logging.txt").exists()
+    api.assert_not_called()
+
+def test_cump_prefetch(files, mocker):
+    """
+    Assert the prices of a crypto to crypto trade are prefetched in bulk when the calculator is built
+    """
+    ledger_file, trades_file, prices_file = files
+    with open(trades_file, "a") as f:
+        f.write('"t5","o","XETHXXBT","2018-01-05 10:00:00","buy","limit",0.050000,0.1000,0.0010,2.00000000,0.0,"","l5b,l5a"\n')
+    with open(ledger_file, "a") as f:
+        f.write('"l5a","t5","2018-01-05 10:00:00","trade","","currency","XETH",2.0000000000,0.0000000000,7.0000000000\n'
+                '"l5b","t5","2018-01-05 10:00:00","trade","","currency","XXBT",-0.1000000000,0.0010000000,0.3990000000\n')
+    time = pd.Timestamp("2018-01-05 10:00:00").value / 1e9
+    history = {"XETHZEUR": [["210.0", "1.0", time - 60]], "XXBTZEUR": [["4200.0", "0.1", time - 30]]}
+    pages = mocker.patch("cryptopnl.api.krakenAPI.krakenAPI.iterHistoryTrades", side_effect=lambda pair, since, until: iter([history[pair]]))
+    api = mocker.patch("cryptopnl.api.krakenAPI.krakenAPI.getHistoryTrades")
+    prefetch = mocker.spy(prices, "prefetch")
+
+    plc = cumpCalculator(*files)
+    prefetch.assert_called_once()
+    assert sorted(call.args[0] for call in pages.call_args_list) == ["XETHZEUR", "XXBTZEUR"]
+    plc.processAll()
+
+    api.assert_not_called()
+    assert plc.wallet.amounts["XETH"] == D("7")
+    assert plc.wallet.get_chunks("XETH")[-1]["price"] == D("210.0")
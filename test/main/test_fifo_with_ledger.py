@@ -1,11 +1,13 @@
 from decimal import Decimal as D
 from datetime import datetime as dt
 import os
+import pandas as pd
 import pytest
 import re
 from collections import defaultdict
 from cryptopnl.main.fifo_with_ledger import fifo_with_ledger
 from cryptopnl.main.trades import Trades
+from cryptopnl.wallet.numeric import fixed_point_backend
 from cryptopnl.wallet.wallet import wallet
 
 @pytest.fixture
@@ -56,8 +58,8 @@ def test_get_ledgers_from_trade(fifo_with_ledger_fixture):
     l_outing_expected = fifo_with_ledger_fixture._trades._ledger.iloc[3]
 
     l_ining, l_outing = fifo_with_ledger_fixture.get_ledgers_from_trade(trade)
-    assert str(l_ining) == str(l_ining_expected)
-    assert str(l_outing) == str(l_outing_expected)
+    assert pd.Series(l_ining._asdict()).equals(l_ining_expected)
+    assert pd.Series(l_outing._asdict()).equals(l_outing_expected)
 
     # Second trade
     trade = fifo_with_ledger_fixture._trades._trades.iloc[2]
@@ -65,8 +67,8 @@ def test_get_ledgers_from_trade(fifo_with_ledger_fixture):
     l_outing_expected = fifo_with_ledger_fixture._trades._ledger.iloc[6]
 
     l_ining, l_outing = fifo_with_ledger_fixture.get_ledgers_from_trade(trade)
-    assert str(l_ining) == str(l_ining_expected)
-    assert str(l_outing) == str(l_outing_expected)
+    assert pd.Series(l_ining._asdict()).equals(l_ining_expected)
+    assert pd.Series(l_outing._asdict()).equals(l_outing_expected)
 
 def test_fiat2crypto(fifo_with_ledger_fixture):
     """
@@ -83,8 +85,8 @@ def test_fiat2crypto(fifo_with_ledger_fixture):
     fifo_with_ledger_fixture.fiat2crypto(crypto = crypto, fiat = fiat)
 
     assert wallet._walletCost == initial_cost - fiat.amount + fiat.fee
-    assert wallet.wallet[crypto_name][0][wallet.VOL] == crypto.amount 
-    assert wallet.wallet[crypto_name][0][wallet.PRICE] == - fiat.amount / crypto.amount 
+    assert wallet.get_chunks(crypto_name)[0][wallet.VOL] == crypto.amount 
+    assert wallet.get_chunks(crypto_name)[0][wallet.PRICE] == - fiat.amount / crypto.amount 
      
 @pytest.mark.parametrize("initial_price, expected_is_profit", [(D(10), True), (D(60000), False)])
 def test_crypto2fiat(initial_price, expected_is_profit, fifo_with_ledger_fixture):
@@ -107,8 +109,8 @@ def test_crypto2fiat(initial_price, expected_is_profit, fifo_with_ledger_fixture
 
     assert is_profit == expected_is_profit 
     assert fifo_with_ledger_fixture.fifo_gains[crypto.time.year][0][1] == profit
-    assert wallet.wallet[crypto.asset][0][wallet.VOL] == initial_amount - (- crypto.amount)
-    assert wallet.wallet[crypto.asset][0][wallet.PRICE] == initial_price 
+    assert wallet.get_chunks(crypto.asset)[0][wallet.VOL] == initial_amount - (- crypto.amount)
+    assert wallet.get_chunks(crypto.asset)[0][wallet.PRICE] == initial_price 
 
 @pytest.mark.parametrize("index_in, index_out", [(4, 5), (9, 8)])
 def test_crypto2crypto(index_in, index_out, fifo_with_ledger_fixture):
@@ -131,10 +133,10 @@ def test_crypto2crypto(index_in, index_out, fifo_with_ledger_fixture):
 
     fifo_with_ledger_fixture.crypto2crypto(crypto_in, crypto_out)
     
-    assert wallet.wallet[sold_crypto][0][wallet.VOL] == initial_amount - abs(crypto_out.amount) - crypto_out.fee
-    assert wallet.wallet[sold_crypto][0][wallet.PRICE] == initial_price 
-    assert wallet.wallet[bought_crypto][0][wallet.VOL] == crypto_in.amount - crypto_in.fee
-    assert wallet.wallet[bought_crypto][0][wallet.PRICE] == ( abs(crypto_out.amount) + crypto_out.fee ) / (crypto_in.amount - crypto_in.fee) * initial_price
+    assert wallet.get_chunks(sold_crypto)[0][wallet.VOL] == initial_amount - abs(crypto_out.amount) - crypto_out.fee
+    assert wallet.get_chunks(sold_crypto)[0][wallet.PRICE] == initial_price 
+    assert wallet.get_chunks(bought_crypto)[0][wallet.VOL] == crypto_in.amount - crypto_in.fee
+    assert wallet.get_chunks(bought_crypto)[0][wallet.PRICE] == ( abs(crypto_out.amount) + crypto_out.fee ) / (crypto_in.amount - crypto_in.fee) * initial_price
 
 def test_fifo_with_ledger_process_trade(fifo_with_ledger_fixture, mocker):
     """
@@ -167,4 +169,91 @@ def test_fifo_with_ledger_process_trade(fifo_with_ledger_fixture, mocker):
     crypto_in = fifo_with_ledger_fixture._trades._ledger.iloc[9]
     crypto_out = fifo_with_ledger_fixture._trades._ledger.iloc[8]
     fifo_with_ledger_fixture.process_trade(t3)
-    mock_c2c.assert_called_once_with(crypto_in, crypto_out)
\ No newline at end of file
+    mock_c2c.assert_called_once_with(crypto_in, crypto_out)
+
+def test_fifo_with_ledger_process_trade_crypto2crypto(fifo_with_ledger_fixture):
+    """
+    Asserts a crypto to crypto trade moves both ledger entries instead of crashing
+    """
+
+    wallet = fifo_with_ledger_fixture._wallet
+    t1 = fifo_with_ledger_fixture._trades._trades.iloc[1]
+    crypto_in = fifo_with_ledger_fixture._trades._ledger.iloc[4]
+    crypto_out = fifo_with_ledger_fixture._trades._ledger.iloc[5]
+    wallet.add(crypto_out.asset, -2*crypto_out.amount, D(10))
+
+    fifo_with_ledger_fixture.process_trade(t1)
+
+    assert wallet.get_chunks(crypto_in.asset)[0][wallet.VOL] == crypto_in.amount - crypto_in.fee
+    assert wallet.get_chunks(crypto_out.asset)[0][wallet.VOL] == -crypto_out.amount - crypto_out.fee
+
+def test_fifo_with_ledger_fixed_point_backend(fifo_with_ledger_fixture):
+    """
+    Asserts the integer wallet backend reports the same gains as the Decimal one
+    """
+
+    test_dir = os.path.dirname(os.path.dirname(__file__))
+    fixed = fifo_with_ledger(trades_file=os.path.join(test_dir, "_test_files", "test_trades.csv"), 
+                             ledger_file=os.path.join(test_dir, "_test_files", "test_ledger.csv"), 
+                             backend=fixed_point_backend())
+
+    fifo_with_ledger_fixture.process_all_trades()
+    fixed.process_all_trades()
+
+    assert fixed.pnl_summary() == fifo_with_ledger_fixture.pnl_summary()
+    assert fixed.fifo_gains == fifo_with_ledger_fixture.fifo_gains
+    assert fixed._wallet.amounts == fifo_with_ledger_fixture._wallet.amounts
+
+def test_fifo_with_ledger_streaming(fifo_with_ledger_fixture):
+    """
+    Asserts streaming the files gives the same gains and wallet as loading them
+    """
+
+    test_dir = os.path.dirname(os.path.dirname(__file__))
+    streamed = fifo_with_ledger(trades_file=os.path.join(test_dir, "_test_files", "test_trades.csv"), 
+                                ledger_file=os.path.join(test_dir, "_test_files", "test_ledger.csv"), 
+                                chunksize=2)
+
+    fifo_with_ledger_fixture.process_all_trades()
+    streamed.process_all_trades()
+
+    assert streamed.fifo_gains == fifo_with_ledger_fixture.fifo_gains
+    assert streamed._wallet.amounts == fifo_with_ledger_fixture._wallet.amounts
+    assert streamed._wallet._walletCost == fifo_with_ledger_fixture._wallet._walletCost
+
+@pytest.mark.parametrize("chunksize", [None, 2])
+def test_fifo_with_ledger_checkpoint(chunksize, fifo_with_ledger_fixture, tmpdir):
+    """
+    Asserts a run resumed from a checkpoint on appended files matches a full run
+    """
+
+    test_dir = os.path.dirname(os.path.dirname(__file__))
+    trades_file = os.path.join(test_dir, "_test_files", "test_trades.csv")
+    ledger_file = os.path.join(test_dir, "_test_files", "test_ledger.csv")
+    with open(trades_file) as fp:
+        lines = fp.readlines()
+    partial_trades = tmpdir.join("trades.csv")
+    partial_trades.write("".join(lines[:3]))
+    checkpoint = str(tmpdir.join("checkpoint.json"))
+
+    first = fifo_with_ledger(trades_file=str(partial_trades), ledger_file=ledger_file, chunksize=chunksize)
+    first.process_all_trades()
+    first.save_checkpoint(checkpoint)
+
+    partial_trades.write("".join(lines[3:]), mode="a")
+    resumed = fifo_with_ledger(trades_file=str(partial_trades), ledger_file=ledger_file, chunksize=chunksize)
+    resumed.load_checkpoint(checkpoint)
+    assert resumed._trades.first_row() == 1 # read from the last processed trade
+    assert resumed._trades._offsets[0] == len("".join(lines[:2]).encode())
+    processed = []
+    process_trade = resumed.process_trade
+    resumed.process_trade = lambda trade: processed.append(trade.txid) or process_trade(trade)
+    resumed.process_all_trades()
+
+    fifo_with_ledger_fixture.process_all_trades()
+    assert processed == ["c", "d"]
+    assert resumed.fifo_gains == fifo_with_ledger_fixture.fifo_gains
+    assert resumed._wallet.amounts == fifo_with_ledger_fixture._wallet.amounts
+    assert resumed._wallet._walletCost == fifo_with_ledger_fixture._wallet._walletCost
+    for crypto in fifo_with_ledger_fixture._wallet.wallet:
+        assert resumed._wallet.get_chunks(crypto) == fifo_with_ledger_fixture._wallet.get_chunks(crypto)
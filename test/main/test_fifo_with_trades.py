@@ -4,8 +4,10 @@ import os
 import pytest
 import re
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from cryptopnl.main.fifo_with_trades import fifo_with_trades 
 from cryptopnl.main.trades import Trades
+from cryptopnl.wallet.numeric import fixed_point_backend
 from cryptopnl.wallet.wallet import wallet
 
 @pytest.fixture
@@ -54,8 +56,8 @@ def test_fiat2crypto(fifo_with_trades_fixture):
     fifo_with_trades_fixture.fiat2crypto(trade)
 
     assert wallet._walletCost == initial_cost + trade.cost + trade.fee
-    assert wallet.wallet[trade.pair[:-4]][0][wallet.VOL] == trade.vol
-    assert wallet.wallet[trade.pair[:-4]][0][wallet.PRICE] == trade.price
+    assert wallet.get_chunks(trade.pair[:-4])[0][wallet.VOL] == trade.vol
+    assert wallet.get_chunks(trade.pair[:-4])[0][wallet.PRICE] == trade.price
 
 @pytest.mark.parametrize("initial_price, expected_is_profit", [(D(10), True), (D(60000), False)])
 def test_crypto2fiat(initial_price, expected_is_profit, fifo_with_trades_fixture):
@@ -77,8 +79,8 @@ def test_crypto2fiat(initial_price, expected_is_profit, fifo_with_trades_fixture
 
     assert is_profit == expected_is_profit 
     assert fifo_with_trades_fixture.fifo_gains[trade.time.year][0][1] == profit
-    assert wallet.wallet[trade.pair[:-4]][0][wallet.VOL] == initial_amount - trade.vol
-    assert wallet.wallet[trade.pair[:-4]][0][wallet.PRICE] == initial_price 
+    assert wallet.get_chunks(trade.pair[:-4])[0][wallet.VOL] == initial_amount - trade.vol
+    assert wallet.get_chunks(trade.pair[:-4])[0][wallet.PRICE] == initial_price 
 
 def test_crypto2crypto_buy(fifo_with_trades_fixture):
     """
@@ -99,10 +101,10 @@ def test_crypto2crypto_buy(fifo_with_trades_fixture):
 
     fifo_with_trades_fixture.crypto2crypto(trade)
     
-    assert wallet.wallet[sold_crypto][0][wallet.VOL] == initial_amount - trade.vol*trade.price - trade.fee
-    assert wallet.wallet[sold_crypto][0][wallet.PRICE] == initial_price 
-    assert wallet.wallet[bought_crypto][0][wallet.VOL] == trade.vol 
-    assert wallet.wallet[bought_crypto][0][wallet.PRICE] == initial_price * trade.price + trade.fee / trade.vol * initial_price
+    assert wallet.get_chunks(sold_crypto)[0][wallet.VOL] == initial_amount - trade.vol*trade.price - trade.fee
+    assert wallet.get_chunks(sold_crypto)[0][wallet.PRICE] == initial_price 
+    assert wallet.get_chunks(bought_crypto)[0][wallet.VOL] == trade.vol 
+    assert wallet.get_chunks(bought_crypto)[0][wallet.PRICE] == initial_price * trade.price + trade.fee / trade.vol * initial_price
 
 def test_crypto2crypto_sell(fifo_with_trades_fixture):
     """
@@ -124,10 +126,10 @@ def test_crypto2crypto_sell(fifo_with_trades_fixture):
 
     fifo_with_trades_fixture.crypto2crypto(trade)
     
-    assert wallet.wallet[sold_crypto][0][wallet.VOL] == initial_amount - trade.vol
-    assert wallet.wallet[sold_crypto][0][wallet.PRICE] == initial_price 
-    assert wallet.wallet[bought_crypto][0][wallet.VOL] == trade.vol * trade.price - trade.fee
-    assert wallet.wallet[bought_crypto][0][wallet.PRICE] == initial_price * trade.vol / (trade.cost - trade.fee) 
+    assert wallet.get_chunks(sold_crypto)[0][wallet.VOL] == initial_amount - trade.vol
+    assert wallet.get_chunks(sold_crypto)[0][wallet.PRICE] == initial_price 
+    assert wallet.get_chunks(bought_crypto)[0][wallet.VOL] == trade.vol * trade.price - trade.fee
+    assert wallet.get_chunks(bought_crypto)[0][wallet.PRICE] == initial_price * trade.vol / (trade.cost - trade.fee) 
 
 def test_fifo_with_trades_process_trade(fifo_with_trades_fixture, mocker):
     """
@@ -150,3 +152,136 @@ def test_fifo_with_trades_process_trade(fifo_with_trades_fixture, mocker):
     t2 = fifo_with_trades_fixture._trades._trades.iloc[2]
     fifo_with_trades_fixture.process_trade(t2)
     mock_c2f.assert_called_once_with(t2)
+
+def test_fifo_with_trades_fixed_point(fifo_with_trades_fixture):
+    """
+    Asserts the fixed point load gives the same gains and wallet as the default one
+    """
+
+    trades_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "_test_files", "test_trades.csv")
+    fixed = fifo_with_trades(trades_file=trades_file, fixed_point=True)
+
+    fifo_with_trades_fixture.process_all_trades()
+    fixed.process_all_trades()
+
+    assert fixed.fifo_gains == fifo_with_trades_fixture.fifo_gains
+    assert fixed._wallet.getWalletCost() == fifo_with_trades_fixture._wallet.getWalletCost()
+    for crypto in fifo_with_trades_fixture._wallet.wallet:
+        assert fixed._wallet.get_chunks(crypto) == fifo_with_trades_fixture._wallet.get_chunks(crypto)
+
+def test_fifo_with_trades_fixed_point_backend(fifo_with_trades_fixture):
+    """
+    Asserts the integer wallet backend reports the same gains as the Decimal one
+    """
+
+    trades_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "_test_files", "test_trades.csv")
+    fixed = fifo_with_trades(trades_file=trades_file, backend=fixed_point_backend())
+
+    fifo_with_trades_fixture.process_all_trades()
+    fixed.process_all_trades()
+
+    assert fixed.pnl_summary() == fifo_with_trades_fixture.pnl_summary()
+    assert fixed.fifo_gains == fifo_with_trades_fixture.fifo_gains
+
+def test_fifo_with_trades_checkpoint_mismatch(fifo_with_trades_fixture, tmpdir):
+    """
+    Asserts resuming on a trades file which does not extend the checkpointed one fails
+    """
+
+    checkpoint = str(tmpdir.join("checkpoint.json"))
+    fifo_with_trades_fixture.process_all_trades()
+    fifo_with_trades_fixture.save_checkpoint(checkpoint)
+
+    test_dir = os.path.dirname(os.path.dirname(__file__))
+    with open(os.path.join(test_dir, "_test_files", "test_trades.csv")) as fp:
+        lines = fp.readlines()
+    other_trades = tmpdir.join("trades.csv")
+    other_trades.write("".join(lines[:2] + lines[3:]))
+
+    resumed = fifo_with_trades(trades_file=str(other_trades))
+    resumed.load_checkpoint(checkpoint)
+    with pytest.raises(ValueError):
+        resumed.process_all_trades()
+
+@pytest.mark.parametrize("fixed_point", [False, True])
+def test_fifo_with_trades_parallel_assets(tmpdir, fixed_point, mocker):
+    """
+    Asserts a fiat only history processed asset by asset in worker processes
+    gives exactly the serial result
+    """
+    mocker.patch("cryptopnl.main.fifo_with_trades.os.cpu_count", return_value=4)
+
+    header = '"txid","ordertxid","pair","time","type","ordertype","price","cost","fee","vol","margin","misc","ledgers"\n'
+    rows = [
+        ("a", "XXBTZEUR", "buy", "5000.0", "2000.00", "0.10", "0.4"),
+        ("b", "XETHZEUR", "buy", "300.0", "600.00", "1.20", "2.0"),
+        ("c", "XXBTZEUR", "buy", "6000.0", "600.00", "0.30", "0.1"),
+        ("d", "XETHZEUR", "sell", "350.0", "175.00", "0.70", "0.5"),
+        ("e", "XXBTZEUR", "sell", "7000.0", "2450.00", "1.40", "0.35"),
+        ("f", "XLTCZEUR", "buy", "50.0", "150.00", "0.03", "3.0"),
+        ("g", "XXBTZEUR", "sell", "6500.0", "650.00", "0.13", "0.1"),
+        ("h", "XETHZEUR", "sell", "320.0", "320.00", "0.33", "1.0"),
+        ]
+    trades_file = tmpdir.join("trades.csv")
+    trades_file.write(header + "".join(
+        f'"{t}","{t}","{pair}","20{17 + i // 3}-09-01 18:00:00.0000","{kind}","limit",{price},{cost},{fee},{vol},0.0,"",""\n'
+        for i, (t, pair, kind, price, cost, fee, vol) in enumerate(rows)))
+
+    serial = fifo_with_trades(trades_file=str(trades_file), fixed_point=fixed_point)
+    serial.process_all_trades()
+    parallel = fifo_with_trades(trades_file=str(trades_file), fixed_point=fixed_point, workers=2)
+    assert list(parallel._asset_partitions()) == ["XXBT", "XETH", "XLTC"]
+    pool = mocker.patch("cryptopnl.main.fifo_with_trades.ProcessPoolExecutor", wraps=ProcessPoolExecutor)
+    parallel.process_all_trades()
+    pool.assert_called_once_with(max_workers=2)
+
+    assert list(parallel.fifo_gains.items()) == list(serial.fifo_gains.items())
+    assert parallel._wallet.get_state() == serial._wallet.get_state()
+    assert (parallel._processed, parallel._last_trade) == (serial._processed, serial._last_trade)
+    assert parallel.gains == serial.gains
+
+def test_fifo_with_trades_frame(fifo_with_trades_fixture):
+    """
+    Asserts a strategy built from an already read trades frame gives the file result
+    """
+
+    trades = fifo_with_trades_fixture._trades.get_trades()
+    strategy = fifo_with_trades(trades_file=trades, chunksize=2)
+    strategy.process_all_trades()
+    fifo_with_trades_fixture.process_all_trades()
+
+    assert strategy.gains == fifo_with_trades_fixture.gains
+    assert strategy._wallet.get_state() == fifo_with_trades_fixture._wallet.get_state()
+    assert strategy._trades.offsets(1, trades[Trades.TIME_COL].iloc[1]) is None # nothing to resume from
+
+def test_fifo_with_trades_parallel_single_cpu(tmpdir, mocker):
+    """
+    Asserts the assets are processed serially on a single cpu (no speedup from the workers)
+    """
+    mocker.patch("cryptopnl.main.fifo_with_trades.os.cpu_count", return_value=1)
+    pool = mocker.patch("cryptopnl.main.fifo_with_trades.ProcessPoolExecutor")
+    trades_file = tmpdir.join("trades.csv")
+    trades_file.write('"txid","ordertxid","pair","time","type","ordertype","price","cost","fee","vol","margin","misc","ledgers"\n'
+                      '"a","a","XXBTZEUR","2017-09-01 18:00:00.0000","buy","limit",5000.0,2000.00,0.10,0.4,0.0,"",""\n'
+                      '"b","b","XETHZEUR","2017-09-02 18:00:00.0000","buy","limit",300.0,600.00,1.20,2.0,0.0,"",""\n')
+
+    strategy = fifo_with_trades(trades_file=str(trades_file), workers=4)
+    strategy.process_all_trades()
+    pool.assert_not_called()
+    assert strategy._processed == 2
+
+def test_fifo_with_trades_parallel_fallback(fifo_with_trades_fixture, mocker):
+    """
+    Asserts a history with crypto to crypto trades is processed serially
+    """
+
+    trades_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "_test_files", "test_trades.csv")
+    parallel = fifo_with_trades(trades_file=trades_file, workers=2)
+    pool = mocker.patch("cryptopnl.main.fifo_with_trades.ProcessPoolExecutor")
+
+    assert parallel._asset_partitions() is None
+    parallel.process_all_trades()
+    fifo_with_trades_fixture.process_all_trades()
+
+    pool.assert_not_called()
+    assert parallel.fifo_gains == fifo_with_trades_fixture.fifo_gains
@@ -0,0 +1,160 @@
+from decimal import Decimal as D
+import json
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from cryptopnl.__main__ import main
+from cryptopnl.main.fifo_with_ledger import fifo_with_ledger
+from cryptopnl.main.fifo_with_trades import fifo_with_trades
+from cryptopnl.main.gains import gains_table
+
+@pytest.fixture
+def files(request):
+    test_dir = os.path.dirname(os.path.dirname(request.module.__file__))
+    return (os.path.join(test_dir, "_test_files", "test_trades.csv"),
+            os.path.join(test_dir, "_test_files", "test_ledger.csv"))
+
+@pytest.fixture
+def table():
+    table = gains_table(capacity=2)
+    table.append(pd.Timestamp("2020-01-10"), "XXBT", D("100"), D("60"), lot="a")
+    table.append(pd.Timestamp("2020-02-10"), "XETH", D("50"), D("70"), lot="b")
+    table.extend(np.array(["2021-02-01", "2021-02-03"], dtype="datetime64[ns]"), ["XXBT", "XETH"],
+                 [D("10"), D("20.5")], [D("1"), D("2")])
+    return table
+
+def test_gains_table(table):
+    """
+    Assert the rows are appended past the preallocated capacity and grouped by year, month and asset
+    """
+    assert len(table) == 4
+    assert list(table.column(gains_table.GAIN)) == [D("40"), D("-20"), D("9"), D("18.5")]
+    assert list(table.column(gains_table.LOT)) == ["a", "b", None, None]
+    assert table.summary("year") == {2020: D("20"), 2021: D("27.5")}
+    assert table.summary("month") == {"2020-01": D("40"), "2020-02": D("-20"), "2021-02": D("27.5")}
+    assert table.summary("asset") == {"XXBT": D("49"), "XETH": D("-1.5")}
+    assert table.summary("asset", gains_table.PROCEEDS) == {"XXBT": D("110"), "XETH": D("70.5")}
+    assert dict(table.by_year()) == {2020: [(pd.Timestamp("2020-01-10"), D("40")), (pd.Timestamp("2020-02-10"), D("-20"))],
+                                     2021: [(pd.Timestamp("2021-02-01"), D("9")), (pd.Timestamp("2021-02-03"), D("18.5"))]}
+    with pytest.raises(ValueError):
+        table.summary("week")
+
+def test_gains_table_exports(table, tmpdir):
+    """
+    Assert the table round trips through its state (json), the binary file and the csv
+    Assert a missing asset or lot (None) stays distinct from an empty one
+    """
+    table.append(pd.Timestamp("2021-03-01"), None, D("5"), D("0"), lot="")
+    restored = gains_table()
+    restored.set_state(json.loads(json.dumps(table.get_state())))
+    assert restored == table
+
+    npz = str(tmpdir.join("gains.npz"))
+    table.save(npz)
+    loaded = gains_table.load(npz)
+    assert loaded == table
+    assert list(loaded.column(gains_table.ASSET))[-1] is None
+    assert list(loaded.column(gains_table.LOT)) == ["a", "b", None, None, ""]
+
+    csv = str(tmpdir.join("gains.csv"))
+    table.to_csv(csv)
+    df = pd.read_csv(csv, dtype=str, keep_default_na=False)
+    assert list(df.columns) == list(gains_table.COLUMNS)
+    assert [D(g) for g in df[gains_table.GAIN]] == list(table.column(gains_table.GAIN))
+    assert list(df[gains_table.LOT]) == ["a", "b", "", "", ""]
+
+def test_gains_table_merge():
+    """
+    Assert the sales of several tables are merged by key, the rows of a sale kept together
+    """
+    first, second = gains_table(), gains_table()
+    first.extend(pd.Timestamp("2020-01-01").value, "XXBT", [D("3"), D("4")], [D("1"), D("2")], lots=["a", "b"], sale=True)
+    first.append(pd.Timestamp("2020-03-01"), "XXBT", D("5"), D("5"), lot="c")
+    second.append(pd.Timestamp("2020-02-01"), "XETH", D("7"), D("6"), lot="d")
+
+    merged = gains_table.merge([first, second], [[0, 9], [4]])
+    assert list(merged.column(gains_table.LOT)) == ["a", "b", "d", "c"]
+    assert list(merged.column(gains_table.SALE)) == [0, 0, 1, 2]
+    assert merged.summary("asset") == {"XXBT": D("4"), "XETH": D("1")}
+    merged.append(pd.Timestamp("2020-04-01"), "XETH", D("1"), D("1"))
+    assert list(merged.column(gains_table.SALE)) == [0, 0, 1, 2, 3]
+    assert len(gains_table.merge([gains_table(), gains_table()], [[], []])) == 0
+
+def test_gains_per_lot(files):
+    """
+    Assert a sale over several lots gives a row per lot, the profit shared by volume
+    Assert the sale is a single entry of the legacy view
+    """
+    strategy = fifo_with_trades(files[0])
+    trade = strategy._trades._trades.iloc[2]
+    strategy._wallet.add("XXBT", D("0.01"), D("1000"), lot_id="x")
+    strategy._wallet.add("XXBT", D("0.03"), D("2000"), lot_id="y")
+    strategy.crypto2fiat(trade)
+
+    gains = strategy.gains
+    cash_in = trade.cost - trade.fee
+    assert list(gains.column(gains_table.LOT)) == ["x", "y"]
+    assert list(gains.column(gains_table.COST_BASIS)) == [D("10"), D("20")]
+    profit = cash_in - D("30")
+    assert list(gains.column(gains_table.GAIN)) == [profit / 2, profit / 2]
+    assert list(gains.column(gains_table.PROCEEDS)) == [D("10") + profit / 2, D("20") + profit / 2]
+    assert strategy.gains_summary() == {2017: profit}
+    assert strategy.fifo_gains == {2017: [(trade.time, profit)]}
+
+def test_gains_record_sale_exact(files):
+    """
+    Assert the profit of a sale is shared on its own decimals, the rows adding up exactly to it
+    """
+    strategy = fifo_with_trades(files[0])
+    time = pd.Timestamp("2020-01-10")
+    consumed = [(lot, D("1"), D("10")) for lot in "abc"]
+    assert strategy.record_sale(time, "XXBT", D("100.00"), D("30"), consumed) == D("70.00")
+    strategy.record_sale(time, "XXBT", D("1"), D("0.5"), [("d", D("0.5"), D("0.5"))])
+
+    gains = strategy.gains
+    assert list(map(str, gains.column(gains_table.GAIN))) == ["23.33", "23.33", "23.34", "0.5"]
+    assert list(map(str, gains.column(gains_table.PROCEEDS))) == ["33.33", "33.33", "33.34", "1"]
+    assert list(gains.column(gains_table.SALE)) == [0, 0, 0, 1]
+    assert str(strategy.gains_summary()[2020]) == "70.50"
+    assert strategy.fifo_gains == {2020: [(time, D("70.00")), (time, D("0.5"))]}
+
+@pytest.mark.parametrize("ledger, lot", [(False, "a"), (True, "a1")])
+def test_gains_lot_ids(files, ledger, lot):
+    """
+    Assert the rows of a run name the trade (txid, or ledger refid) which acquired the lot sold
+    """
+    strategy = fifo_with_ledger(*files) if ledger else fifo_with_trades(files[0])
+    strategy.process_all_trades()
+    assert list(strategy.gains.column(gains_table.ASSET)) == ["XXBT"]
+    assert list(strategy.gains.column(gains_table.LOT)) == [lot]
+
+def test_gains_legacy_checkpoint(files, tmpdir):
+    """
+    Assert a checkpoint with the gains by year (before the table) is still loaded
+    """
+    strategy = fifo_with_trades(files[0])
+    strategy.process_all_trades()
+    checkpoint = str(tmpdir.join("checkpoint.json"))
+    strategy.save_checkpoint(checkpoint)
+    with open(checkpoint) as f: content = json.load(f)
+    content[fifo_with_trades.GAINS] = {str(year): [[t.isoformat(), str(p)] for t, p in profits]
+                                       for year, profits in strategy.fifo_gains.items()}
+    with open(checkpoint, "w") as f: json.dump(content, f)
+
+    resumed = fifo_with_trades(files[0])
+    resumed.load_checkpoint(checkpoint)
+    assert resumed.gains_summary() == strategy.gains_summary()
+    assert resumed.fifo_gains == strategy.fifo_gains
+
+@pytest.mark.parametrize("name", ["gains.csv", "gains.npz"])
+def test_main_gains(files, tmpdir, capsys, name):
+    """
+    Assert the command line exports the gains table
+    """
+    file = str(tmpdir.join(name))
+    main(*files, gains=file)
+    if name.endswith(".npz"):
+        assert len(gains_table.load(file)) == 1
+    else:
+        assert len(pd.read_csv(file)) == 1
@@ -0,0 +1,41 @@
+from decimal import Decimal as D
+import pandas as pd
+from cryptopnl.api.to_include_in_exchangeAPI_prices import prices
+from cryptopnl.main.plCalculator import plCalculator
+
+TRADES = ('"txid","ordertxid","pair","time","type","ordertype","price","cost","fee","vol","margin","misc","ledgers"\n'
+          '"t1","o","XXBTZEUR","2018-01-01 10:00:00","buy","limit",1000.00,1000.00,10.00,1.00000000,0.0,"","l1b,l1a"\n'
+          '"t2","o","XETHXXBT","2018-01-02 10:00:00","buy","limit",0.050000,0.2500,0.0010,5.00000000,0.0,"","l2b,l2a"\n'
+          '"t3","o","XETHZEUR","2018-01-03 10:00:00","sell","limit",120.00,600.00,6.00,5.00000000,0.0,"","l3b,l3a"\n')
+LEDGER = ('"txid","refid","time","type","subtype","aclass","asset","amount","fee","balance"\n'
+          '"l1a","t1","2018-01-01 10:00:00","trade","","currency","XXBT",1.0000000000,0.0000000000,1.0000000000\n'
+          '"l1b","t1","2018-01-01 10:00:00","trade","","currency","ZEUR",-1000.0000,10.0000,3990.0000\n'
+          '"l2a","t2","2018-01-02 10:00:00","trade","","currency","XETH",5.0000000000,0.0000000000,5.0000000000\n'
+          '"l2b","t2","2018-01-02 10:00:00","trade","","currency","XXBT",-0.2500000000,0.0010000000,0.7490000000\n'
+          '"l3a","t3","2018-01-03 10:00:00","trade","","currency","XETH",-5.0000000000,0.0000000000,0.0000000000\n'
+          '"l3b","t3","2018-01-03 10:00:00","trade","","currency","ZEUR",600.0000,6.0000,4584.0000\n')
+
+def test_plCalculator_prefetch(tmpdir, mocker):
+    """
+    Assert the prices of the cryptos bought by crypto to crypto trades are prefetched
+    in bulk (short names, as looked up) and the FIFO gains use them
+    """
+    trades_file, ledger_file = tmpdir.join("trades.csv"), tmpdir.join("ledger.csv")
+    trades_file.write(TRADES)
+    ledger_file.write(LEDGER)
+    time = pd.Timestamp("2018-01-02 10:00:00")
+    pages = mocker.patch("cryptopnl.api.krakenAPI.krakenAPI.iterHistoryTrades",
+                         side_effect=lambda pair, since, until: iter([[["100.0", "1.0", time.value / 1e9 - 60]]]))
+    api = mocker.patch("cryptopnl.api.krakenAPI.krakenAPI.getHistoryTrades")
+    prefetch = mocker.spy(prices, "prefetch")
+
+    plc = plCalculator(str(ledger_file), str(trades_file), str(tmpdir.join("prices.sqlite")))
+    assert {crypto: times.tolist() for crypto, times in plc.neededPrices().items()} == {"ETH": [time.value]}
+    prefetch.assert_called_once()
+    assert [call.args[0] for call in pages.call_args_list] == ["ETHZEUR"]
+    plc.processAll()
+
+    api.assert_not_called()
+    assert plc.totalGains["2018"] == [D("500") - D("251"), D("600") - D("500")]
+    assert plc.wallet.amounts["XBT"] == D("0.749")
+    assert plc.totalSurplus() == (D("349"), 10.0 + 6.0) # fiat fees (crypto to crypto ones are not counted)
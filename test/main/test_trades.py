@@ -112,8 +112,290 @@ def test_balance_check(data_input, check, mocker):
     balance_checking = trades_obj.balance_check()
     assert balance_checking == check
 
+@pytest.mark.parametrize("fixed_point", [False, True])
+def test_balance_report(trades_csv, ledger_csv, fixed_point):
+    """
+    Assert the balances are reconciled asset by asset
+    Assert the first divergent txid of each asset is reported
+    """
+
+    trades = Trades(trades_file = trades_csv, ledger_file = ledger_csv, fixed_point = fixed_point)
+    assert trades.balance_report() == {}
+    assert trades.balance_check()
+
+    ledger = trades._ledger
+    for txid in ["b2", "d2", "b1"]: # XXBT twice and XETH
+        row = ledger.index[ledger[Trades.TXID_COL] == txid][0]
+        ledger.loc[row, Trades.BALANCE_COL] = ledger.loc[row, Trades.BALANCE_COL] * 2
+
+    assert trades.balance_report() == {"XXBT": "b2", "XETH": "b1"}
+    assert not trades.balance_check()
+
 def test_balance_check_error(mocker):
     mocker.patch("cryptopnl.main.trades.Trades.readKrakenCSV", return_value = "some_val")
     trades_obj = Trades("/some/trades.csv")
     with pytest.raises(ValueError):
         trades_obj.balance_check()
+
+def test_trades_index_by_txid(ledger_csv):
+    """
+    Assert every txid is mapped to its row position (first occurrence wins)
+    """
+
+    ledger = Trades.readKrakenCSV(ledger_csv)
+    index = Trades.index_by_txid(ledger)
+
+    assert len(index) == ledger[Trades.TXID_COL].nunique()
+    for txid, position in index.items():
+        assert ledger[Trades.TXID_COL].iloc[position] == txid
+
+    duplicated = pd.DataFrame([["a"], ["b"], ["a"]], columns=[Trades.TXID_COL])
+    assert Trades.index_by_txid(duplicated) == {"a": 0, "b": 1}
+    assert Trades.index_by_txid(pd.DataFrame()) == {}
+
+def test_trades_get_ledger(trades_csv, ledger_csv):
+    """
+    Assert a ledger entry is retrieved from its txid
+    """
+
+    trades = Trades(trades_file = trades_csv, ledger_file = ledger_csv)
+    entry = trades.get_ledger("c2")
+    expected = trades._ledger[trades._ledger[Trades.TXID_COL] == "c2"].iloc[0]
+
+    assert not isinstance(entry, pd.Series)
+    assert pd.Series(entry._asdict()).equals(expected)
+    assert trades.get_ledger("c2") is entry
+    with pytest.raises(KeyError):
+        trades.get_ledger("not_a_txid")
+
+    with pytest.raises(ValueError):
+        Trades(trades_file = trades_csv).get_ledger("c2")
+
+def test_trades_records(trades_csv):
+    """
+    Assert trades are yielded as named tuples matching the dataframe rows
+    """
+
+    trades = Trades(trades_file = trades_csv)
+    records = list(trades.records())
+
+    assert len(records) == len(trades._trades)
+    for record, (_, row) in zip(records, trades):
+        assert not isinstance(record, pd.Series)
+        assert record.txid == row.txid
+        assert record.pair == row.pair
+        assert record.time == row.time
+        assert isinstance(record.vol, D)
+        assert record.vol == row.vol
+        assert getattr(record, Trades.LEDGER_COL) == row[Trades.LEDGER_COL]
+
+@pytest.mark.parametrize("values, expected, scale",
+    [(["1.5", "-0.02", "10", "0.125"], [1500, -20, 10000, 125], 3),
+     (["7", "-3"], [7, -3], 0),
+     (["0.1", None], [1, None], 1)])
+def test_trades_to_fixed_point(values, expected, scale):
+    """
+    Assert decimal strings are exactly parsed into scaled integers and back
+    """
+
+    column, column_scale = Trades.to_fixed_point(pd.Series(values, dtype=object))
+
+    assert column_scale == scale
+    for value, parsed, original in zip(expected, column, values):
+        if value is None:
+            assert pd.isna(parsed)
+            assert Trades.from_fixed_point(parsed, scale).is_nan()
+        else:
+            assert parsed == value
+            assert Trades.from_fixed_point(parsed, scale) == D(original)
+
+    with pytest.raises(ValueError):
+        Trades.to_fixed_point(pd.Series(["1.5", "abc"], dtype=object))
+
+def test_trades_decimal_to_fixed_point():
+    """
+    Assert Decimals (exponent notation, missing values, too many digits) are exactly scaled
+    """
+    values = [D("1.5"), D("0E-10"), D("1E-7"), D("NaN"), None, D("-2.25E+3"), D("12")]
+    column, scale = Trades.decimal_to_fixed_point(pd.Series(values, dtype=object))
+    assert scale == 10
+    for value, parsed in zip(values, column):
+        if value is None or value.is_nan(): assert pd.isna(parsed)
+        else: assert Trades.from_fixed_point(parsed, scale) == value
+
+    values = [D("123456789012.1234567890"), D("-1E-12")]
+    column, scale = Trades.decimal_to_fixed_point(pd.Series(values, dtype=object))
+    assert scale == 12
+    assert list(column) == [123456789012123456789000, -1]
+
+@pytest.mark.parametrize("value", ["-", ".", "+", "-."])
+def test_trades_to_fixed_point_no_digit(value):
+    """
+    Assert a non empty value without any digit is rejected (not read as 0)
+    """
+    with pytest.raises(ValueError):
+        Trades.to_fixed_point(pd.Series(["1.5", value], dtype=object))
+
+def test_trades_readKrakenCSV_fixed_point_overflow(ledger_csv, tmpdir):
+    """
+    Assert a column too large for 64 bits integers is kept as Decimals, the others as fixed point
+    """
+    ledger = pd.read_csv(ledger_csv, dtype=str, keep_default_na=False)
+    ledger.loc[1, Trades.BALANCE_COL] = "123456789012.1234567890"
+    file = str(tmpdir.join("ledger.csv"))
+    ledger.to_csv(file, index=False)
+
+    fixed = Trades.readKrakenCSV(file, fixed_point=True)
+
+    with pytest.raises(OverflowError):
+        Trades.to_fixed_point(ledger[Trades.BALANCE_COL])
+    assert Trades.BALANCE_COL not in fixed.attrs[Trades.SCALES_ATTR]
+    assert Trades.AMOUNT_COL in fixed.attrs[Trades.SCALES_ATTR]
+    for record, (_, row) in zip(Trades.frame_records(fixed), ledger.iterrows()):
+        assert record.amount == D(row[Trades.AMOUNT_COL])
+        assert str(record.balance) == str(D(row[Trades.BALANCE_COL] or "NaN"))
+
+def test_trades_readKrakenCSV_fixed_point(trades_csv, ledger_csv):
+    """
+    Assert the fixed point load keeps integers and yields the same Decimals as the default load
+    """
+
+    fixed = Trades(trades_file = trades_csv, ledger_file = ledger_csv, fixed_point = True)
+    default = Trades(trades_file = trades_csv, ledger_file = ledger_csv)
+
+    assert fixed._trades.attrs[Trades.SCALES_ATTR][Trades.COST_COL] == 4
+    assert fixed._trades[Trades.COST_COL].iloc[0] == 20000000
+    assert fixed._ledger.attrs[Trades.SCALES_ATTR][Trades.BALANCE_COL] == 10
+
+    for fixed_record, record in zip(fixed.records(), default.records()):
+        for c in (Trades.PRICE_COL, Trades.COST_COL, Trades.FEE_COL, Trades.VOL_COL):
+            assert isinstance(getattr(fixed_record, c), D)
+            assert getattr(fixed_record, c) == getattr(record, c)
+
+    for txid in ("a1", "a2", "c2", "d1"):
+        fixed_entry, entry = fixed.get_ledger(txid), default.get_ledger(txid)
+        for c in (Trades.AMOUNT_COL, Trades.FEE_COL, Trades.BALANCE_COL):
+            assert isinstance(getattr(fixed_entry, c), D)
+            assert getattr(fixed_entry, c) == getattr(entry, c)
+
+def test_trades_fixed_point_records(trades_csv):
+    """
+    Assert the records of a fixed point load keep the scaled integers, read as Decimals
+    """
+
+    fixed = next(Trades(trades_file = trades_csv, fixed_point = True).records())
+    default = next(Trades(trades_file = trades_csv).records())
+
+    position = fixed._fields.index(Trades.COST_COL)
+    assert fixed[position] == (20000000, 4)
+    assert fixed.cost == default.cost and isinstance(fixed.cost, D)
+    assert Trades.scaled(fixed, Trades.COST_COL) == (20000000, 4)
+    assert Trades.scaled(default, Trades.COST_COL) is default.cost
+    assert Trades.scaled(fixed, Trades.PAIR_COL) == default.pair
+
+    names = (Trades.COST_COL, Trades.PAIR_COL)
+    assert Trades.getter(fixed, *names)(fixed) == ((20000000, 4), default.pair)
+    assert Trades.getter(default, *names)(default) == (default.cost, default.pair)
+    series = Trades(trades_file = trades_csv, fixed_point = True).get_trades().iloc[0]
+    assert Trades.getter(series, *names)(series) == (series.cost, series.pair)
+
+@pytest.mark.parametrize("chunksize, fixed_point", [(1, False), (3, False), (2, True)])
+def test_trades_streaming_records(chunksize, fixed_point, trades_csv, ledger_csv):
+    """
+    Assert streaming the files yields the same trades and ledger entries as loading them
+    """
+
+    streamed = Trades(trades_file = trades_csv, ledger_file = ledger_csv, fixed_point = fixed_point, chunksize = chunksize)
+    loaded = Trades(trades_file = trades_csv, ledger_file = ledger_csv)
+
+    assert streamed._trades is None and streamed._ledger is None
+    records = list(streamed.records())
+    assert len(records) == len(loaded._trades)
+    for record, expected in zip(records, loaded.records()):
+        assert record.txid == expected.txid
+        assert record.time == expected.time
+        assert record.cost == expected.cost
+        assert record.vol == expected.vol
+
+        for txid in getattr(record, Trades.LEDGER_COL).split(","):
+            entry, expected_entry = streamed.get_ledger(txid, record.time), loaded.get_ledger(txid)
+            assert entry.txid == expected_entry.txid
+            assert entry.amount == expected_entry.amount
+            assert entry.fee == expected_entry.fee
+            assert streamed.get_ledger(txid, record.time) is entry
+    assert all(entry.time >= records[-1].time - Trades.LEDGER_WINDOW for entry in streamed._ledger_buffer.values())
+
+def test_trades_streaming_ledger_bounded(tmp_path, mocker):
+    """
+    Assert a streamed ledger drops the entries of past trades and stops at unknown txids
+    """
+
+    ledger_file = tmp_path / "ledger.csv"
+    times = pd.date_range("2020-01-01", periods=20, freq="min")
+    pd.DataFrame({"txid": [f"t{i}" for i in range(20)], "refid": "r", "time": times, "type": "trade", "subtype": "", 
+                  "aclass": "currency", "asset": "XXBT", "amount": "1.5", "fee": "0", "balance": "1.5"}).to_csv(ledger_file, index=False)
+    streamed = Trades(trades_file = ledger_file, ledger_file = ledger_file, chunksize = 2)
+
+    assert streamed.get_ledger("t5", times[5]).amount == D("1.5")
+    assert streamed.get_ledger("t5", times[5]) is streamed.get_ledger("t5", times[5])
+    assert list(streamed._ledger_buffer) == ["t5"]
+    with pytest.raises(KeyError):
+        streamed.get_ledger("not_a_txid", times[6])
+    assert next(streamed._ledger_chunks)[Trades.TXID_COL].tolist() == ["t8", "t9"] # rest of the file not read
+    assert streamed.get_ledger("t12", times[12]).txid == "t12"
+    assert min(streamed._ledger_buffer) == "t12"
+
+    mocker.patch.object(Trades, "LEDGER_BUFFER", 3)
+    assert streamed.get_ledger("t19").txid == "t19" # no time: bounded by LEDGER_BUFFER
+    assert list(streamed._ledger_buffer) == ["t16", "t17", "t18", "t19"] # at least two chunks
+
+@pytest.mark.parametrize("chunksize", [None, 3])
+def test_trades_seek(chunksize, tmp_path):
+    """
+    Assert the files can be read from byte offsets, the rows before being skipped unparsed
+    """
+
+    trades_file, ledger_file = tmp_path / "trades.csv", tmp_path / "ledger.csv"
+    times = pd.date_range("2020-01-01", periods=10, freq="min")
+    pd.DataFrame({"txid": [f"t{i}" for i in range(10)], "pair": "XXBTZEUR", "time": times, "type": "buy", 
+                  "price": "10.5", "cost": "21", "fee": "0.1", "vol": "2", "ledgers": [f"l{i}" for i in range(10)]}).to_csv(trades_file, index=False)
+    pd.DataFrame({"txid": [f"l{i}" for i in range(10)], "refid": "r", "time": times, "type": "trade", "asset": "XXBT", 
+                  "amount": "2", "fee": "0", "balance": "2"}).to_csv(ledger_file, index=False)
+    trades = Trades(trades_file = trades_file, ledger_file = ledger_file, chunksize = chunksize)
+
+    offsets = trades.offsets(4, times[4])
+    lines = trades_file.read_bytes().splitlines(keepends=True)
+    assert offsets[0] == len(b"".join(lines[:5]))
+    assert offsets[1] == len(b"".join(ledger_file.read_bytes().splitlines(keepends=True)[:5])) # first entry within 1s of the trade
+    assert Trades.time_offset(ledger_file, times[-1] + pd.Timedelta(1, "min")) == ledger_file.stat().st_size
+    assert Trades.row_offset(trades_file, 2, offsets[0]) == len(b"".join(lines[:7]))
+
+    assert not trades.seek(4, offsets[0] + 1)
+    assert trades.seek(4, *offsets) and trades.first_row() == 4
+    with pytest.raises(ValueError):
+        trades.records(start = 3)
+    records = list(trades.records(start = 5))
+    assert [r.txid for r in records] == [f"t{i}" for i in range(5, 10)]
+    assert records[0].cost == D("21") and records[0].time == times[5]
+    assert trades.get_ledger("l5", times[5]).txid == "l5"
+    with pytest.raises(KeyError):
+        trades.get_ledger("l2", times[5]) # before the ledger offset
+    assert trades.offsets(6, times[6])[0] == len(b"".join(lines[:7]))
+    if chunksize is None: 
+        assert trades.get_trades()[Trades.TXID_COL].iloc[0] == "t4"
+        assert not trades.seek(0, None) # already read
+
+def test_trades_streaming_ledger_errors(trades_csv, ledger_csv):
+    """
+    Assert unknown txids, non trade entries and missing ledgers are reported
+    """
+
+    streamed = Trades(trades_file = trades_csv, ledger_file = ledger_csv, chunksize = 2)
+    with pytest.raises(KeyError):
+        streamed.get_ledger("a0") # deposit, never joined with a trade
+    with pytest.raises(KeyError):
+        streamed.get_ledger("not_a_txid")
+    with pytest.raises(ValueError):
+        streamed.balance_check()
+    with pytest.raises(ValueError):
+        Trades(trades_file = trades_csv, chunksize = 2).get_ledger("a1")
@@ -0,0 +1,139 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pytest
+import shutil
+import os
+
+from cryptopnl.main.trades import Trades
+from cryptopnl.main.trades_cache import trades_cache
+
+@pytest.fixture
+def ledger_csv(request, tmp_path):
+    filename = request.module.__file__
+    file_dir, _ = os.path.split(filename)
+    test_dir, _ = os.path.split(file_dir)
+
+    ledger_file = os.path.join(test_dir, "_test_files", "test_ledger.csv")
+    if not os.path.exists(ledger_file): raise FileNotFoundError("Test file not found")
+    copy = tmp_path / "ledger.csv"
+    shutil.copy(ledger_file, copy)
+    return str(copy)
+
+def test_trades_cache_miss_then_hit(ledger_csv, tmp_path, mocker):
+    """
+    Test a file is parsed on the first read only
+    """
+    cache = trades_cache(str(tmp_path / "cache"))
+    assert cache.load(ledger_csv) is None
+
+    spy = mocker.spy(Trades, "readKrakenCSV")
+    Trades.readCachedKrakenCSV(ledger_csv, cache, fixed_point=True)
+    Trades.readCachedKrakenCSV(ledger_csv, cache, fixed_point=True)
+    assert spy.call_count == 1
+    assert cache.load(ledger_csv) is not None
+
+@pytest.mark.parametrize("fixed_point", [True, False])
+def test_trades_cache_same_frame(ledger_csv, tmp_path, fixed_point):
+    """
+    Test a cached frame is the one parsed from the file
+    """
+    cache = trades_cache(str(tmp_path / "cache"))
+    Trades.readCachedKrakenCSV(ledger_csv, cache)
+    df = Trades.readCachedKrakenCSV(ledger_csv, cache, fixed_point=fixed_point)
+    expected = Trades.readKrakenCSV(ledger_csv, fixed_point=fixed_point)
+
+    assert df.attrs == expected.attrs
+    pd.testing.assert_frame_equal(df, expected)
+
+def test_trades_cache_decimal_column(ledger_csv, tmp_path):
+    """
+    Test a column kept as Decimals (too large for fixed point) is cached exactly
+    """
+    ledger = pd.read_csv(ledger_csv, dtype=str, keep_default_na=False)
+    ledger.loc[1, Trades.BALANCE_COL] = "123456789012.1234567890"
+    ledger.to_csv(ledger_csv, index=False)
+    cache = trades_cache(str(tmp_path / "cache"))
+    Trades.readCachedKrakenCSV(ledger_csv, cache)
+    df = Trades.readCachedKrakenCSV(ledger_csv, cache, fixed_point=True)
+    expected = Trades.readKrakenCSV(ledger_csv, fixed_point=True)
+
+    assert df.attrs == expected.attrs
+    assert list(df[Trades.BALANCE_COL].astype(str)) == list(expected[Trades.BALANCE_COL].astype(str))
+
+def test_trades_cache_invalidation(ledger_csv, tmp_path):
+    """
+    Test a modified file is parsed again and its old entry is removed
+    """
+    cache_dir = str(tmp_path / "cache")
+    cache = trades_cache(cache_dir)
+    Trades.readCachedKrakenCSV(ledger_csv, cache)
+    old_hash = cache.file_hash(ledger_csv)
+
+    with open(ledger_csv, "r") as fp: lines = fp.readlines()
+    with open(ledger_csv, "w") as fp: fp.writelines(lines[:-1])
+
+    assert cache.file_hash(ledger_csv) != old_hash
+    assert cache.load(ledger_csv) is None
+    df = Trades.readCachedKrakenCSV(ledger_csv, cache, fixed_point=True)
+    assert len(df) == len(lines) - 2
+    assert not os.path.exists(os.path.join(cache_dir, old_hash))
+
+def test_trades_cache_init(ledger_csv, tmp_path):
+    """
+    Test a Trades object reads through the cache when given a directory
+    """
+    cache_dir = str(tmp_path / "cache")
+    t_cached = Trades(trades_file=ledger_csv, ledger_file=ledger_csv, cache_dir=cache_dir)
+    t_direct = Trades(trades_file=ledger_csv, ledger_file=ledger_csv)
+
+    assert os.listdir(cache_dir) == [] # files read on first use
+    assert t_cached._ledger_index == t_direct._ledger_index
+    assert len(os.listdir(cache_dir)) == 2 # entry and hashes
+    assert t_cached.get_ledger("c2").amount == t_direct.get_ledger("c2").amount
+
+def is_memory_mapped(array):
+    while array is not None:
+        if isinstance(array, np.memmap): return True
+        array = array.base
+    return False
+
+def test_trades_cache_memory_mapped(ledger_csv, tmp_path):
+    """
+    Test the numeric columns of a cached frame are memory mapped
+    Assert modifying the frame leaves the cache untouched
+    """
+    cache = trades_cache(str(tmp_path / "cache"))
+    Trades.readCachedKrakenCSV(ledger_csv, cache)
+    df = Trades.readCachedKrakenCSV(ledger_csv, cache, fixed_point=True)
+
+    for col in [Trades.TIME_COL, Trades.AMOUNT_COL, Trades.FEE_COL]:
+        assert is_memory_mapped(df[col].to_numpy())
+    assert is_memory_mapped(df[Trades.BALANCE_COL].array._data)
+
+    amount = df.loc[0, Trades.AMOUNT_COL]
+    df.loc[0, Trades.AMOUNT_COL] = amount + 1
+    assert cache.load(ledger_csv).loc[0, Trades.AMOUNT_COL] == amount
+
+def _concurrent_reads(job):
+    """ Read (and store again) a file through a shared cache, in a worker process """
+    ledger_csv, cache_dir, rounds = job
+    lengths = []
+    for _ in range(rounds):
+        cache = trades_cache(cache_dir)
+        df = Trades.readCachedKrakenCSV(ledger_csv, cache, fixed_point=True)
+        cache.store(ledger_csv, df)
+        lengths.append(len(df))
+    return lengths
+
+def test_trades_cache_processes(ledger_csv, tmp_path):
+    """
+    Test several processes sharing a cache directory all read the file, leaving a single entry
+    """
+    cache_dir = str(tmp_path / "cache")
+    expected = len(Trades.readKrakenCSV(ledger_csv))
+    with ProcessPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(_concurrent_reads, [(ledger_csv, cache_dir, 25)] * 8))
+
+    assert all(length == expected for lengths in results for length in lengths)
+    assert sorted(os.listdir(cache_dir)) == sorted([trades_cache(cache_dir).file_hash(ledger_csv), trades_cache.HASHES_FILE])
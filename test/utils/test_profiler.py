@@ -0,0 +1,59 @@
+import json
+import os
+import pstats
+import pytest
+
+from cryptopnl.__main__ import main
+from cryptopnl.main.fifo_with_ledger import fifo_with_ledger
+from cryptopnl.main.fifo_with_trades import fifo_with_trades
+from cryptopnl.main.trades import Trades
+from cryptopnl.utils.profiler import profiler
+from cryptopnl.wallet.wallet import wallet
+
+@pytest.fixture
+def files(request):
+    test_dir = os.path.dirname(os.path.dirname(request.module.__file__))
+    return (os.path.join(test_dir, "_test_files", "test_trades.csv"),
+            os.path.join(test_dir, "_test_files", "test_ledger.csv"))
+
+def test_profiler_phases(files, capsys):
+    """
+    Assert the phases of a run are counted and timed, and the methods restored afterwards
+    """
+    originals = (Trades.get_ledger, wallet.add, wallet.take, fifo_with_ledger.process_trade)
+    with profiler() as prof:
+        fifo_with_ledger(*files).go()
+
+    phases = prof.report()["phases"]
+    assert phases["load"]["calls"] == 1
+    assert phases["process_trade"]["calls"] == 4
+    assert phases["ledger_join"]["calls"] == 8
+    assert phases["process_trade[fiat2crypto]"]["calls"] == 1
+    assert phases["process_trade[crypto2fiat]"]["calls"] == 1
+    assert phases["process_trade[crypto2crypto]"]["calls"] == 2
+    assert phases["wallet.add"]["calls"] == phases["wallet.take"]["calls"] == 3
+    assert phases["pnl_summary"]["calls"] == 1
+    assert all(0 <= p["seconds"] <= prof.seconds for p in phases.values())
+    assert list(phases) == sorted(phases, key=lambda p: -phases[p]["seconds"])
+    assert (Trades.get_ledger, wallet.add, wallet.take, fifo_with_ledger.process_trade) == originals
+
+def test_profiler_inactive(files, capsys):
+    """
+    Assert nothing is measured outside of the profiler
+    """
+    prof = profiler()
+    with prof: pass
+    fifo_with_trades(files[0]).go()
+    assert prof.report()["phases"] == {}
+
+def test_main_profile(files, tmpdir, capsys):
+    """
+    Assert the command line writes the json report and the cProfile dump
+    """
+    report, dump = str(tmpdir.join("report.json")), str(tmpdir.join("run.prof"))
+    main(*files, profile=report, cprofile=dump)
+
+    with open(report) as f: content = json.load(f)
+    assert content["cprofile"] == dump
+    assert content["phases"]["process_trade"]["calls"] == 4
+    assert pstats.Stats(dump).total_calls > 0
@@ -0,0 +1,101 @@
+import pytest
+
+from decimal import Decimal as D 
+from cryptopnl.wallet.numeric import decimal_backend, difference, fixed_point_backend, to_decimal
+from cryptopnl.wallet.wallet import wallet
+
+def test_decimal_backend_is_identity():
+    """
+    Decimal backend keeps the values untouched
+    """
+    backend = decimal_backend()
+    value = D("0.1234567890123")
+
+    assert backend.to_vol("BTC", value) is value
+    assert backend.from_vol("BTC", value) is value
+    assert backend.to_cost(value) is value
+    assert backend.from_cost(value) is value
+    assert backend.cost_fraction(D(10), D(1), D(3)) == D(10) * (D(1) / D(3))
+
+def test_fixed_point_backend_conversions():
+    """
+    Volumes use a per crypto scale, costs the fiat scale, values round half even
+    """
+    backend = fixed_point_backend(scales={"ETH": 4}, default_scale=8, cost_scale=2)
+
+    assert backend.to_vol("BTC", D("0.12345678")) == 12345678
+    assert backend.from_vol("BTC", 12345678) == D("0.12345678")
+    assert backend.to_vol("ETH", D("1.5")) == 15000
+    assert backend.from_vol("ETH", 15000) == D("1.5")
+    assert backend.to_vol("ETH", D("0.00005")) == 0
+    assert backend.to_vol("ETH", D("0.00015")) == 2
+    assert backend.to_cost(D("10.005")) == 1000
+    assert backend.to_cost(7) == 700
+    assert backend.from_cost(1001) == D("10.01")
+
+def test_scaled_pairs():
+    """
+    Scaled integer pairs are exact numbers, rescaled without building Decimals
+    """
+    backend = fixed_point_backend(scales={"ETH": 4}, default_scale=8, cost_scale=2)
+    amount, price, fee = (15, 1), (12345, 2), (5, 3)
+
+    assert to_decimal(amount) == D("1.5") and to_decimal(D("2")) == D("2")
+    assert difference((1000, 2), (5, 3)) == D("9.995") == difference(D("10.00"), D("0.005"))
+    assert backend.to_vol("BTC", amount) == 150000000
+    assert backend.to_vol("ETH", (123455, 5)) == 12346
+    assert backend.cost_of(amount, price, fee) == backend.to_cost(D("123.45") * D("1.5") + D("0.005")) == 18518
+    assert backend.cost_of(amount, price, D("0.005")) == 18518
+    assert decimal_backend().cost_of(amount, price, fee) == D("185.180")
+    assert decimal_backend().to_vol("BTC", amount) == D("1.5")
+
+@pytest.mark.parametrize("cost, vol, chunk_vol, expected",
+    [(100, 1, 4, 25), (10, 1, 4, 2), (14, 1, 4, 4), (10, 1, 3, 3), (20, 1, 3, 7), (-10, 1, 4, -2)])
+def test_fixed_point_backend_cost_fraction(cost, vol, chunk_vol, expected):
+    """
+    Cost splits are exact integer divisions rounded half even
+    """
+    assert fixed_point_backend().cost_fraction(cost, vol, chunk_vol) == expected
+
+def test_wallet_fixed_point_matches_decimal():
+    """
+    Both backends give the same chunks and initial costs on exact amounts
+    """
+    wallets = [wallet(), wallet(backend=fixed_point_backend())]
+    for w in wallets:
+        w.add("BTC", D("0.4"), D("5000"), D("0.1"))
+        w.add("BTC", D("0.25"), D("8000"), D("0.2"))
+        w.add("ETH", D("2"), D("300"))
+
+    costs = [(w.take("BTC", D("0.5")), w.take("ETH", D("0.5"))) for w in wallets]
+
+    assert costs[0] == costs[1]
+    for crypto in ("BTC", "ETH"):
+        assert wallets[0].get_chunks(crypto) == wallets[1].get_chunks(crypto)
+        assert wallets[0].amounts[crypto] == wallets[1].amounts[crypto]
+    with pytest.raises(ValueError):
+        wallets[1].take("BTC", D(1))
+
+@pytest.mark.parametrize("backend", [None, fixed_point_backend()])
+def test_wallet_scaled_pairs_match_decimals(backend):
+    """
+    Adding and taking scaled integer pairs gives the same wallet as Decimals
+    """
+    wallets = [wallet(), wallet(backend=backend)]
+    lots = [(D("0.4"), D("5000"), D("0.1")), (D("0.25"), D("8000.5"), D("0.25"))]
+    for amount, price, fee in lots:
+        wallets[0].add("BTC", amount, price, fee, lot_id=str(price))
+        wallets[0].updateCost(amount * price, fee)
+        pairs = [(int(x.scaleb(-x.as_tuple().exponent)), -x.as_tuple().exponent) for x in (amount, price, fee)]
+        wallets[1].add("BTC", *pairs, lot_id=str(price))
+        wallets[1].updateCost((pairs[0][0] * pairs[1][0], pairs[0][1] + pairs[1][1]), pairs[2])
+
+    consumed = [[], []]
+    costs = [wallets[0].take("BTC", D("0.1"), consumed[0]), wallets[1].take("BTC", (1, 1), consumed[1]), 
+             wallets[0].take("BTC", D("0.5"), consumed[0]), wallets[1].take("BTC", (50, 2), consumed[1])]
+
+    assert costs[0] == costs[1] and costs[2] == costs[3]
+    assert consumed[0] == consumed[1] and len(consumed[0]) == 3
+    assert wallets[0].get_chunks("BTC") == wallets[1].get_chunks("BTC")
+    assert wallets[0].amounts == wallets[1].amounts
+    assert wallets[0].getWalletCost() == wallets[1].getWalletCost()
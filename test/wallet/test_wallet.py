@@ -1,9 +1,13 @@
-from collections import defaultdict
+from collections import defaultdict, deque
 from distutils.ccompiler import new_compiler
+import json
 import pytest
 
 from decimal import Decimal as D 
-from cryptopnl.wallet.wallet import wallet
+import pandas as pd
+from cryptopnl.api.price_series import price_series
+from cryptopnl.wallet.numeric import fixed_point_backend
+from cryptopnl.wallet.wallet import lot, value_snapshots, wallet
 
 @pytest.fixture
 def test_wallet():
@@ -12,14 +16,14 @@ def test_wallet():
 def test_wallet_init():
     """
     Test a wallet instance is initialized
-    inner variables wallet and amounts are default dicts (list and D("0"))
+    inner variables wallet and amounts are default dicts (deque and D("0"))
     inner variable _walletCost is a decimal 0
     """
 
     test_wallet = wallet()
 
     assert type(test_wallet.wallet) is defaultdict
-    assert test_wallet.wallet.default_factory is list
+    assert test_wallet.wallet.default_factory is deque
     assert type(test_wallet.amounts) is defaultdict
     assert test_wallet.amounts.default_factory() == D("0")
     assert test_wallet._walletCost == D("0") 
@@ -35,16 +39,16 @@ def test_wallet_add(test_wallet):
 
     assert crypto in test_wallet.wallet
     assert crypto in test_wallet.amounts
-    assert test_wallet.wallet[crypto][0][wallet.COST] == D(str(amount))*D(str(price)) + D(str(fee))
-    assert test_wallet.wallet[crypto][0][wallet.VOL] == D(str(amount)) 
-    assert test_wallet.wallet[crypto][0][wallet.PRICE] == price 
+    assert test_wallet.get_chunks(crypto)[0][wallet.COST] == D(str(amount))*D(str(price)) + D(str(fee))
+    assert test_wallet.get_chunks(crypto)[0][wallet.VOL] == D(str(amount)) 
+    assert test_wallet.get_chunks(crypto)[0][wallet.PRICE] == price 
     assert test_wallet.amounts[crypto] == D(str(amount)) 
 
     test_wallet.add(crypto, amount, price)
     assert len(test_wallet.wallet[crypto]) == 2
-    assert test_wallet.wallet[crypto][1][wallet.COST] == D(str(amount))*D(str(price)) 
-    assert test_wallet.wallet[crypto][1][wallet.VOL] == D(str(amount)) 
-    assert test_wallet.wallet[crypto][1][wallet.PRICE] == price 
+    assert test_wallet.get_chunks(crypto)[1][wallet.COST] == D(str(amount))*D(str(price)) 
+    assert test_wallet.get_chunks(crypto)[1][wallet.VOL] == D(str(amount)) 
+    assert test_wallet.get_chunks(crypto)[1][wallet.PRICE] == price 
     assert test_wallet.amounts[crypto] == 2*D(str(amount)) 
 
 def test_wallet_take_from_one_chunk(test_wallet):
@@ -60,8 +64,8 @@ def test_wallet_take_from_one_chunk(test_wallet):
     out = D(7)
     initial_fiat_val = test_wallet.take(crypto, out)
     assert initial_fiat_val == out*price + out/amount*fee
-    assert test_wallet.wallet[crypto][0][wallet.COST] == (D(1) - out/amount)*(amount*price + fee)
-    assert test_wallet.wallet[crypto][0][wallet.VOL] == amount - out 
+    assert test_wallet.get_chunks(crypto)[0][wallet.COST] == (D(1) - out/amount)*(amount*price + fee)
+    assert test_wallet.get_chunks(crypto)[0][wallet.VOL] == amount - out 
     assert test_wallet.amounts[crypto] == 2*amount - out
 
 def test_wallet_take_from_two_chunks(test_wallet):
@@ -78,10 +82,9 @@ def test_wallet_take_from_two_chunks(test_wallet):
     initial_fiat_val = test_wallet.take(crypto, out)
     assert initial_fiat_val == (amount*price + fee + 
                                 (out - amount)*2*price + (out - amount)/amount*fee)
-    assert test_wallet.wallet[crypto][0][wallet.COST] == D() 
-    assert test_wallet.wallet[crypto][0][wallet.VOL] == D() 
-    assert test_wallet.wallet[crypto][1][wallet.COST] == (D(1) - (out - amount)/amount)*(amount*2*price + fee)
-    assert test_wallet.wallet[crypto][1][wallet.VOL] == 2*amount - out
+    assert len(test_wallet.wallet[crypto]) == 1 # exhausted chunk is dropped
+    assert test_wallet.get_chunks(crypto)[0][wallet.COST] == (D(1) - (out - amount)/amount)*(amount*2*price + fee)
+    assert test_wallet.get_chunks(crypto)[0][wallet.VOL] == 2*amount - out
     assert test_wallet.amounts[crypto] == 2*amount - out
 
 def test_wallet_take_nocrypto():
@@ -130,4 +133,123 @@ def test_wallet_set_cost():
     test_wallet.setWalletCost(new_cost)
     assert test_wallet._walletCost == new_cost
 
-# TODO test wallet.getCurrentWalletValue -> triggers an API
\ No newline at end of file
+def test_wallet_take_drops_exhausted_chunks(test_wallet):
+    """
+    Take exactly whole chunks: they are evicted and the remaining ones keep FIFO order
+    """
+    crypto = "BTC"
+    amount, price = D(10), D(5000)
+    for i in range(1, 4):
+        test_wallet.add(crypto, amount, i*price)
+
+    initial_fiat_val = test_wallet.take(crypto, 2*amount)
+    assert initial_fiat_val == amount*price + amount*2*price
+    assert len(test_wallet.wallet[crypto]) == 1
+    assert test_wallet.get_chunks(crypto)[0][wallet.PRICE] == 3*price
+
+    assert test_wallet.take(crypto, amount) == amount*3*price
+    assert len(test_wallet.wallet[crypto]) == 0
+    with pytest.raises(ValueError):
+        test_wallet.take(crypto, amount)
+
+def test_wallet_lot_is_compact(test_wallet):
+    """
+    Chunks are stored as slotted lots, the dict view is only built on demand
+    """
+    crypto = "BTC"
+    amount, price, fee = D(10), D(5000), D(1)
+    test_wallet.add(crypto, amount, price, fee)
+
+    chunk = test_wallet.wallet[crypto][0]
+    assert isinstance(chunk, lot)
+    assert not hasattr(chunk, "__dict__")
+    assert chunk.vol == amount
+    assert test_wallet.get_chunks(crypto)[0] == {wallet.COST: amount*price + fee, wallet.VOL: amount, wallet.PRICE: price}
+    assert test_wallet.get_chunks("ETH") == []
+    assert "ETH" not in test_wallet.wallet
+
+def test_wallet_state_roundtrip(test_wallet):
+    """
+    Exported state is json friendly and restores the same wallet
+    """
+    crypto = "BTC"
+    test_wallet.add(crypto, D("0.4"), D("5000"), D("0.1"))
+    test_wallet.add(crypto, D("0.3"), D("6000"))
+    test_wallet.add("ETH", D("2"), D("300"))
+    test_wallet.take(crypto, D("0.5"))
+    test_wallet.setWalletCost(D("1234.5"))
+
+    state = json.loads(json.dumps(test_wallet.get_state()))
+    restored = wallet()
+    restored.set_state(state)
+
+    assert restored._walletCost == test_wallet._walletCost
+    assert restored.amounts == test_wallet.amounts
+    for c in (crypto, "ETH"):
+        assert restored.get_chunks(c) == test_wallet.get_chunks(c)
+    assert restored.take(crypto, D("0.2")) == test_wallet.take(crypto, D("0.2"))
+
+@pytest.mark.parametrize("backend", [None, fixed_point_backend()])
+def test_wallet_cost_basis(backend):
+    """
+    Per crypto totals and cost bases follow every add and take (and a state restore)
+    """
+    w = wallet(backend=backend)
+    w.add("BTC", D("0.4"), D("5000"), D("0.1"))
+    w.add("BTC", D("0.3"), D("6000"))
+    w.add("ETH", D("2"), D("300"))
+    assert w.get_cost_basis("BTC") == D("3800.1")
+
+    taken = w.take("BTC", D("0.5"))
+    assert w.get_cost_basis("BTC") == D("3800.1") - taken == D("1200")
+    assert w.get_cost_basis("BTC") == sum(c[wallet.COST] for c in w.get_chunks("BTC"))
+    assert w.get_cost_basis("LTC") == D("0")
+
+    w.take("ETH", D("2"))
+    assert w.holdings() == {"BTC": D("0.2")}
+
+    restored = wallet(backend=backend)
+    restored.set_state(json.loads(json.dumps(w.get_state())))
+    assert restored.get_cost_basis("BTC") == w.get_cost_basis("BTC")
+
+def test_wallet_current_value(test_wallet, mocker):
+    """
+    The wallet value sums the amounts held at their price (sold out cryptos are not priced)
+    """
+    time = pd.Timestamp("2021-01-01")
+    test_wallet.add("BTC", D("0.5"), D("20000"))
+    test_wallet.add("ETH", D("2"), D("500"))
+    test_wallet.take("ETH", D("2"))
+    prices = mocker.Mock()
+    prices.getPrice.return_value = 30000.5
+
+    assert test_wallet.getCurrentWalletValue(time, prices) == D("15000.25")
+    prices.getPrice.assert_called_once_with("BTC", time)
+
+    prices.getPrice.return_value = None # unknown price
+    with pytest.raises(ValueError):
+        test_wallet.getCurrentWalletValue(time, prices)
+
+def test_value_snapshots():
+    """
+    Many snapshots are valued at once against price series (or a prices instance)
+    """
+    t = lambda day: pd.Timestamp(f"2021-01-{day:02d}")
+    series = {"BTC": price_series([t(1), t(3)], [D("100"), D("300")]),
+              "ETH": price_series([t(2)], ["10.5"])}
+    snapshots = [(t(1), {"BTC": D("1")}),
+                 (t(2), {"BTC": D("2"), "ETH": D("4")}),
+                 (t(4), {"ETH": D("1")}),
+                 (t(5), {})]
+
+    assert value_snapshots(snapshots, series).tolist() == [D("100"), D("242"), D("10.5"), D("0")]
+
+    class stored_prices:
+        def getPrices(self, crypto, times):
+            return series[crypto].prices_at(times)[1]
+    assert value_snapshots(snapshots, stored_prices()).tolist() == [D("100"), D("242"), D("10.5"), D("0")]
+
+    with pytest.raises(ValueError):
+        value_snapshots([(t(1), {"ETH": D("1")})], series)
+    with pytest.raises(ValueError):
+        value_snapshots([(t(1), {"LTC": D("1")})], series)